@@ -1,11 +1,16 @@
 import json
+import multiprocessing
 import sys
-from PyQt6.QtCore import Qt
-from config import Setting
+from PyQt6.QtCore import Qt, QTimer
+import driver_registry
+import paths
+from config import Setting, load_existing_config, save_to_json
 from PyQt6.QtGui import QCloseEvent
 from PyQt6.QtWidgets import QApplication, QWidget, QLabel, QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout, \
     QFileDialog, QMessageBox, QTextEdit, QProgressBar, QDialog, QCheckBox
-from worker import CrawlerThread
+from worker import CrawlerThread, BrowserPrewarmThread
+
+CANCEL_TIMEOUT_MS = 15000  # 关闭窗口时等待爬虫线程自行停止的最长时间，超时才强制结束
 
 class MainWindow(QWidget):
     def __init__(self):
@@ -16,6 +21,23 @@ class MainWindow(QWidget):
         self.headless_mode = True
         self.setup_headless_control()
 
+        # 增量模式
+        self.incremental_checkbox = QCheckBox("只下载新图片")
+        self.incremental_checkbox.setToolTip("跳过本地索引中已下载过的图片，遇到一段旧图片后自动停止滚动")
+
+        # 断点续爬：从上次中断时保存的检查点继续
+        self.resume_checkbox = QCheckBox("断点续爬")
+        self.resume_checkbox.setToolTip("从上次中断（出错、停止或程序被关闭）时保存的进度继续，不重新滚动已处理的部分")
+
+        # 无浏览器模式（HTTP 后端）
+        self.http_checkbox = QCheckBox("无浏览器模式")
+        self.http_checkbox.setToolTip("直接用 auth_token 翻页读取媒体时间线，不启动 Edge；失败时自动改用浏览器")
+
+        # 预启动浏览器：窗口打开后就在后台启动 Edge，点击开始后直接登录
+        self.prewarm_thread = None
+        self.prewarm_checkbox = QCheckBox("预启动浏览器")
+        self.prewarm_checkbox.setToolTip("窗口打开后立即在后台启动浏览器，点击开始时无需再等待")
+
         # 下载路径
         self.path = QLabel('下载路径：')
         self.path_input = QLineEdit()
@@ -23,14 +45,27 @@ class MainWindow(QWidget):
         self.browse_button.clicked.connect(self.choose_folder)
 
         # 用户ID
-        self.user = QLabel('用户ID（@后文字）：')
+        self.user = QLabel('用户ID（@后文字，多个用逗号分隔）：')
         self.user_input = QLineEdit()
         self.user.setMaximumWidth(300)
+        self.import_users_button = QPushButton('从文件导入')
+        self.import_users_button.setToolTip("从文本文件读取用户ID（每行一个），多个用户会并行爬取")
+        self.import_users_button.clicked.connect(self.import_user_ids)
+
+        # 批量任务的并行浏览器数
+        self.crawl_workers = QLabel('并行浏览器数')
+        self.crawl_workers_input = QLineEdit('2')
+        self.crawl_workers_input.setToolTip("输入多个用户时同时运行的浏览器进程数")
 
         # 滚动次数
         self.scroll = QLabel('最大滚动次数')
         self.scroll_input = QLineEdit('40')
 
+        # 并发下载数
+        self.workers = QLabel('并发下载数')
+        self.workers_input = QLineEdit('4')
+        self.workers_input.setToolTip("同时下载的图片数量，连接池大小与之一致")
+
         # 进度条
         self.phase_label = QLabel('等待开始')
         self.phase_label.setStyleSheet("font-weight: bold; color: #2c3e50; padding: 5px;")
@@ -43,10 +78,27 @@ class MainWindow(QWidget):
         self.stats_label = QLabel('')
         self.stats_label.setStyleSheet("color: #666; padding: 3px;")
 
+        # 下载进度条（下载与滚动同时进行，单独显示）
+        self.download_label = QLabel('下载进度')
+        self.download_label.setStyleSheet("font-weight: bold; color: #2c3e50; padding: 5px;")
+
+        self.download_progress_bar = QProgressBar()
+        self.download_progress_bar.setRange(0, 100)
+        self.download_progress_bar.setTextVisible(True)
+        self.download_progress_bar.setValue(0)
+
+        self.download_stats_label = QLabel('')
+        self.download_stats_label.setStyleSheet("color: #666; padding: 3px;")
+
         # 开始按钮
         self.start = QPushButton('开始!')
         self.start.clicked.connect(self.start_download)
 
+        # 停止按钮：通知爬虫线程在下一个检查点退出（浏览器关闭、检查点保存后结束）
+        self.stop_button = QPushButton('停止')
+        self.stop_button.setEnabled(False)
+        self.stop_button.clicked.connect(self.stop_crawler)
+
         # 日志显示
         self.log_label = QLabel('运行日志：')
         self.log_display = QTextEdit()
@@ -63,23 +115,43 @@ class MainWindow(QWidget):
 
         # 保存配置
         self.current_config = self.load_config()
+        # 日志区只保留最近的若干行，完整日志在 logs/crawler.log
+        self.log_display.document().setMaximumBlockCount(int(self.current_config.get('log_max_lines', 1000)))
+        self.prewarm_checkbox.setChecked(bool(self.current_config.get('prewarm_browser', False)))
+        self.prewarm_checkbox.stateChanged.connect(self.toggle_prewarm)
 
         # 布局
         path_layout = QHBoxLayout()
         path_layout.addWidget(self.path_input)
         path_layout.addWidget(self.browse_button)
         path_layout.addWidget(self.headless_checkbox)
+        path_layout.addWidget(self.http_checkbox)
+        path_layout.addWidget(self.prewarm_checkbox)
+
+        scroll_layout = QHBoxLayout()
+        scroll_layout.addWidget(self.scroll)
+        scroll_layout.addWidget(self.scroll_input)
+        scroll_layout.addWidget(self.workers)
+        scroll_layout.addWidget(self.workers_input)
+        scroll_layout.addWidget(self.incremental_checkbox)
+        scroll_layout.addWidget(self.resume_checkbox)
 
         layout = QVBoxLayout()
         layout.setContentsMargins(20, 20, 20, 20)
         layout.setSpacing(10)
         layout.addWidget(self.path)
         layout.addLayout(path_layout)
+        user_layout = QHBoxLayout()
+        user_layout.addWidget(self.user_input)
+        user_layout.addWidget(self.import_users_button)
+        user_layout.addWidget(self.crawl_workers)
+        user_layout.addWidget(self.crawl_workers_input)
+
         layout.addWidget(self.user)
-        layout.addWidget(self.user_input)
-        layout.addWidget(self.scroll)
-        layout.addWidget(self.scroll_input)
+        layout.addLayout(user_layout)
+        layout.addLayout(scroll_layout)
         layout.addWidget(self.start)
+        layout.addWidget(self.stop_button)
         layout.addWidget(self.settings_btn)
 
 
@@ -87,6 +159,9 @@ class MainWindow(QWidget):
         layout.addWidget(self.phase_label)
         layout.addWidget(self.progress_bar)
         layout.addWidget(self.stats_label)
+        layout.addWidget(self.download_label)
+        layout.addWidget(self.download_progress_bar)
+        layout.addWidget(self.download_stats_label)
 
         layout.addWidget(self.log_label)
         layout.addWidget(self.log_display)
@@ -94,6 +169,10 @@ class MainWindow(QWidget):
 
         self.setLayout(layout)
 
+        # 等窗口显示出来再清理上次残留的浏览器进程、开始预热
+        QTimer.singleShot(0, self.reap_stale_drivers)
+        QTimer.singleShot(0, self.start_prewarm)
+
     def setup_headless_control(self):
         # 创建控制无头模式的复选框
         self.headless_checkbox = QCheckBox("静 默 行 动")
@@ -109,26 +188,72 @@ class MainWindow(QWidget):
         status = "开启" if self.headless_mode else "关闭"
         print(f"无头模式已{status}")
 
+        # 预热的浏览器模式不同，重新启动一个
+        if self.prewarm_thread is not None and self.prewarm_thread.headless != self.headless_mode:
+            self.discard_prewarm()
+            self.start_prewarm()
+
+    def toggle_prewarm(self, state):
+        """切换预启动浏览器，并记入 config.json 供下次启动使用"""
+        enabled = (state == Qt.CheckState.Checked.value)
+        config = load_existing_config()
+        config['prewarm_browser'] = enabled
+        save_to_json(config)
+        self.current_config['prewarm_browser'] = enabled
+        if enabled:
+            self.start_prewarm()
+        else:
+            self.discard_prewarm()
+
+    def crawler_running(self):
+        # QWidget 自带 thread() 方法，不能只用 hasattr 判断是否启动过爬虫线程
+        return isinstance(self.thread, CrawlerThread) and self.thread.isRunning()
+
+    def start_prewarm(self):
+        """在后台启动浏览器（已勾选且当前没有预热中的浏览器时）"""
+        if not self.prewarm_checkbox.isChecked() or self.prewarm_thread is not None:
+            return
+        if self.crawler_running():
+            return
+        self.prewarm_thread = BrowserPrewarmThread(self.path_input.text(), headless=self.headless_mode,
+                                                   lean=bool(self.current_config.get('lean_browser', False)))
+        self.prewarm_thread.ready_signal.connect(lambda: self.log_output("浏览器已在后台就绪。"))
+        self.prewarm_thread.failed_signal.connect(lambda error: self.log_output(f"浏览器预热失败: {error}"))
+        self.prewarm_thread.start()
+
+    def discard_prewarm(self):
+        """关闭预热的浏览器（正在启动时等它启动完再关闭）"""
+        prewarm, self.prewarm_thread = self.prewarm_thread, None
+        if prewarm is not None:
+            prewarm.discard()
+            prewarm.wait()
+
     def open_settings(self):
         dialog = Setting(self)
         dialog.exec()
 
-    def close_application(self):
-        # 如果有线程在运行，先终止线程
-        if hasattr(self, 'thread') and self.thread.isRunning():
-            self.thread.terminate()
-            self.thread.wait()
-        QApplication.quit()
-
     def choose_folder(self):
         folder = QFileDialog.getExistingDirectory(self, '选择下载文件夹')
         if folder:
             self.path_input.setText(folder)
 
+    def import_user_ids(self):
+        """从文本文件导入用户ID列表，填入输入框"""
+        file_path, _ = QFileDialog.getOpenFileName(self, '选择用户列表文件', '', '文本文件 (*.txt);;所有文件 (*)')
+        if not file_path:
+            return
+        import batch  # 批量模块会导入 requests，用到时再导入
+        try:
+            user_ids = batch.load_user_ids(file_path)
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"读取用户列表失败: {e}")
+            return
+        self.user_input.setText(', '.join(user_ids))
+
     def load_config(self):
         """加载配置文件"""
         try:
-            with open('config.json', 'r', encoding='utf-8') as f:
+            with open(paths.config_path(), 'r', encoding='utf-8') as f:
                 config = json.load(f)
                 # 确保配置结构正确
                 if 'auth_token' not in config:
@@ -163,6 +288,8 @@ class MainWindow(QWidget):
         self.progress_bar.setRange(0, 100)  # 确保是正常模式
         self.phase_label.setText("等待开始")
         self.stats_label.setText("")
+        self.download_progress_bar.setValue(0)
+        self.download_stats_label.setText("")
         self.log_display.clear()
 
         scroll = self.scroll_input.text()
@@ -173,14 +300,36 @@ class MainWindow(QWidget):
             QMessageBox.warning(self, "错误", "请先在设置中配置 auth_token！")
             return
 
+        # 预热的浏览器交给爬虫线程（HTTP 后端用不上，留给下一次）
+        backend = 'http' if self.http_checkbox.isChecked() else 'browser'
+        prewarm = None
+        if backend == 'browser' and self.prewarm_thread is not None:
+            prewarm, self.prewarm_thread = self.prewarm_thread, None
+
         self.start.setEnabled(False)
+        self.stop_button.setEnabled(True)
         self.thread = CrawlerThread(
             path=self.path_input.text(),
             user=self.user_input.text(),
             move_step=int(self.scroll_input.text()),
             auth_token=auth_token,  # 🆕 使用动态配置
             father_class=father_class,  # 🆕 使用动态配置
-            headless = self.headless_mode
+            headless = self.headless_mode,
+            download_workers=int(self.workers_input.text()),
+            incremental=self.incremental_checkbox.isChecked(),
+            resume=self.resume_checkbox.isChecked(),
+            backend=backend,
+            api_query_ids=self.current_config.get('graphql_query_ids'),
+            crawl_workers=int(self.crawl_workers_input.text()),
+            prewarm=prewarm,
+            metrics_dir=self.current_config.get('metrics_dir'),
+            log_level=self.current_config.get('log_level', 'INFO'),
+            log_path=self.current_config.get('log_file'),
+            variant=self.current_config.get('variant'),
+            postprocess=self.current_config.get('postprocess'),
+            media_types=self.current_config.get('media_types'),
+            lean=bool(self.current_config.get('lean_browser', False)),
+            extract_tabs=int(self.current_config.get('extract_tabs', 1))
         )
         self.thread.log_signal.connect(self.log_output)
         self.thread.phase_signal.connect(self.update_phase)
@@ -189,17 +338,51 @@ class MainWindow(QWidget):
         self.thread.start()
 
     def log_output(self, message):
+        # message 是 LogChannel 合并的一批日志（多行）
         self.log_display.append(message)
 
     def on_finished(self):
         self.start.setEnabled(True)
-        QMessageBox.information(self, "完成", "爬虫任务已完成！")
+        self.stop_button.setEnabled(False)
+        # 为下一次任务预热
+        self.start_prewarm()
+        if self.thread.cancel_token.cancelled:
+            QMessageBox.information(self, "已停止", "爬虫任务已停止，可用“断点续爬”继续。")
+        else:
+            QMessageBox.information(self, "完成", "爬虫任务已完成！")
+
+    def stop_crawler(self):
+        if self.crawler_running():
+            self.stop_button.setEnabled(False)
+            self.log_output("正在停止，等待当前步骤结束...")
+            self.thread.cancel()
+
+    def reap_stale_drivers(self):
+        """上次程序被强制结束时残留的 msedgedriver / Edge 进程"""
+        try:
+            driver_registry.reap_stale(log_func=self.log_output)
+        except OSError as e:
+            self.log_output(f"清理残留浏览器进程失败: {e}")
+
+    def shutdown_crawler(self):
+        """
+        关闭窗口时停止爬虫线程：先取消并等待它自行结束（关闭浏览器、保存检查点），
+        超时才 terminate()，再结束它留下的浏览器进程。
+        """
+        # 窗口正在关闭，线程结束后不再弹窗或重新预热
+        self.thread.finished.disconnect(self.on_finished)
+        self.thread.cancel()
+        if not self.thread.wait(CANCEL_TIMEOUT_MS):
+            self.thread.terminate()
+            self.thread.wait()
+            self.discard_prewarm()
+            driver_registry.reap_stale(include_own=True)
 
     def close_application(self):
         self.close()
 
     def closeEvent(self, event: QCloseEvent):
-        if hasattr(self, 'thread') and self.thread.isRunning():
+        if self.crawler_running():
             reply = QMessageBox.question(
                 self, '确认退出',
                 "爬虫任务仍在运行，确定要退出吗？",
@@ -208,16 +391,22 @@ class MainWindow(QWidget):
             )
 
             if reply == QMessageBox.StandardButton.Yes:
-                self.thread.terminate()
-                self.thread.wait()
+                self.shutdown_crawler()
+                self.discard_prewarm()
                 event.accept()
             else:
                 event.ignore()
         else:
+            self.discard_prewarm()
             event.accept()
 
     def update_phase(self, phase_name, progress):
         """更新阶段和进度条"""
+        # 下载阶段与滚动阶段同时进行，使用独立的进度条
+        if phase_name == "下载图片":
+            self.download_progress_bar.setValue(progress)
+            return
+
         self.phase_label.setText(f"当前阶段: {phase_name}")
 
         # 如果是"滚动查找图片"阶段，设置为忙碌模式
@@ -230,6 +419,10 @@ class MainWindow(QWidget):
 
     def update_stats(self, stats_text):
         """更新统计信息，同时判断是否进入忙碌模式"""
+        if stats_text.startswith("下载"):
+            self.download_stats_label.setText(stats_text)
+            return
+
         self.stats_label.setText(stats_text)
 
         # 判断是否是查找阶段（根据统计文本内容）
@@ -269,6 +462,8 @@ class MainWindow(QWidget):
             self.stats_label.setText(stats_text)
 
 if __name__ == '__main__':
+    # 批量任务使用多进程，打包成 exe 后必须调用
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
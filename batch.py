@@ -0,0 +1,236 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cancellation
+import checkpoint as crawl_checkpoint
+import download
+import log_channel
+import media_index
+
+DEFAULT_CRAWL_WORKERS = 2  # 默认同时运行的浏览器（进程）数
+
+
+def parse_user_ids(text):
+    """
+    解析用户 ID 列表：支持换行、逗号、空格分隔，忽略 # 开头的注释行和 @ 前缀，保持顺序去重。
+    """
+    user_ids = []
+    for line in text.splitlines():
+        line = line.split('#', 1)[0]
+        for item in line.replace(',', ' ').split():
+            user_id = item.strip().lstrip('@')
+            if user_id and user_id not in user_ids:
+                user_ids.append(user_id)
+    return user_ids
+
+
+def load_user_ids(path):
+    """从文本文件读取用户 ID 列表（格式同 parse_user_ids）。"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_user_ids(f.read())
+
+
+class QueueLog:
+    """
+    子进程里的 log_func：日志经跨进程队列送回主进程，debug() 的明细带上级别，
+    主进程转发给 LogChannel 时仍按 DEBUG 处理。
+    """
+
+    def __init__(self, message_queue, user_id):
+        self.message_queue = message_queue
+        self.user_id = user_id
+
+    def __call__(self, message):
+        self.message_queue.put(('log', self.user_id, message, None))
+
+    def debug(self, message):
+        self.message_queue.put(('log', self.user_id, message, 'DEBUG'))
+
+
+class QueueSink:
+    """
+    子进程里代替 DownloadPipeline 的提交端：
+    main_use 调用 submit() 时把媒体放进跨进程队列，由主进程的共享下载池统一下载。
+    """
+
+    def __init__(self, message_queue, user_id):
+        self.message_queue = message_queue
+        self.user_id = user_id
+        self.submitted = 0
+
+    def submit(self, url, meta=None):
+        self.submitted += 1
+        self.message_queue.put(('media', self.user_id, url, meta))
+        return self.submitted
+
+
+def _crawl_user(user_id, options, message_queue, cancel_event=None):
+    """
+    【批量任务子进程】
+    在独立进程中用自己的浏览器爬取一个用户，媒体和日志都经 message_queue 送回主进程。
+    cancel_event 为主进程 Manager 创建的 Event，主进程取消时子进程在下一个检查点停止并关闭浏览器。
+    必须是模块级函数，才能被 ProcessPoolExecutor 序列化。
+    """
+    import use  # 子进程里才需要 Selenium
+
+    return use.main_use(
+        user_id=user_id,
+        log_func=QueueLog(message_queue, user_id),
+        pipeline=QueueSink(message_queue, user_id),
+        cancel=cancellation.CancelToken(cancel_event) if cancel_event is not None else None,
+        **options
+    )
+
+
+def run_batch(user_ids, download_dir, cookies, url, father_class, move_step, driver_path,
+              crawl_workers=DEFAULT_CRAWL_WORKERS, download_workers=download.DEFAULT_WORKERS,
+              per_user_dirs=True, index_path=media_index.DEFAULT_INDEX_PATH, dedupe=False,
+              log_func=print, phase_callback=None, stats_callback=None, variant_policy=None, postprocessor=None,
+              cancel=None, **main_use_options):
+    """
+    【批量任务模块】
+    用 crawl_workers 个进程（各自一个浏览器）并行爬取多个用户，
+    所有用户的媒体汇总到主进程的一个共享下载池中下载，最后按用户汇报结果。
+
+    Args:
+        user_ids (list): 用户 ID 列表。
+        crawl_workers (int): 同时运行的爬取进程数。
+        download_workers (int): 共享下载池的线程数。
+        per_user_dirs (bool): 是否按用户建立子文件夹保存。
+        variant_policy: 共享下载池使用的 variants.VariantPolicy（流量预算由所有用户共用）。
+        postprocessor: 共享下载池使用的 postprocess.PostProcessor（未启动），所有用户的元数据写入同一个文件。
+        cancel: 可选的 cancellation.CancelToken，取消时转发给所有子进程，
+            尚未开始的用户立即结束（记为出错“任务已取消”），共享下载池跳过其余下载。
+        其余参数与 use.main_use 相同，额外的关键字参数会原样传给每个 main_use。
+
+    返回：
+        dict: {user_id: {'found', 'submitted', 'downloaded', 'failed', 'error'}}
+    """
+    results = {user_id: {'found': 0, 'submitted': 0, 'downloaded': 0, 'failed': 0, 'error': None}
+               for user_id in user_ids}
+    checkpoints = {}  # user_id -> 子进程保留的检查点路径，该用户的下载全部完成后才删除
+    results_lock = threading.Lock()
+    index = media_index.MediaIndex(index_path)
+
+    def record_download(media_address, result, meta):
+        index.add(meta['media_id'] or media_address, meta['user_id'], meta['tweet_id'], media_address,
+                  result['path'], result['size'], result['sha256'], result.get('variant'),
+                  result.get('expected_size'))
+        with results_lock:
+            results[meta['user_id']]['downloaded'] += 1
+
+    def download_progress(current_num, total_count):
+        if phase_callback:
+            phase_callback("下载图片", int(current_num / total_count * 100) if total_count else 0)
+        if stats_callback:
+            stats_callback(f"下载进度: {current_num}/{total_count}")
+
+    pipeline = download.DownloadPipeline(
+        download_dir,
+        workers=download_workers,
+        log_func=log_func,
+        progress_callback=download_progress,
+        on_complete=record_download,
+        dedupe=dedupe,
+        hash_lookup=index.path_for_hash,
+        variant_policy=variant_policy,
+        postprocessor=postprocessor,
+        cancel=cancel
+    )
+    options = dict(main_use_options, download_dir=download_dir, cookies=cookies, url=url,
+                   father_class=father_class, move_step=move_step, driver_path=driver_path,
+                   index_path=index_path)
+
+    manager = multiprocessing.Manager()
+    # 有界队列：下载跟不上时子进程的 submit() 会阻塞
+    message_queue = manager.Queue(maxsize=download_workers * 16)
+    # 取消令牌只在本进程内有效，经 Manager 的 Event 转发给子进程
+    cancel_event = manager.Event()
+
+    def forward_cancel():
+        try:
+            cancel_event.set()
+        except (OSError, EOFError):
+            pass  # 批量任务已结束，管理进程已关闭
+
+    if cancel is not None:
+        cancel.on_cancel(forward_cancel)
+
+    def drain_messages():
+        # 主进程中的转发线程：媒体交给共享下载池，日志加上用户前缀
+        while True:
+            message = message_queue.get()
+            if message is None:
+                break
+            kind, user_id = message[0], message[1]
+            if kind == 'media':
+                _, _, media_address, meta = message
+                meta = dict(meta or {})
+                if per_user_dirs:
+                    meta['download_dir'] = os.path.join(download_dir, user_id)
+                pipeline.submit(media_address, meta)
+            elif kind == 'log':
+                _, _, text, level = message
+                forward = log_channel.debug_func(log_func) if level == 'DEBUG' else log_func
+                forward(f"[{user_id}] {text}")
+
+    if postprocessor is not None:
+        postprocessor.start()
+    pipeline.start()
+    drain_thread = threading.Thread(target=drain_messages, name='batch-drain', daemon=True)
+    drain_thread.start()
+
+    crawl_workers = max(1, min(int(crawl_workers), len(user_ids) or 1))
+    log_func(f"--- 批量任务：{len(user_ids)} 个用户，{crawl_workers} 个浏览器进程，{pipeline.workers} 个下载线程 ---")
+    if phase_callback:
+        phase_callback("批量任务", 0)
+
+    try:
+        with ProcessPoolExecutor(max_workers=crawl_workers) as executor:
+            futures = {executor.submit(_crawl_user, user_id, options, message_queue, cancel_event): user_id
+                       for user_id in user_ids}
+            for done_count, future in enumerate(as_completed(futures), start=1):
+                user_id = futures[future]
+                try:
+                    crawl_result = future.result()
+                    with results_lock:
+                        results[user_id]['found'] = crawl_result['found']
+                        results[user_id]['submitted'] = crawl_result['submitted']
+                    if crawl_result.get('checkpoint'):
+                        checkpoints[user_id] = crawl_result['checkpoint']
+                    log_func(f"✅ 用户 {user_id} 爬取完成，提交 {crawl_result['submitted']} 个媒体。")
+                except Exception as e:
+                    results[user_id]['error'] = str(e)
+                    log_func(f"❌ 用户 {user_id} 爬取出错：{e}")
+                if phase_callback:
+                    phase_callback("批量任务", int(done_count / len(user_ids) * 100))
+                if stats_callback:
+                    stats_callback(f"用户进度: {done_count}/{len(user_ids)}")
+    finally:
+        message_queue.put(None)
+        drain_thread.join()
+        pipeline.close()
+        if postprocessor is not None:
+            postprocessor.close()
+        manager.shutdown()
+        index.close()
+
+    # 共享下载池已排空：全部下载成功的用户删除检查点；有失败或被跳过的保留，续爬时重新提交
+    for user_id, path in checkpoints.items():
+        result = results[user_id]
+        if result['downloaded'] >= result['submitted'] and not (cancel is not None and cancel.cancelled):
+            crawl_checkpoint.CrawlCheckpoint(path, user_id).clear()
+        else:
+            log_func(f"用户 {user_id} 有未完成的下载，已保留检查点，可用“断点续爬”继续: {path}")
+
+    log_func("\n=======================================================")
+    log_func("                  批量任务结果                    ")
+    log_func("=======================================================")
+    for user_id, result in results.items():
+        result['failed'] = result['submitted'] - result['downloaded']
+        status = f"出错: {result['error']}" if result['error'] else "完成"
+        log_func(f"{user_id}: 提交 {result['submitted']}，下载成功 {result['downloaded']}，"
+                 f"失败 {result['failed']}（{status}）")
+    log_func("=======================================================")
+    return results
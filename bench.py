@@ -0,0 +1,555 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# 与 config.json 默认的 father_class 相同，回放页面的格子使用这些 class 片段
+FATHER_CLASS = ['r-18u37iz', 'r-9aw3ui']
+BENCH_USER = 'bench_user'
+BENCH_USER_ID = '42'
+BENCH_TOKEN = 'bench-token'
+# 假 HLS 视频每路的分片数和每个分片相对 image_size 的大小
+HLS_SEGMENTS = 8
+HLS_SEGMENT_SCALE = 0.25
+# 各尺寸变体相对原图的体积比例
+_VARIANT_SCALES = {'orig': 1.0, '4096x4096': 1.0, 'large': 0.5, 'medium': 0.25, 'small': 0.1}
+
+_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{user} / media</title>
+<style>
+#grid {{ display: grid; grid-template-columns: repeat(3, 1fr); gap: 2px; width: 600px; }}
+.cell img, .cell video {{ width: 100%; height: 200px; object-fit: cover; display: block; }}
+</style></head>
+<body>
+<div id="grid"></div>
+<script>
+const API = '/i/api/graphql/bench/UserMedia';
+const FATHER = {father};
+let cursor = null, loading = false, done = false;
+
+function tweets(payload) {{
+    const result = [];
+    const stack = [payload];
+    while (stack.length) {{
+        const node = stack.pop();
+        if (Array.isArray(node)) {{ for (let i = node.length - 1; i >= 0; i--) stack.push(node[i]); continue; }}
+        if (!node || typeof node !== 'object') continue;
+        if (node.cursorType === 'Bottom') cursor = node.value;
+        if (node.extended_entities && node.id_str) {{ result.push(node); continue; }}
+        for (const key of Object.keys(node).reverse()) stack.push(node[key]);
+    }}
+    return result;
+}}
+
+function render(tweet) {{
+    const media = tweet.extended_entities.media;
+    const first = media[0];
+    const cell = document.createElement('div');
+    cell.className = 'css-175oi2r cell ' + FATHER.join(' ');
+    const anchor = document.createElement('a');
+    if (first.type === 'photo') {{
+        anchor.href = '/{user}/status/' + tweet.id_str + '/photo/1';
+        const img = document.createElement('img');
+        img.src = first.media_url_https.replace(/\\.jpg$/, '') + '?format=jpg&name=small';
+        img.alt = '图像';
+        anchor.appendChild(img);
+        if (media.length > 1) {{
+            anchor.appendChild(document.createElementNS('http://www.w3.org/2000/svg', 'svg'));
+        }}
+    }} else {{
+        anchor.href = '/{user}/status/' + tweet.id_str + '/video/1';
+        const video = document.createElement('video');
+        video.poster = first.media_url_https;
+        anchor.appendChild(video);
+    }}
+    cell.appendChild(anchor);
+    document.getElementById('grid').appendChild(cell);
+}}
+
+async function load() {{
+    if (loading || done) return;
+    loading = true;
+    const variables = {{userId: '{user_id}', count: {page_size}}};
+    const previous = cursor;
+    if (cursor) variables.cursor = cursor;
+    const response = await fetch(API + '?variables=' + encodeURIComponent(JSON.stringify(variables)));
+    const found = tweets(await response.json());
+    found.forEach(render);
+    if (!found.length || cursor === previous) done = true;
+    loading = false;
+    if (document.body.scrollHeight <= window.innerHeight + 10) load();
+}}
+
+window.addEventListener('scroll', () => {{
+    if (window.innerHeight + window.scrollY >= document.body.scrollHeight - 800) load();
+}});
+load();
+</script>
+</body></html>
+"""
+
+
+class _ReplayHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 下载端提前关闭连接（如收到 429 后）属于正常情况，不打印堆栈
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+def make_timeline(tweets=200, multi_ratio=0.2, video_ratio=0.1, seed=1):
+    """
+    【合成时间线】
+    生成 tweets 条推文：约 multi_ratio 为 2~4 张图的多图推文，约 video_ratio 为视频/GIF，其余为单图。
+    返回：
+        list[dict]: 每条 {'tweet_id', 'media': [{'media_id', 'type'}]}，按时间倒序
+    """
+    rng = random.Random(seed)
+    timeline_tweets = []
+    media_number = 0
+    for i in range(tweets):
+        roll = rng.random()
+        if roll < video_ratio:
+            kinds = [rng.choice(['video', 'animated_gif'])]
+        elif roll < video_ratio + multi_ratio:
+            kinds = ['photo'] * rng.randint(2, 4)
+        else:
+            kinds = ['photo']
+        media = []
+        for kind in kinds:
+            media_number += 1
+            media.append({'media_id': f'Bench{media_number:08d}', 'type': kind})
+        timeline_tweets.append({'tweet_id': str(1900000000000000000 - i), 'media': media})
+    return timeline_tweets
+
+
+class ReplayServer:
+    """
+    【离线回放服务器】
+    在本地提供一个模拟的 X：首页（下发 ct0）、用户媒体页（与真实页面相同的 class 片段，滚动时按游标加载）、
+    GraphQL 的 UserByScreenName / UserMedia 接口，以及一个可调延迟和带宽的假 pbs 图片主机。
+    use.main_use 的 url 传 server.base_url 即可在不登录真实账号的情况下跑完整流程。
+
+    用法：
+        with ReplayServer(tweets=300, latency=0.05, bandwidth=512 * 1024) as server:
+            use.main_use(..., url=server.base_url, backend='http')
+    """
+
+    def __init__(self, tweets=200, multi_ratio=0.2, video_ratio=0.1, page_size=20, image_size=200 * 1024,
+                 latency=0.0, bandwidth=0, max_rps=0, seed=1, port=0):
+        """
+        Args:
+            tweets (int): 推文数量。
+            multi_ratio / video_ratio (float): 多图推文、视频推文所占比例。
+            page_size (int): 每页推文数。
+            image_size (int): 每张图片的字节数。
+            latency (float): 图片主机的首字节延迟（秒）。
+            bandwidth (int): 图片主机每个连接的带宽（字节/秒），0 为不限速。
+            max_rps (float): 图片主机每秒允许的请求数，超出时返回 429 和 Retry-After，0 为不限流。
+            port (int): 监听端口，0 为自动分配。
+        """
+        self.timeline = make_timeline(tweets, multi_ratio, video_ratio, seed)
+        self._tweets_by_id = {tweet['tweet_id']: tweet for tweet in self.timeline}
+        self.page_size = max(1, int(page_size))
+        self.image_size = int(image_size)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.max_rps = max_rps
+        self.throttled_requests = 0
+        self._rps_window = []  # 最近一秒内放行的请求时间
+        self.media_requests = 0
+        self._lock = threading.Lock()
+        self._httpd = _ReplayHTTPServer(('127.0.0.1', port), self._make_handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self._httpd.server_address[1]}/'
+
+    @property
+    def page_count(self):
+        return math.ceil(len(self.timeline) / self.page_size)
+
+    def photo_urls(self):
+        """时间线中所有图片的原图地址（供单独测试下载）。"""
+        return [f'{self.base_url}media/{media["media_id"]}?format=jpg&name=orig'
+                for tweet in self.timeline for media in tweet['media'] if media['type'] == 'photo']
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='replay-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    # ---- 页面内容 ----
+
+    def _tweet_payload(self, tweet):
+        base = self.base_url.rstrip('/')
+        media_list = []
+        for media in tweet['media']:
+            if media['type'] == 'photo':
+                media_list.append({'type': 'photo', 'id_str': media['media_id'],
+                                   'media_url_https': f'{base}/media/{media["media_id"]}.jpg'})
+            else:
+                media_list.append({
+                    'type': media['type'], 'id_str': media['media_id'],
+                    'media_url_https': f'{base}/ext_tw_video_thumb/{media["media_id"]}/pu/img/thumb.jpg',
+                    'video_info': {'variants': [
+                        {'content_type': 'video/mp4', 'bitrate': 832000, 'url': f'{base}/vid/{media["media_id"]}.mp4'},
+                        {'content_type': 'application/x-mpegURL', 'url': f'{base}/vid/{media["media_id"]}.m3u8'},
+                    ]},
+                })
+        return {'rest_id': tweet['tweet_id'],
+                'legacy': {'id_str': tweet['tweet_id'], 'extended_entities': {'media': media_list}}}
+
+    def timeline_page(self, cursor=None):
+        """返回游标对应的一页 UserMedia JSON，结构与网页端接口相同。"""
+        page = int(cursor[1:]) if cursor and cursor.startswith('C') else 0
+        start = page * self.page_size
+        entries = [{'content': {'itemContent': {'tweet_results': {'result': self._tweet_payload(tweet)}}}}
+                   for tweet in self.timeline[start:start + self.page_size]]
+        if start + self.page_size < len(self.timeline):
+            entries.append({'content': {'cursorType': 'Bottom', 'value': f'C{page + 1}'}})
+        return {'data': {'user': {'result': {'timeline_v2': {'timeline': {
+            'instructions': [{'type': 'TimelineAddEntries', 'entries': entries}]}}}}}}
+
+    def media_page(self, user):
+        return _PAGE_TEMPLATE.format(user=user, user_id=BENCH_USER_ID, page_size=self.page_size,
+                                     father=json.dumps(FATHER_CLASS))
+
+    def photo_page(self, user, tweet_id):
+        """
+        推文图片页 /<user>/status/<id>/photo/1：推文详情中每张图一个 /photo/<n> 链接（与真实页面相同），
+        供多标签页提取（extract_tabs）回放多图推文。不存在的推文返回 None。
+        """
+        tweet = self._tweets_by_id.get(tweet_id)
+        if tweet is None:
+            return None
+        base = self.base_url.rstrip('/')
+        links = ''.join(f'<a href="/{user}/status/{tweet_id}/photo/{n}">'
+                        f'<img alt="图像" src="{base}/media/{media["media_id"]}?format=jpg&amp;name=small"></a>'
+                        for n, media in enumerate(tweet['media'], start=1) if media['type'] == 'photo')
+        return f'<!DOCTYPE html><html><head><meta charset="utf-8"></head><body><article>{links}</article></body></html>'
+
+    def hls_playlist(self, name):
+        """
+        假的 HLS 播放列表：<媒体ID>.m3u8 为主播放列表（两路视频 + 一路音轨），
+        视频为 TS 分片，音轨为 fMP4（初始化分片 + .m4s），结构与 video.twimg.com 相同。
+        """
+        if '/' not in name:
+            media_id = name[:-len('.m3u8')]
+            return '\n'.join([
+                '#EXTM3U',
+                f'#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="audio-128000",NAME="Audio",URI="{media_id}/audio.m3u8"',
+                '#EXT-X-STREAM-INF:BANDWIDTH=256000,RESOLUTION=480x270,AUDIO="audio-128000"',
+                f'{media_id}/270p.m3u8',
+                '#EXT-X-STREAM-INF:BANDWIDTH=2176000,RESOLUTION=1280x720,AUDIO="audio-128000"',
+                f'{media_id}/720p.m3u8',
+            ]) + '\n'
+        rendition = name.rsplit('/', 1)[1][:-len('.m3u8')]
+        lines = ['#EXTM3U', '#EXT-X-VERSION:6', '#EXT-X-TARGETDURATION:3', '#EXT-X-PLAYLIST-TYPE:VOD']
+        if rendition == 'audio':
+            lines.append('#EXT-X-MAP:URI="audio/init.m4s"')
+        for i in range(HLS_SEGMENTS):
+            lines += ['#EXTINF:3.000,', f'{rendition}/{i}.{"m4s" if rendition == "audio" else "ts"}']
+        return '\n'.join(lines + ['#EXT-X-ENDLIST']) + '\n'
+
+    def media_bytes(self, name, scale=1.0):
+        """每个媒体的内容固定且互不相同（用 ID 的哈希填充到 image_size × scale）。"""
+        size = max(64, int(self.image_size * scale))
+        seed = hashlib.sha256(name.encode('utf-8')).digest()
+        return (b'\xff\xd8\xff\xe0' + seed * (size // len(seed) + 1))[:size]
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            head_only = False
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, content_type, headers=None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if not self.head_only:
+                    self.wfile.write(body)
+
+            def _send_media(self, name, content_type, scale=1.0):
+                with server._lock:
+                    server.media_requests += 1
+                    if server.max_rps:
+                        now = time.monotonic()
+                        server._rps_window = [t for t in server._rps_window if now - t < 1.0]
+                        throttled = len(server._rps_window) >= server.max_rps
+                        if throttled:
+                            server.throttled_requests += 1
+                        else:
+                            server._rps_window.append(now)
+                if server.max_rps and throttled:
+                    self._send(429, b'rate limited', 'text/plain', {'Retry-After': '1'})
+                    return
+                if server.latency:
+                    time.sleep(server.latency)
+                body = server.media_bytes(name, scale)
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if self.head_only:
+                    return
+                if not server.bandwidth:
+                    self.wfile.write(body)
+                    return
+                # 按带宽分块发送，模拟慢速 CDN
+                chunk_size = 16 * 1024
+                for offset in range(0, len(body), chunk_size):
+                    chunk = body[offset:offset + chunk_size]
+                    self.wfile.write(chunk)
+                    time.sleep(len(chunk) / server.bandwidth)
+
+            def do_GET(self):
+                self.head_only = False
+                self._route()
+
+            def do_HEAD(self):
+                # 同一连接上的请求共用一个 Handler 实例，每次都要重新设置
+                self.head_only = True
+                self._route()
+
+            def _route(self):
+                parts = urlsplit(self.path)
+                path = parts.path
+                query = parse_qs(parts.query)
+                if path == '/':
+                    self._send(200, b'<html><body>replay</body></html>', 'text/html; charset=utf-8',
+                               {'Set-Cookie': 'ct0=benchcsrf; Path=/'})
+                elif path.endswith('/UserByScreenName'):
+                    body = {'data': {'user': {'result': {'rest_id': BENCH_USER_ID}}}}
+                    self._send(200, json.dumps(body).encode('utf-8'), 'application/json')
+                elif path.endswith('/UserMedia'):
+                    variables = json.loads(query.get('variables', ['{}'])[0])
+                    body = server.timeline_page(variables.get('cursor'))
+                    self._send(200, json.dumps(body).encode('utf-8'), 'application/json')
+                elif path.startswith('/media/'):
+                    # 尺寸越小 / webp 格式体积越小，用于测试 variants 的变体选择
+                    image_format = query.get('format', ['jpg'])[0]
+                    scale = _VARIANT_SCALES.get(query.get('name', ['orig'])[0], 1.0)
+                    scale *= 0.7 if image_format == 'webp' else 1.0
+                    self._send_media(path.rsplit('/', 1)[1].split('.')[0],
+                                     'image/webp' if image_format == 'webp' else 'image/jpeg', scale)
+                elif path.startswith('/ext_tw_video_thumb/'):
+                    self._send_media(path.split('/')[2] + '_thumb', 'image/jpeg')
+                elif path.startswith('/vid/') and path.endswith('.mp4'):
+                    self._send_media(path.rsplit('/', 1)[1], 'video/mp4')
+                elif path.startswith('/vid/') and path.endswith('.m3u8'):
+                    self._send(200, server.hls_playlist(path[len('/vid/'):]).encode('utf-8'),
+                               'application/x-mpegURL')
+                elif path.startswith('/vid/') and path.endswith(('.ts', '.m4s')):
+                    self._send_media(path[len('/vid/'):], 'video/mp2t' if path.endswith('.ts') else 'video/iso.segment',
+                                     HLS_SEGMENT_SCALE)
+                elif '/status/' in path and '/photo/' in path:
+                    user, _, tweet_id = path.split('/')[1:4]
+                    page = server.photo_page(user, tweet_id)
+                    if page is None:
+                        self._send(404, b'not found', 'text/plain')
+                    else:
+                        self._send(200, page.encode('utf-8'), 'text/html; charset=utf-8')
+                elif path.endswith('/media') and path.count('/') == 2:
+                    self._send(200, server.media_page(path.split('/')[1]).encode('utf-8'), 'text/html; charset=utf-8')
+                else:
+                    self._send(404, b'not found', 'text/plain')
+
+        return Handler
+
+
+# ---- 基准测试 ----
+
+def _result(name, seconds, images, size, extra=None):
+    result = {
+        'name': name,
+        'seconds': seconds,
+        'images': images,
+        'bytes': size,
+        'images_per_second': images / seconds if seconds else 0.0,
+        'mb_per_second': size / 1024 / 1024 / seconds if seconds else 0.0,
+    }
+    result.update(extra or {})
+    return result
+
+
+def _quiet(message):
+    pass
+
+
+def bench_download(server, workers, log_func=_quiet):
+    """只测下载：download.download_main 下载时间线中的全部图片。"""
+    import download
+    urls = server.photo_urls()
+    with tempfile.TemporaryDirectory() as download_dir:
+        start = time.perf_counter()
+        succeeded = download.download_main(urls, download_dir, log_func=log_func, workers=workers)
+        seconds = time.perf_counter() - start
+    return _result(f'download_main workers={workers}', seconds, succeeded, succeeded * server.image_size)
+
+
+def _bench_main_use(name, server, workers, log_func, **options):
+    import use
+    with tempfile.TemporaryDirectory() as download_dir:
+        start = time.perf_counter()
+        result = use.main_use(
+            download_dir=download_dir,
+            cookies=BENCH_TOKEN,
+            url=server.base_url,
+            user_id=BENCH_USER,
+            father_class=FATHER_CLASS,
+            log_func=log_func,
+            download_workers=workers,
+            index_path=os.path.join(download_dir, 'bench_index.db'),
+            checkpoint_dir=os.path.join(download_dir, 'checkpoints'),  # 不碰用户数据目录中的检查点
+            **options
+        )
+        seconds = time.perf_counter() - start
+    metrics = result.get('metrics') or {}
+    extra = {
+        'found': result['found'],
+        'phases': metrics.get('phases', {}),
+        'webdriver_commands': metrics.get('webdriver_commands_total', 0),
+        'latency_seconds': metrics.get('latency_seconds', {}),
+    }
+    downloaded = result['downloaded'] or 0
+    return _result(name, seconds, downloaded, downloaded * server.image_size, extra)
+
+
+def bench_http_backend(server, workers, log_func=_quiet):
+    """端到端（无浏览器）：use.main_use(backend='http') 翻页 + 下载。"""
+    return _bench_main_use(f'main_use http workers={workers}', server, workers, log_func,
+                           move_step=server.page_count + 1, driver_path=None, backend='http')
+
+
+def bench_browser(server, workers, driver_path, extract_mode='fast', scroll_mode='event', headless=True,
+                  log_func=_quiet, lean=False, extract_tabs=1):
+    """
+    端到端（浏览器）：Edge 打开回放页面滚动提取 + 下载，需要 msedgedriver。
+    回放页面没有大图模态框，'click' 模式和多图推文的点击回退无法回放，建议用 'fast' 或 'network'；
+    extract_tabs > 1 时多图推文改为在标签页中打开图片页提取，可以回放。
+    lean=True 时以精简模式启动浏览器，可与普通模式对比滚动阶段的耗时。
+    """
+    return _bench_main_use(f'main_use browser {extract_mode}/{scroll_mode}{" lean" if lean else ""}'
+                           f'{f" tabs={extract_tabs}" if extract_tabs > 1 else ""} workers={workers}', server, workers,
+                           log_func, move_step=server.page_count * 4, driver_path=driver_path,
+                           extract_mode=extract_mode, scroll_mode=scroll_mode, headless=headless, lean=lean,
+                           extract_tabs=extract_tabs)
+
+
+def format_results(results):
+    lines = [f"{'benchmark':<44}{'seconds':>9}{'images':>8}{'img/s':>9}{'MB/s':>8}"]
+    for result in results:
+        lines.append(f"{result['name']:<44}{result['seconds']:>9.2f}{result['images']:>8}"
+                     f"{result['images_per_second']:>9.1f}{result['mb_per_second']:>8.2f}")
+    return '\n'.join(lines)
+
+
+def run_suite(tweets=200, multi_ratio=0.2, video_ratio=0.1, page_size=20, image_size=200 * 1024,
+              latency=0.05, bandwidth=0, max_rps=0, workers_list=(1, 4, 8), browser=False, driver_path=None,
+              extract_mode='fast', scroll_mode='event', headless=True, log_func=_quiet, lean=False, extract_tabs=1):
+    """
+    【基准测试套件】
+    启动回放服务器，对每个并发数依次测试 download_main 和 HTTP 后端的 main_use，
+    给出 driver_path 且 browser=True 时再测浏览器端到端流程。
+    返回：
+        list[dict]: 每项测试的 seconds / images / bytes / images_per_second / mb_per_second 等
+    """
+    results = []
+    with ReplayServer(tweets=tweets, multi_ratio=multi_ratio, video_ratio=video_ratio, page_size=page_size,
+                      image_size=image_size, latency=latency, bandwidth=bandwidth, max_rps=max_rps) as server:
+        for workers in workers_list:
+            results.append(bench_download(server, workers, log_func))
+            results.append(bench_http_backend(server, workers, log_func))
+            if browser:
+                results.append(bench_browser(server, workers, driver_path, extract_mode, scroll_mode,
+                                             headless, log_func, lean, extract_tabs))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='离线回放基准测试：本地模拟时间线和图片主机，测量滚动、提取和下载速度。')
+    parser.add_argument('--tweets', type=int, default=200, help='推文数量')
+    parser.add_argument('--multi-ratio', type=float, default=0.2, help='多图推文比例')
+    parser.add_argument('--video-ratio', type=float, default=0.1, help='视频/GIF 推文比例')
+    parser.add_argument('--page-size', type=int, default=20, help='每页推文数')
+    parser.add_argument('--image-kb', type=int, default=200, help='每张图片大小（KB）')
+    parser.add_argument('--latency-ms', type=float, default=50, help='图片主机首字节延迟（毫秒）')
+    parser.add_argument('--bandwidth-kb', type=float, default=0, help='图片主机每连接带宽（KB/s），0 为不限速')
+    parser.add_argument('--max-rps', type=float, default=0, help='图片主机每秒请求上限，超出返回 429，0 为不限流')
+    parser.add_argument('--workers', default='1,4,8', help='要测试的并发下载数，逗号分隔')
+    parser.add_argument('--browser', action='store_true', help='同时测试浏览器端到端流程（需要 msedgedriver）')
+    parser.add_argument('--driver-path', default=None, help='msedgedriver 路径，默认自动定位')
+    parser.add_argument('--extract-mode', default='fast', choices=['fast', 'network'], help='浏览器测试的提取方式')
+    parser.add_argument('--scroll-mode', default='event', choices=['event', 'fixed'], help='浏览器测试的滚动方式')
+    parser.add_argument('--show-browser', action='store_true', help='浏览器测试时显示窗口')
+    parser.add_argument('--lean', action='store_true', help='浏览器测试使用精简模式（不加载图片、视频、字体）')
+    parser.add_argument('--extract-tabs', type=int, default=1, help='多图推文并行提取的标签页数，1 为不使用')
+    parser.add_argument('--json', default=None, help='把结果写入 JSON 文件')
+    parser.add_argument('--verbose', action='store_true', help='输出运行日志')
+    args = parser.parse_args(argv)
+
+    driver_path = args.driver_path
+    if args.browser and not driver_path:
+        import selenium_a
+        driver_path = selenium_a.get_driver_path('msedgedriver.exe')
+
+    results = run_suite(
+        tweets=args.tweets,
+        multi_ratio=args.multi_ratio,
+        video_ratio=args.video_ratio,
+        page_size=args.page_size,
+        image_size=args.image_kb * 1024,
+        latency=args.latency_ms / 1000,
+        bandwidth=args.bandwidth_kb * 1024,
+        max_rps=args.max_rps,
+        workers_list=[int(item) for item in args.workers.split(',') if item.strip()],
+        browser=args.browser,
+        driver_path=driver_path,
+        extract_mode=args.extract_mode,
+        scroll_mode=args.scroll_mode,
+        headless=not args.show_browser,
+        lean=args.lean,
+        extract_tabs=args.extract_tabs,
+        log_func=print if args.verbose else _quiet
+    )
+    print(format_results(results))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import threading
+
+
+class CancelledError(Exception):
+    """任务已被取消（用户点击停止或关闭窗口）。"""
+
+
+class CancelToken:
+    """
+    【取消令牌】
+    由 GUI 线程调用 cancel()，爬取线程在滚动、提取、翻页和下载循环中调用 check()，
+    在下一个检查点抛出 CancelledError，由 finally 关闭浏览器、保存检查点，而不是被 QThread.terminate() 直接杀掉。
+
+    event 可以传入 multiprocessing.Manager().Event()，批量任务的子进程共用同一个取消状态。
+    """
+
+    def __init__(self, event=None):
+        self._event = event if event is not None else threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        self._event.set()
+        with self._lock:
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback):
+        """取消时调用 callback（已取消时立即调用），用于把取消转发给子进程等。"""
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def check(self):
+        """已取消时抛出 CancelledError。"""
+        if self._event.is_set():
+            raise CancelledError("任务已取消")
+
+    def sleep(self, seconds):
+        """可被取消打断的等待，取消时抛出 CancelledError。"""
+        if self._event.wait(seconds):
+            raise CancelledError("任务已取消")
+
+
+def check(cancel):
+    """cancel 为 None 时什么都不做，方便各循环统一调用。"""
+    if cancel is not None:
+        cancel.check()
@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+import time
+import paths
+
+DEFAULT_CHECKPOINT_DIR = 'checkpoints'  # 数据目录下，见 checkpoint_path()
+DEFAULT_INTERVAL = 5.0  # 两次写盘的最短间隔（秒）
+CHECKPOINT_VERSION = 1
+
+
+def checkpoint_path(checkpoint_dir, user_id):
+    """每个用户一个检查点文件。"""
+    return os.path.join(paths.data_path(checkpoint_dir), f'{user_id}.json')
+
+
+class CrawlCheckpoint:
+    """
+    【爬取检查点模块】
+    把一次爬取的进度定期写入 JSON 文件，进程被结束（包括 QThread.terminate）后可以从这里继续：
+    - seen：各去重结构中的键（iter_media 通过 track() 登记）；
+    - pending：已提交但还没下载完成的媒体 {键: [url, meta]}；
+    - position：HTTP 后端的翻页游标和页数，浏览器的滚动次数和滚动位置。
+    seen 和 position 只在 update() 时记录快照（每页 / 每次滚动的产出都已交给调用方之后），
+    出错时保存的也是最近一个一致的快照，不会把已标记为见过、但还没提交下载的媒体记下来。
+    写入时先写临时文件、fsync 后再改名，任何时刻中断都不会留下写了一半的检查点。
+
+    用法：
+        checkpoint = CrawlCheckpoint(path, user_id)
+        if resume:
+            checkpoint.load()
+        ...
+        checkpoint.update(cursor=...)  # 每个滚动循环 / 每页之后记录位置和去重键快照
+        checkpoint.maybe_save()        # 间隔未到时直接返回
+        checkpoint.clear()       # 正常结束后删除
+    """
+
+    def __init__(self, path, user_id, interval=DEFAULT_INTERVAL):
+        self.path = path
+        self.user_id = user_id
+        self.interval = interval
+        self.position = {}
+        self.pending = {}
+        self.restored = False
+        self._seen = {}  # 名称 -> 去重结构（带 add() 和 keys()）
+        self._restored_seen = {}  # 名称 -> 检查点中读到的键
+        self._snapshot = {}  # 名称 -> 最近一次 update() 时的键
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+
+    def load(self):
+        """
+        读取检查点。文件不存在、已损坏或属于其他用户时返回 False（从头开始）。
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError):
+            return False
+        if state.get('version') != CHECKPOINT_VERSION or state.get('user_id') != self.user_id:
+            return False
+        self.position = state.get('position', {})
+        self.pending = state.get('pending', {})
+        self._restored_seen = state.get('seen', {})
+        # 待下载的媒体会由调用方重新提交，视为已见过，继续爬取时不再重复产出
+        self._restored_seen['media'] = self._restored_seen.get('media', []) + list(self.pending)
+        self._snapshot = dict(self._restored_seen)
+        self.restored = True
+        return True
+
+    def track(self, name, keys):
+        """
+        登记一个去重结构，保存时记录其中的键；已读取检查点时先把保存的键放回去。
+        JSON 不区分元组和列表，列表形式的键还原为元组。
+        """
+        for key in self._restored_seen.get(name, []):
+            keys.add(tuple(key) if isinstance(key, list) else key)
+        self._seen[name] = keys
+
+    def update(self, **position):
+        """
+        记录当前位置（cursor / pages / scrolls / scroll_y 等）和各去重结构的快照。
+        只应在一致的时刻调用：此前标记为见过的媒体都已交给调用方。
+        """
+        self.position.update(position)
+        self._snapshot = {name: keys.keys() for name, keys in self._seen.items()}
+
+    def add_pending(self, key, url, meta):
+        with self._lock:
+            self.pending[key] = [url, meta]
+
+    def remove_pending(self, key):
+        # 下载线程中调用
+        with self._lock:
+            self.pending.pop(key, None)
+
+    def maybe_save(self):
+        """距上次保存超过 interval 秒时保存。"""
+        if time.monotonic() - self._saved_at >= self.interval:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            state = {
+                'version': CHECKPOINT_VERSION,
+                'user_id': self.user_id,
+                'saved_at': time.time(),
+                'position': dict(self.position),
+                'pending': dict(self.pending),
+                'seen': dict(self._snapshot),
+            }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self._saved_at = time.monotonic()
+
+    def clear(self):
+        """爬取正常完成后删除检查点。"""
+        for path in (self.path, self.path + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
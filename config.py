@@ -1,14 +1,16 @@
 import json
 import os
 
+import paths
+
 from PyQt6.QtWidgets import QDialog, QFormLayout, QLineEdit, QHBoxLayout, QPushButton, QMessageBox
 
 
 def load_existing_config():
     """加载现有配置，如果文件不存在则返回默认配置"""
     try:
-        if os.path.exists('config.json'):
-            with open('config.json', 'r', encoding='utf-8') as f:
+        if os.path.exists(paths.config_path()):
+            with open(paths.config_path(), 'r', encoding='utf-8') as f:
                 return json.load(f)
     except Exception as e:
         print(f"加载配置文件失败，使用默认配置: {e}")
@@ -23,7 +25,7 @@ def load_existing_config():
 def save_to_json(config):
     """保存配置到文件"""
     try:
-        with open('config.json', 'w', encoding='utf-8') as f:
+        with open(paths.config_path(), 'w', encoding='utf-8') as f:
             json.dump(config, f, indent=4, ensure_ascii=False)
         return True
     except Exception as e:
@@ -43,9 +45,13 @@ class Setting(QDialog):
         layout = QFormLayout()
         self.auth_token_input = QLineEdit()
         self.father_class_input = QLineEdit()
+        self.data_dir_input = QLineEdit()
+        self.data_dir_input.setPlaceholderText('留空为程序所在目录')
 
         layout.addRow('Auth Token:', self.auth_token_input)
         layout.addRow('Father Class (用逗号分隔):', self.father_class_input)
+        # 媒体索引、检查点、日志放在这里，保存后下一次任务即生效
+        layout.addRow('数据目录:', self.data_dir_input)
 
         button_layout = QHBoxLayout()
         self.save_btn = QPushButton('保存')
@@ -69,6 +75,7 @@ class Setting(QDialog):
             father_class = config.get('father_class', {}).get('twitter', [])
 
             self.auth_token_input.setText(auth_token)
+            self.data_dir_input.setText(config.get('data_dir', ''))
             # 将列表转换为逗号分隔的字符串
             if isinstance(father_class, list):
                 self.father_class_input.setText(','.join(father_class))
@@ -93,6 +100,12 @@ class Setting(QDialog):
                 father_class_list = []
             config['father_class'] = {'twitter': father_class_list}
 
+            data_dir = self.data_dir_input.text().strip()
+            if data_dir:
+                config['data_dir'] = data_dir
+            else:
+                config.pop('data_dir', None)
+
             # 保存到文件
             if save_to_json(config):
                 QMessageBox.information(self, '成功', '配置已保存！')
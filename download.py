@@ -1,63 +1,620 @@
+import contextlib
+import hashlib
+import json
 import os
+import re
+import queue
+import threading
 import time
+from urllib.parse import urlsplit, parse_qs
 import requests
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import cancellation
+import media_url
+import rate_limit
 
+DEFAULT_WORKERS = 4  # 默认并发下载数
 
-def download_main(fin_pic, download_dir, log_func=print, progress_callback=None):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36 Edg/142.0.0.0'
-    }
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36 Edg/142.0.0.0'
+}
 
-    # 创建带重试机制的session
+# 根据服务器返回的 Content-Type 决定扩展名，PNG 原图不再被存成 .jpg
+CONTENT_TYPE_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/jpg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+    'image/avif': 'avif',
+    'video/mp4': 'mp4',
+    'video/mp2t': 'ts',
+}
+
+
+def create_session(workers=DEFAULT_WORKERS):
+    """
+    【会话模块】
+    创建 session，连接池大小与并发数一致，
+    保证每个下载线程都能拿到一条可复用的连接，而不是反复握手。
+    连接池本身不重试：重试和限流退避统一由 _download_one 和 rate_limit.HostScheduler 处理，
+    避免两层重试叠加、看不到 429 和 Retry-After。
+    """
     session = requests.Session()
-    retry_strategy = Retry(
-        total=3,  # 总共重试3次
-        backoff_factor=1,  # 重试间隔：1秒、2秒、4秒
-        status_forcelist=[429, 500, 502, 503, 504],  # 这些状态码会触发重试
-        allowed_methods=["GET"]  # 只对GET请求重试
-    )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=0)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
+    return session
 
-    total_count = len(fin_pic)
-    log_func(f"准备下载 {total_count} 张图片...")
 
-    for index, url in enumerate(fin_pic):
+def file_stem_for(url, media_id=None):
+    """
+    【文件命名】
+    文件名取媒体 ID，不同用户、不同次运行得到的文件名都稳定且不会互相覆盖。
+    没有媒体 ID 的地址用 URL 的哈希代替。
+    """
+    media_id = media_id or media_url.media_id_from_url(url)
+    if media_id:
+        return media_id
+    return 'url_' + hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
 
-        if progress_callback:
-            progress_callback(index + 1, total_count)
 
-        max_retries = 3
-        retry_count = 0
-        success = False
+def extension_for(content_type, url):
+    """
+    由 Content-Type 得到扩展名；无法识别时依次参考 URL 的 format 参数和路径后缀，最后默认 jpg。
+    """
+    mime = (content_type or '').split(';')[0].strip().lower()
+    if mime in CONTENT_TYPE_EXTENSIONS:
+        return CONTENT_TYPE_EXTENSIONS[mime]
+    parts = urlsplit(url)
+    image_format = parse_qs(parts.query).get('format')
+    if image_format:
+        return image_format[0]
+    extension = os.path.splitext(parts.path)[1].lstrip('.')
+    return extension or 'jpg'
 
-        while retry_count < max_retries and not success:
-            try:
-                response = session.get(url, headers=headers, stream=True, timeout=30)
-                response.raise_for_status()
 
-                file_name = f'image_{index + 1}.jpg'
-                full_path = os.path.join(download_dir, file_name)
+def _hash_file(path, digest=None):
+    """计算（或继续累加）文件内容的 SHA-256，返回 (digest, 字节数)。"""
+    digest = digest or hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest, size
 
-                with open(full_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
 
-                log_func(f"✅ 图片下载成功: {full_path}")
-                success = True
+def find_completed(download_dir, stem):
+    """返回已下载完成的 <stem>.<扩展名> 文件路径，没有时返回 None。"""
+    for extension in sorted(set(CONTENT_TYPE_EXTENSIONS.values())):
+        full_path = os.path.join(download_dir, f'{stem}.{extension}')
+        if os.path.exists(full_path):
+            return full_path
+    return None
+
+
+def part_path_for(download_dir, stem, variant=None):
+    """
+    未完成下载的 .part 路径。不同变体（尺寸 / 格式）的字节不能拼在一起，变体名也写进文件名：
+    <stem>.<variant>.part；没有变体（视频、分片等）时为 <stem>.part。
+    """
+    if variant:
+        return os.path.join(download_dir, f'{stem}.{variant}.part')
+    return os.path.join(download_dir, f'{stem}.part')
+
+
+def _load_part_meta(part_path):
+    """读取 .part 旁的校验信息（URL、ETag、Last-Modified、总长度），没有或损坏时返回 None。"""
+    try:
+        with open(part_path + '.meta', 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_part_meta(part_path, url, response, total):
+    meta = {'url': url, 'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'), 'total': total}
+    with open(part_path + '.meta', 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+
+def _discard_part(part_path):
+    for path in (part_path, part_path + '.meta'):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+def _if_range(meta):
+    """
+    续传时的 If-Range 值：文件没变时服务器返回 206，变了则返回完整的 200。
+    弱 ETag（W/ 开头）不能用于 If-Range，改用 Last-Modified；两者都没有时返回 None（不能安全续传）。
+    """
+    etag = (meta or {}).get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return (meta or {}).get('last_modified')
 
-            except (requests.exceptions.SSLError,requests.exceptions.RequestException) as e:
-                retry_count += 1
-                if retry_count < max_retries:
-                    wait_time = 2 ** retry_count  # 指数退避：2秒、4秒、8秒
-                    log_func(f"   SSL错误，第 {retry_count} 次重试（等待 {wait_time} 秒）...")
-                    time.sleep(wait_time)
-                else:
-                    log_func(f"!! 下载第 {index + 1} 张图片失败 (SSL错误，已重试 {max_retries} 次): {e}")
 
-        if not success:
+_CONTENT_RANGE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+
+def _parse_content_range(value):
+    """解析 Content-Range: bytes <start>-<end>/<total>，返回 (start, end, total)，total 未知时为 None。"""
+    match = _CONTENT_RANGE.match((value or '').strip())
+    if not match:
+        return None
+    start, end, total = match.groups()
+    return int(start), int(end), (int(total) if total != '*' else None)
+
+
+def scan_partial_files(download_dir, log_func=print):
+    """
+    【残留文件检测】
+    启动时检查下载目录中上次被中断留下的 .part 文件：
+    空文件直接删除，其余保留，等对应的媒体再次提交时用 Range 续传。
+    返回：
+        dict: {.part 去掉后缀的文件名（<stem> 或 <stem>.<variant>）: 已下载字节数}
+    """
+    partial = {}
+    if not os.path.isdir(download_dir):
+        return partial
+    for name in os.listdir(download_dir):
+        if not name.endswith('.part'):
             continue
+        part_path = os.path.join(download_dir, name)
+        size = os.path.getsize(part_path)
+        if size == 0:
+            _discard_part(part_path)
+            continue
+        partial[name[:-len('.part')]] = size
+    if partial:
+        total_mb = sum(partial.values()) / 1024 / 1024
+        log_func(f"发现 {len(partial)} 个未完成的下载（共 {total_mb:.1f} MB），再次遇到时将断点续传。")
+    return partial
+
+
+def _download_one(session, url, download_dir, stem, number, log_func=print, metrics=None, scheduler=None,
+                  cancel=None, variant=None):
+    """
+    【单张下载模块】
+    下载一张图片到 download_dir/<stem>.<扩展名>，写入的同时计算 SHA-256。
+
+    每次请求前向 scheduler（rate_limit.HostScheduler）申请该主机的名额：
+    429/503 按 Retry-After 冷却并降低该主机的并发和速率后重试（不占用错误重试次数），
+    网络错误和 5xx 短暂等待后重试，404 等其他 4xx 不重试。
+
+    数据先写入 .part（见 part_path_for，包含变体名），完整后才原子地改名为正式文件，
+    被中断时不会留下看起来完整的半截图片。
+    已有 .part 时（重试或上次运行被中断）用 Range 请求续传：If-Range 带上 .part.meta 中保存的
+    ETag / Last-Modified，服务器上的文件变了就返回完整的 200；206 的 Content-Range 与已有字节数、
+    总长度对不上时丢弃 .part 从头下载。没有校验信息的 .part 不续传。
+    metrics（RunMetrics，可选）会记录重试和被限流的次数。
+    cancel（cancellation.CancelToken，可选）在每次请求前和每个数据块之间检查，
+    取消时抛出 CancelledError，已写入的部分留在 .part 中，下次续传。
+    返回：
+        dict: 成功时返回 {'path', 'size', 'sha256', 'content_type', 'resumed_from'}；失败返回 None
+    """
+    part_path = part_path_for(download_dir, stem, variant)
+    scheduler = scheduler or rate_limit.HostScheduler()
+    host = urlsplit(url).netloc
+    max_retries = 3  # 网络错误 / 5xx
+    max_throttled = 8  # 被限流
+    retry_count = 0
+    throttled_count = 0
+
+    while retry_count < max_retries and throttled_count <= max_throttled:
+        scheduler.acquire(host, cancel)
+        outcome, retry_after, wait_time = 'error', None, 0
+        try:
+            headers = dict(HEADERS)
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            meta = _load_part_meta(part_path) if offset else None
+            if offset and (meta is None or meta.get('url') != url or not _if_range(meta)):
+                # 不知道 .part 来自哪个版本的文件，拼上去可能得到损坏的图片
+                _discard_part(part_path)
+                offset = 0
+            if offset:
+                headers['Range'] = f'bytes={offset}-'
+                headers['If-Range'] = _if_range(meta)
+
+            response = session.get(url, headers=headers, stream=True, timeout=30)
+            if response.status_code in rate_limit.THROTTLE_STATUSES:
+                # 被限流：交给调度器冷却（finally 中 release），不计入错误重试
+                retry_after = rate_limit.parse_retry_after(response.headers.get('Retry-After'))
+                response.close()
+                outcome = 'throttled'
+                throttled_count += 1
+                if metrics is not None:
+                    metrics.incr('throttled')
+                log_func(f"   第 {number} 张图片被限流（HTTP {response.status_code}），"
+                         f"{'按 Retry-After ' if retry_after is not None else ''}降速后重试。")
+                continue
+            if response.status_code == 416:
+                # 请求的范围无效（.part 与服务器文件不一致），丢弃后从头下载
+                response.close()
+                _discard_part(part_path)
+                outcome = 'ok'
+                log_func(f"   第 {number} 张图片的续传范围无效，从头下载。")
+                continue
+            if 400 <= response.status_code < 500:
+                # 404、403 等重试也不会成功
+                response.close()
+                outcome = 'ok'
+                log_func(f"!! 下载第 {number} 张图片失败: HTTP {response.status_code}")
+                return None
+            response.raise_for_status()
+
+            if offset and response.status_code == 206:
+                content_range = _parse_content_range(response.headers.get('Content-Range'))
+                if content_range is None or content_range[0] != offset or content_range[2] is None \
+                        or content_range[2] != meta.get('total'):
+                    # 返回的范围不是从已有字节数接着的，或总长度变了
+                    response.close()
+                    _discard_part(part_path)
+                    outcome = 'ok'
+                    log_func(f"   第 {number} 张图片的续传范围不匹配"
+                             f"（{response.headers.get('Content-Range')}），从头下载。")
+                    continue
+                # 续传：先把已有部分计入哈希，再追加写入
+                digest, size = _hash_file(part_path)
+                mode = 'ab'
+                log_func(f"   第 {number} 张图片从 {offset} 字节处续传。")
+            else:
+                # 从头下载（服务器忽略了 Range 或文件已变化时也返回 200），记下校验信息供以后续传
+                digest, size = hashlib.sha256(), 0
+                mode = 'wb'
+                offset = 0
+                length = response.headers.get('Content-Length')
+                _save_part_meta(part_path, url, response, int(length) if length and length.isdigit() else None)
+
+            content_type = response.headers.get('Content-Type', '')
+            full_path = os.path.join(download_dir, f'{stem}.{extension_for(content_type, url)}')
+
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=8192):
+                    if cancel is not None and cancel.cancelled:
+                        # 取消不是主机的问题，不降低该主机的速率
+                        response.close()
+                        outcome = 'ok'
+                        cancel.check()
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+
+            os.replace(part_path, full_path)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(part_path + '.meta')
+            outcome = 'ok'
+            log_func(f"✅ 图片下载成功: {full_path}")
+            return {'path': full_path, 'size': size, 'sha256': digest.hexdigest(),
+                    'content_type': content_type, 'resumed_from': offset}
+
+        except requests.exceptions.RequestException as e:
+            retry_count += 1
+            if metrics is not None:
+                metrics.incr('download_retries')
+            if retry_count < max_retries:
+                wait_time = retry_count  # 网络错误只短暂等待：1秒、2秒
+                log_func(f"   网络错误，第 {retry_count} 次重试（等待 {wait_time} 秒）: {e}")
+            else:
+                log_func(f"!! 下载第 {number} 张图片失败 (已重试 {max_retries} 次): {e}")
+        finally:
+            scheduler.release(host, outcome, retry_after)
+        # 先释放名额再等待，不占着并发窗口睡眠
+        if wait_time:
+            if cancel is not None:
+                cancel.sleep(wait_time)
+            else:
+                time.sleep(wait_time)
+    if throttled_count > max_throttled:
+        log_func(f"!! 下载第 {number} 张图片失败 (连续被限流 {throttled_count} 次)")
+    return None
+
+
+def _variant_tag(choice):
+    """变体策略选中的尺寸和格式，如 'large-webp'；没有变体时返回 None。"""
+    if not choice or not choice['name']:
+        return None
+    return '-'.join(part for part in (choice['name'], choice['format']) if part)
+
+
+class _BudgetExhausted(Exception):
+    """变体策略的流量预算已用完，跳过这张图片。"""
+
+
+class DownloadPipeline:
+    """
+    【流水线下载模块】
+    生产者（滚动/提取循环）通过 submit() 把 URL 放进有界队列，
+    后台下载线程在滚动继续的同时把队列消费掉。
+    队列满时 submit() 会阻塞，避免提取速度远超下载速度时无限堆积。
+
+    用法：
+        with DownloadPipeline(download_dir, workers=4) as pipeline:
+            pipeline.submit(url)
+        # 退出 with 时等待所有已提交的下载完成
+    """
+
+    _STOP = object()  # 通知下载线程退出的哨兵
+
+    def __init__(self, download_dir, workers=DEFAULT_WORKERS, log_func=print, progress_callback=None,
+                 queue_size=None, expected_total=None, on_complete=None, dedupe=False, hash_lookup=None,
+                 metrics=None, scheduler=None, variant_policy=None, postprocessor=None, cancel=None):
+        """
+        Args:
+            download_dir (str): 保存目录。
+            workers (int): 下载线程数，连接池大小与之一致。
+            log_func: 日志函数。
+            progress_callback: 进度回调 (已完成数量, 总数)，完成数严格递增。
+                总数未知时为当前已提交数量。
+            queue_size (int): 队列容量，默认为 workers 的 4 倍。
+            expected_total (int): 预先知道的总数（可选），用于进度显示。
+            on_complete: 每张图片下载成功后的回调 (url, result, meta)，在下载线程中调用。
+                result 为 {'path', 'size', 'sha256', 'content_type', 'resumed_from', 'linked_to'}。
+            dedupe (bool): 内容去重。字节完全相同的文件只保存一份，其余位置改为硬链接。
+            hash_lookup: 可选，sha256 -> 已有文件路径 的查询函数（如本地索引），
+                用于跨次运行去重。
+            metrics: 可选的 metrics.RunMetrics，记录每张图片的下载耗时、字节数和重试次数。
+            scheduler: 可选的 rate_limit.HostScheduler，默认按 workers 新建一个；
+                下载线程数只是并发上限，实际在途请求数由它根据限流情况自适应调整。
+            variant_policy: 可选的 variants.VariantPolicy，决定下载的尺寸/格式（默认原图）；
+                需要探测时用同一个 session 发 HEAD 请求，预算用完后其余图片跳过。
+                选中的变体记入 result 的 'variant' / 'expected_size'。
+            postprocessor: 可选的 postprocess.PostProcessor（需已 start），新下载的文件交给它在进程池中处理，
+                下载线程不等待处理结果。
+            cancel: 可选的 cancellation.CancelToken。取消后正在下载的文件在下一个数据块处停止（保留 .part），
+                队列中其余的 URL 直接跳过，不计为失败；close() 因此很快返回。
+        """
+        self.download_dir = download_dir
+        self.workers = max(1, int(workers))
+        self.log_func = log_func
+        self.progress_callback = progress_callback
+        self.expected_total = expected_total
+        self.on_complete = on_complete
+        self.dedupe = dedupe
+        self.hash_lookup = hash_lookup
+        self.metrics = metrics
+        self.scheduler = scheduler or rate_limit.HostScheduler(max_concurrency=self.workers)
+        self.variant_policy = variant_policy
+        self.postprocessor = postprocessor
+        self.cancel = cancel
+        self.queue = queue.Queue(maxsize=queue_size or self.workers * 4)
+        self.session = None
+        self.submitted = 0
+        self.finished = 0
+        self.succeeded = 0
+        self.deduplicated = 0
+        self.budget_skipped = 0
+        self.cancel_skipped = 0
+        self._hash_paths = {}  # sha256 -> 本次运行中第一次保存该内容的文件路径
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        # 无浏览器模式下没有 Edge 预先创建下载目录
+        os.makedirs(self.download_dir, exist_ok=True)
+        scan_partial_files(self.download_dir, self.log_func)
+        self.session = create_session(self.workers)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'download-{i + 1}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, url, meta=None):
+        """
+        提交一个 URL，队列满时阻塞。
+        meta 会原样传给 on_complete（如推文 ID、媒体 ID），
+        其中的 media_id 用作文件名（缺省时从 URL 中解析），download_dir 可覆盖保存目录。
+        """
+        with self._lock:
+            self.submitted += 1
+            number = self.submitted
+        self.queue.put((number, url, meta))
+        return number
+
+    def close(self):
+        """
+        等待所有已提交的下载完成并释放连接。
+        返回：
+            int: 成功下载的数量
+        """
+        for _ in self._threads:
+            self.queue.put(self._STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+        return self.succeeded
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _worker(self):
+        import video  # video 依赖本模块，在这里导入避免循环引用
+        while True:
+            item = self.queue.get()
+            if item is self._STOP:
+                break
+            number, url, meta = item
+            stem = file_stem_for(url, (meta or {}).get('media_id'))
+            # meta 中可以指定单独的保存目录（如批量任务按用户分文件夹）
+            target_dir = (meta or {}).get('download_dir') or self.download_dir
+            started = time.perf_counter()
+            skipped = False
+            try:
+                cancellation.check(self.cancel)
+                if target_dir != self.download_dir:
+                    os.makedirs(target_dir, exist_ok=True)
+                completed_path = find_completed(target_dir, stem)
+                if completed_path:
+                    # 以前的运行已完整下载过（完整文件只会由 .part 改名而来）
+                    digest, size = _hash_file(completed_path)
+                    result = {'path': completed_path, 'size': size, 'sha256': digest.hexdigest(),
+                              'content_type': '', 'resumed_from': size}
+                    self.log_func(f"   已存在，跳过下载: {completed_path}")
+                    if self.metrics is not None:
+                        self.metrics.incr('downloads_already_present')
+                else:
+                    choice = None
+                    if self.variant_policy is not None:
+                        choice = self.variant_policy.choose(url, self._probe_size)
+                        if choice is None:
+                            skipped = True
+                            raise _BudgetExhausted()
+                    if video.is_hls_url(url):
+                        # m3u8 视频：并行下载分片后拼接，分片请求同样经过限流调度
+                        result = video.download_hls(self.session, url, target_dir, stem, number, self.log_func,
+                                                    self.metrics, self.scheduler, workers=self.workers,
+                                                    cancel=self.cancel)
+                    else:
+                        result = _download_one(self.session, choice['url'] if choice else url, target_dir, stem,
+                                               number, self.log_func, self.metrics, self.scheduler, self.cancel,
+                                               variant=_variant_tag(choice))
+                    if self.variant_policy is not None:
+                        self.variant_policy.record(choice, result['size'] - result['resumed_from'] if result else 0)
+                    if result is not None:
+                        result['variant'] = choice['name'] if choice else None
+                        result['expected_size'] = choice['expected_size'] if choice else None
+                    if result is not None and self.metrics is not None:
+                        self.metrics.record_download(result['size'] - result['resumed_from'],
+                                                     time.perf_counter() - started)
+                if result is not None:
+                    result['linked_to'] = self._link_duplicate(result) if self.dedupe else None
+                    if self.on_complete:
+                        self.on_complete(url, result, meta)
+                    # 已存在的文件和硬链接的副本以前处理过，不再重复
+                    if self.postprocessor is not None and not completed_path and not result['linked_to']:
+                        self.postprocessor.submit(result['path'], meta)
+            except _BudgetExhausted:
+                result = None
+                with self._lock:
+                    self.budget_skipped += 1
+                    first_skip = self.budget_skipped == 1
+                if first_skip:
+                    self.log_func("⚠️ 流量预算已用完，其余图片不再下载。")
+                if self.metrics is not None:
+                    self.metrics.incr('downloads_budget_skipped')
+            except cancellation.CancelledError:
+                result = None
+                skipped = True
+                with self._lock:
+                    self.cancel_skipped += 1
+                    first_skip = self.cancel_skipped == 1
+                if first_skip:
+                    self.log_func("⚠️ 任务已取消，其余下载跳过。")
+            except Exception as e:
+                # 写文件失败等意外错误不能让下载线程退出
+                self.log_func(f"!! 下载第 {number} 张图片出错: {e}")
+                result = None
+            success = result is not None
+            if not success and not skipped and self.metrics is not None:
+                self.metrics.incr('downloads_failed')
+
+            # 下载完成的顺序不固定，用锁保证进度回调按 1, 2, 3... 递增上报
+            with self._lock:
+                self.finished += 1
+                if success:
+                    self.succeeded += 1
+                if self.progress_callback:
+                    total = self.expected_total or self.submitted
+                    self.progress_callback(self.finished, total)
+
+    def _probe_size(self, url):
+        """
+        HEAD 请求取变体的 Content-Length，与下载共用 session 和限流调度。
+        不存在、被限流或出错时返回 None（该变体视为不可用）。
+        """
+        host = urlsplit(url).netloc
+        self.scheduler.acquire(host, self.cancel)
+        outcome, retry_after = 'error', None
+        try:
+            response = self.session.head(url, headers=HEADERS, timeout=10, allow_redirects=True)
+            if response.status_code in rate_limit.THROTTLE_STATUSES:
+                outcome = 'throttled'
+                retry_after = rate_limit.parse_retry_after(response.headers.get('Retry-After'))
+                return None
+            outcome = 'ok'
+            if response.status_code != 200:
+                return None
+            length = response.headers.get('Content-Length')
+            return int(length) if length and length.isdigit() else None
+        except requests.exceptions.RequestException:
+            return None
+        finally:
+            self.scheduler.release(host, outcome, retry_after)
+
+    def _link_duplicate(self, result):
+        """
+        内容去重：若相同 sha256 的文件已存在，删掉刚写入的副本并改为硬链接。
+        返回被链接的已有文件路径；没有重复（或文件系统不支持硬链接）时返回 None。
+        """
+        sha256, full_path = result['sha256'], result['path']
+        with self._lock:
+            existing = self._hash_paths.get(sha256)
+            if existing is None and self.hash_lookup:
+                existing = self.hash_lookup(sha256)
+            if existing is None or not os.path.exists(existing):
+                self._hash_paths[sha256] = full_path
+                return None
+        if os.path.abspath(existing) == os.path.abspath(full_path):
+            return None
+
+        # 先在临时名上建立链接再原子替换，链接失败时刚下载的副本仍然完好
+        link_path = full_path + '.link'
+        try:
+            os.link(existing, link_path)
+            os.replace(link_path, full_path)
+        except OSError as e:
+            # 跨磁盘或不支持硬链接时保留独立副本
+            self.log_func(f"   无法创建硬链接，保留独立副本: {e}")
+            return None
+        with self._lock:
+            self.deduplicated += 1
+        self.log_func(f"   内容与 {existing} 相同，已改为硬链接。")
+        return existing
+
+
+def download_main(fin_pic, download_dir, log_func=print, progress_callback=None, workers=DEFAULT_WORKERS,
+                  dedupe=False, postprocessor=None):
+    """
+    【下载模块】
+    并发下载 fin_pic 中的所有图片（基于 DownloadPipeline）。
+
+    Args:
+        fin_pic (list): 大图 URL 列表，文件名取媒体 ID，扩展名取自 Content-Type。
+        download_dir (str): 保存目录。
+        log_func: 日志函数。
+        progress_callback: 进度回调 (已完成数量, 总数)，完成数严格递增。
+        workers (int): 并发下载数，连接池大小与之一致。
+        dedupe (bool): 字节完全相同的文件只保存一份，其余改为硬链接。
+        postprocessor: 可选的 postprocess.PostProcessor，由本函数启动，下载结束后等待其处理完成。
+
+    返回：
+        int: 成功下载的数量
+    """
+    total_count = len(fin_pic)
+    pipeline = DownloadPipeline(download_dir, workers=workers, log_func=log_func,
+                                progress_callback=progress_callback, expected_total=total_count,
+                                dedupe=dedupe, postprocessor=postprocessor)
+    log_func(f"准备下载 {total_count} 张图片（并发数: {pipeline.workers}）...")
 
+    if postprocessor is not None:
+        postprocessor.start()
+    pipeline.start()
+    try:
+        for url in fin_pic:
+            pipeline.submit(url)
+    finally:
+        pipeline.close()
+        if postprocessor is not None:
+            postprocessor.close()
+    return pipeline.succeeded
@@ -0,0 +1,239 @@
+import importlib.util
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import paths
+
+DEFAULT_PID_DIR = 'driver_pids'  # 数据目录下，每个浏览器驱动一个文件
+# 只结束名称符合的进程，PID 被系统复用给其他程序时不会误杀
+_PROCESS_NAMES = ('msedgedriver', 'msedge', 'chromedriver', 'chrome')
+
+_HAS_PSUTIL = importlib.util.find_spec('psutil') is not None
+if _HAS_PSUTIL:
+    import psutil
+
+
+def _driver_pid(driver):
+    """msedgedriver 进程的 PID，取不到时返回 None。"""
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    return getattr(process, 'pid', None)
+
+
+def _entry_path(pid, pid_dir):
+    return os.path.join(pid_dir, f'{pid}.json')
+
+
+def _run(args):
+    # Windows 下不弹出控制台窗口
+    flags = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+    return subprocess.run(args, capture_output=True, text=True, creationflags=flags).stdout
+
+
+def _process_name(pid):
+    """进程名（小写），进程不存在时返回 None。"""
+    if _HAS_PSUTIL:
+        try:
+            return psutil.Process(pid).name().lower()
+        except psutil.Error:
+            return None
+    if sys.platform == 'win32':
+        output = _run(['tasklist', '/FI', f'PID eq {pid}', '/FO', 'CSV', '/NH']).strip()
+        if not output.startswith('"'):
+            return None
+        return output.split('","', 1)[0].strip('"').lower()
+    try:
+        with open(f'/proc/{pid}/comm', 'r') as f:
+            return f.read().strip().lower()
+    except OSError:
+        name = _run(['ps', '-p', str(pid), '-o', 'comm=']).strip()
+        return os.path.basename(name).lower() or None
+
+
+def _pid_alive(pid):
+    if _HAS_PSUTIL:
+        return psutil.pid_exists(pid)
+    if sys.platform == 'win32':
+        return _process_name(pid) is not None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _children(pid):
+    """子进程（浏览器）的 PID，只在安装了 psutil 时能取到。"""
+    if not _HAS_PSUTIL:
+        return []
+    try:
+        return [child.pid for child in psutil.Process(pid).children(recursive=True)]
+    except psutil.Error:
+        return []
+
+
+def _kill_tree(pid):
+    """结束进程及其子进程。"""
+    if _HAS_PSUTIL:
+        try:
+            process = psutil.Process(pid)
+            for child in process.children(recursive=True):
+                child.kill()
+            process.kill()
+        except psutil.Error:
+            pass
+        return
+    if sys.platform == 'win32':
+        _run(['taskkill', '/PID', str(pid), '/T', '/F'])
+        return
+    for child in _run(['pgrep', '-P', str(pid)]).split():
+        _kill_tree(int(child))
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def _create_time(pid):
+    """进程的启动时间（Unix 时间戳），进程不存在或读不到时返回 None。"""
+    if _HAS_PSUTIL:
+        try:
+            return psutil.Process(pid).create_time()
+        except psutil.Error:
+            return None
+    if sys.platform.startswith('linux'):
+        try:
+            with open(f'/proc/{pid}/stat', 'r') as f:
+                # comm 字段可能含空格，从最后一个 ')' 之后开始按空格切分，第 22 个字段是启动时刻（时钟滴答）
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open('/proc/stat', 'r') as f:
+                boot_time = next(float(line.split()[1]) for line in f if line.startswith('btime'))
+            return boot_time + int(fields[19]) / os.sysconf('SC_CLK_TCK')
+        except (OSError, ValueError, IndexError, StopIteration):
+            return None
+    return None
+
+
+# 登记时间与进程启动时间的允许误差（秒）：浏览器进程在登记前启动，不会晚于登记时间
+_CREATE_TIME_TOLERANCE = 2.0
+
+
+def _is_browser_process(pid, started_at=None):
+    """
+    pid 仍是登记时的那个浏览器驱动 / 浏览器进程才返回 True。
+    名称之外还比较进程启动时间：PID 被复用给用户自己打开的 Edge / Chrome 时名称也能对上，
+    启动时间晚于登记时间或读不到启动时间就不动它。
+    """
+    name = _process_name(pid)
+    if name is None or not name.startswith(_PROCESS_NAMES):
+        return False
+    if started_at is None:
+        return True
+    created = _create_time(pid)
+    return created is not None and created <= started_at + _CREATE_TIME_TOLERANCE
+
+
+def register(driver, pid_dir=DEFAULT_PID_DIR):
+    """
+    【驱动进程登记】
+    浏览器启动后记录 msedgedriver（及 Edge，安装了 psutil 时）的 PID 和所属进程，
+    本进程被强制结束后，下次启动时 reap_stale() 可以据此清理残留的进程。
+    """
+    pid = _driver_pid(driver)
+    if pid is None:
+        return
+    pid_dir = paths.data_path(pid_dir)
+    entry = {'driver_pid': pid, 'owner_pid': os.getpid(), 'started_at': time.time(),
+             'browser_pids': _children(pid)}
+    path = _entry_path(pid, pid_dir)
+    try:
+        os.makedirs(pid_dir, exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(path + '.tmp', path)
+    except OSError:
+        # 登记失败（目录不可写等）不影响爬取，只是无法在下次启动时清理
+        pass
+
+
+def _load_entry(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _remove_entry(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def quit_driver(driver, log_func=print, pid_dir=DEFAULT_PID_DIR):
+    """
+    关闭浏览器并注销登记。driver.quit() 失败（驱动已无响应等）时直接结束登记的进程，
+    保证不留下 msedgedriver / Edge 进程。
+    """
+    if driver is None:
+        return
+    pid = _driver_pid(driver)
+    pid_dir = paths.data_path(pid_dir)
+    path = _entry_path(pid, pid_dir) if pid is not None else None
+    try:
+        driver.quit()
+    except Exception as e:
+        log_func(f"⚠️ 关闭浏览器失败，强制结束进程: {e}")
+        entry = _load_entry(path) if path else None
+        started_at = (entry or {}).get('started_at')
+        for browser_pid in (entry or {}).get('browser_pids', []):
+            if _is_browser_process(browser_pid, started_at):
+                _kill_tree(browser_pid)
+        if pid is not None and _is_browser_process(pid, started_at):
+            _kill_tree(pid)
+    finally:
+        if path:
+            _remove_entry(path)
+
+
+def reap_stale(pid_dir=DEFAULT_PID_DIR, log_func=print, include_own=False):
+    """
+    【残留进程清理】
+    启动时调用：登记文件所属的进程已经不在（上次被强制结束或崩溃），
+    其中仍在运行的 msedgedriver / Edge 进程全部结束，并删除登记文件。
+    include_own=True 时本进程登记的也一并结束（爬虫线程被 terminate() 后来不及关闭浏览器）。
+    返回：
+        int: 结束的进程数
+    """
+    pid_dir = paths.data_path(pid_dir)
+    if not os.path.isdir(pid_dir):
+        return 0
+    killed = 0
+    for name in os.listdir(pid_dir):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(pid_dir, name)
+        entry = _load_entry(path)
+        if entry is None:
+            _remove_entry(path)
+            continue
+        owner = entry.get('owner_pid')
+        if owner == os.getpid():
+            if not include_own:
+                continue
+        elif owner and _pid_alive(owner):
+            # 仍在运行的程序（或批量任务的子进程）正在使用
+            continue
+        for pid in entry.get('browser_pids', []) + [entry.get('driver_pid')]:
+            if pid and _is_browser_process(pid, entry.get('started_at', 0)):
+                _kill_tree(pid)
+                killed += 1
+        _remove_entry(path)
+    if killed:
+        log_func(f"已清理残留的 {killed} 个浏览器驱动进程。")
+    return killed
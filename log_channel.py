@@ -0,0 +1,153 @@
+import logging
+import os
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+import paths
+
+DEFAULT_LOG_PATH = os.path.join('logs', 'crawler.log')
+DEFAULT_FLUSH_INTERVAL = 0.1  # 秒
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+
+LEVELS = {
+    'DEBUG': logging.DEBUG,
+    'INFO': logging.INFO,
+    'WARNING': logging.WARNING,
+    'ERROR': logging.ERROR,
+}
+
+
+def infer_level(message):
+    """
+    没有指定级别时的默认级别：'!!' / '❌' 开头为 ERROR，'⚠️' 开头为 WARNING，其余为 INFO。
+    DEBUG 只能显式指定（log.debug(...) 或 log(message, level='DEBUG')），不从文字格式猜。
+    """
+    stripped = message.lstrip('\n')
+    if stripped.startswith(('!!', '❌')):
+        return logging.ERROR
+    if stripped.startswith('⚠️'):
+        return logging.WARNING
+    return logging.INFO
+
+
+def debug_func(log_func):
+    """
+    log_func 对应的 DEBUG 日志函数：LogChannel 等带 debug() 方法的用它，
+    print、Qt 信号等普通函数没有级别，原样返回。
+    """
+    return getattr(log_func, 'debug', log_func)
+
+
+def parse_level(level):
+    """接受 logging 级别数字或 'DEBUG' / 'INFO' 等名称。"""
+    if isinstance(level, str):
+        return LEVELS.get(level.upper(), logging.INFO)
+    return level
+
+
+class LogChannel:
+    """
+    【缓冲日志通道】
+    代替逐行的 log_func：调用方把日志放进缓冲区立即返回，
+    后台线程每 flush_interval 秒把缓冲的日志合并成一段文字交给 sink（如 GUI 的 log_signal.emit），
+    界面每批只刷新一次，不会被逐行刷新拖慢。
+    全部日志（含 DEBUG）同时写入按大小轮转的日志文件。
+
+    用法：
+        channel = LogChannel(self.log_signal.emit, level='INFO', log_path='logs/crawler.log')
+        use.main_use(..., log_func=channel)
+        channel.close()  # 刷出剩余日志并关闭文件
+    """
+
+    def __init__(self, sink=None, level=logging.INFO, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 log_path=DEFAULT_LOG_PATH, max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT):
+        """
+        Args:
+            sink: 接收一批日志文字（多行用换行连接）的函数，None 时只写文件。
+            level: 交给 sink 的最低级别（数字或名称），文件总是记录全部级别。
+            flush_interval (float): 合并刷新的间隔（秒）。
+            log_path (str): 轮转日志文件路径（相对路径在数据目录下），None 时不写文件。
+            max_bytes / backup_count: 单个日志文件大小上限和保留的旧文件数。
+        """
+        self.sink = sink
+        self.level = parse_level(level)
+        self.flush_interval = flush_interval
+        self._buffer = []  # (级别, 时间, 文字)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._file_handler = None
+        if log_path:
+            log_path = paths.data_path(log_path)
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+            self._file_handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count,
+                                                     encoding='utf-8')
+            self._file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)-7s %(message)s'))
+        self._thread = threading.Thread(target=self._run, name='log-channel', daemon=True)
+        self._thread.start()
+
+    def __call__(self, message, level=None):
+        self.log(message, level)
+
+    def log(self, message, level=None):
+        """放入缓冲区，不等待界面或磁盘。level 缺省时由 infer_level 推断。"""
+        level = parse_level(level) if level is not None else infer_level(str(message))
+        with self._lock:
+            self._buffer.append((level, time.time(), str(message)))
+
+    def debug(self, message):
+        self.log(message, logging.DEBUG)
+
+    def info(self, message):
+        self.log(message, logging.INFO)
+
+    def warning(self, message):
+        self.log(message, logging.WARNING)
+
+    def error(self, message):
+        self.log(message, logging.ERROR)
+
+    def flush(self):
+        """立即把缓冲区写入文件并交给 sink。"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return
+            if self._file_handler is not None:
+                for level, created, message in batch:
+                    record = logging.LogRecord('x_crawler', level, '', 0, message, None, None)
+                    record.created = created
+                    record.msecs = (created - int(created)) * 1000
+                    self._file_handler.handle(record)
+                self._file_handler.flush()
+            if self.sink is not None:
+                lines = [message for level, _, message in batch if level >= self.level]
+                if lines:
+                    self.sink('\n'.join(lines))
+
+    def _run(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                # sink 出错（如界面已关闭）不能让刷新线程退出
+                print(f"日志刷新失败: {e}")
+
+    def close(self):
+        """停止后台线程，刷出剩余日志并关闭文件。"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._thread.join()
+        self.flush()
+        if self._file_handler is not None:
+            self._file_handler.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import threading
+import time
+import paths
+
+DEFAULT_INDEX_PATH = 'media_index.db'  # 打开时才解析到当前配置的数据目录下
+
+
+class MediaIndex:
+    """
+    【媒体索引模块】
+    本地 SQLite 索引，以媒体 ID 为主键记录已下载的每张图片：
+    用户、推文 ID、URL、文件路径、大小、内容 SHA-256 和下载时间。
+
+    增量模式下 main_use 用它判断哪些媒体已经下载过，
+    遇到连续一段已索引的媒体即可停止滚动。
+    下载线程会并发写入，因此所有操作都在同一把锁内完成。
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        path = paths.data_path(path)
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS media (
+                    media_id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    tweet_id TEXT,
+                    url TEXT,
+                    file_path TEXT,
+                    size INTEGER,
+                    downloaded_at REAL,
+                    sha256 TEXT,
+                    variant TEXT,
+                    expected_size INTEGER
+                )
+                """
+            )
+            # 旧版本建立的索引没有 sha256 / variant / expected_size 列，补上
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(media)")]
+            for column, column_type in (('sha256', 'TEXT'), ('variant', 'TEXT'), ('expected_size', 'INTEGER')):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE media ADD COLUMN {column} {column_type}")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_media_user ON media (user_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_media_sha256 ON media (sha256)")
+
+    def contains(self, media_id):
+        """媒体是否已在索引中。"""
+        if not media_id:
+            return False
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM media WHERE media_id = ?", (media_id,)).fetchone()
+        return row is not None
+
+    def add(self, media_id, user_id, tweet_id, url, file_path, size, sha256=None, variant=None, expected_size=None):
+        """
+        记录一条已下载的媒体，重复的媒体 ID 会覆盖旧记录。
+        variant 为下载的尺寸（如 'orig'、'large'），expected_size 为 HEAD 探测到的大小（未探测时为 None）。
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO media (media_id, user_id, tweet_id, url, file_path, size, downloaded_at, sha256, "
+                "variant, expected_size) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (media_id, user_id, tweet_id, url, file_path, size, time.time(), sha256, variant, expected_size)
+            )
+
+    def path_for_hash(self, sha256):
+        """返回内容哈希相同的已下载文件路径，没有时返回 None（供下载去重使用）。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_path FROM media WHERE sha256 = ? ORDER BY downloaded_at LIMIT 1", (sha256,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def count(self, user_id=None):
+        """索引中的媒体数量，指定 user_id 时只统计该用户。"""
+        with self._lock:
+            if user_id is None:
+                row = self._conn.execute("SELECT COUNT(*) FROM media").fetchone()
+            else:
+                row = self._conn.execute("SELECT COUNT(*) FROM media WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,64 @@
+import re
+from urllib.parse import urlsplit, parse_qs
+
+# 略缩图地址形如 https://pbs.twimg.com/media/<媒体ID>?format=jpg&name=small
+# 旧格式为 .../media/<媒体ID>.jpg 或 .../media/<媒体ID>.jpg:small
+MEDIA_PATH_PATTERN = re.compile(r'/media/([A-Za-z0-9_-]+)(?:\.(\w+))?(?::\w+)?$')
+# 推文图片链接形如 /<用户>/status/<推文ID>/photo/<序号>
+STATUS_PHOTO_PATTERN = re.compile(r'/status/(\d+)/photo/(\d+)')
+
+
+def media_id_from_url(url):
+    """
+    从图片地址中取出媒体 ID（如 pbs.twimg.com/media/<媒体ID>），无法识别时返回 None。
+    """
+    if not url:
+        return None
+    match = MEDIA_PATH_PATTERN.search(urlsplit(url).path)
+    return match.group(1) if match else None
+
+
+def image_format_of(src):
+    """图片地址的格式（format 参数或扩展名），无法识别时返回 None。"""
+    if not src:
+        return None
+    parts = urlsplit(src)
+    match = MEDIA_PATH_PATTERN.search(parts.path)
+    if not match:
+        return None
+    return parse_qs(parts.query).get('format', [match.group(2) or 'jpg'])[0]
+
+
+def with_variant(src, name, image_format=None):
+    """
+    【尺寸变体改写】
+    把图片地址改写为指定尺寸（name=orig / 4096x4096 / large / medium / small）和格式，
+    image_format 为 None 时保留原有的 format。不是图片媒体地址时返回 None。
+    """
+    if not src:
+        return None
+    parts = urlsplit(src)
+    match = MEDIA_PATH_PATTERN.search(parts.path)
+    if not match:
+        return None
+    image_format = image_format or image_format_of(src)
+    return f"{parts.scheme}://{parts.netloc}/media/{match.group(1)}?format={image_format}&name={name}"
+
+
+def to_orig_url(src):
+    """
+    【原图地址改写】
+    把略缩图地址改写为 name=orig 的原图地址，保留原有的 format。
+    不是图片媒体地址（如视频封面）时返回 None。
+    """
+    return with_variant(src, 'orig')
+
+
+def parse_status_href(href):
+    """
+    解析 /status/<推文ID>/photo/<序号> 链接，返回 (推文ID, 序号)，无法解析时返回 None。
+    """
+    match = STATUS_PHOTO_PATTERN.search(href or '')
+    if not match:
+        return None
+    return match.group(1), int(match.group(2))
@@ -0,0 +1,273 @@
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRIC_PREFIX = 'x_crawler'
+
+
+def percentile(sorted_values, fraction):
+    """最近秩法求分位数，sorted_values 需已排序，为空时返回 0。"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _write_atomic(path, text):
+    """先写临时文件再改名，读取方（如 node_exporter）不会读到写了一半的文件。"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+class RunMetrics:
+    """
+    【运行指标模块】
+    记录一次运行的各阶段耗时、每张略缩图的提取延迟、WebDriver 命令次数、
+    下载字节数/张数和重试次数，运行结束后导出为 JSON 和 Prometheus textfile。
+    下载线程会并发写入，所有修改都在同一把锁内完成。
+
+    用法：
+        metrics = RunMetrics(user_id)
+        metrics.instrument_driver(driver)      # 统计 WebDriver 命令
+        with metrics.phase("滚动查找图片"):
+            ...
+        metrics.observe('extract_fast', 0.01)  # 延迟样本（秒）
+        metrics.write_json('metrics/someone.json')
+    """
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, user_id=None):
+        self.user_id = user_id
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.phases = {}  # 阶段名 -> 已完成的耗时（秒）
+        self._phase_starts = {}
+        self.latencies = {}  # 名称 -> 样本列表（秒）
+        self.commands = {}  # WebDriver 命令名 -> [次数, 总耗时]
+        self.bytes_downloaded = 0
+        self.images_downloaded = 0
+        self._first_download = None
+        self._last_download = None
+
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    # ---- 计数与延迟 ----
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def update_counters(self, values):
+        """合并一组计数（如 use.iter_media 的 stats 字典）。"""
+        with self._lock:
+            self.counters.update(values)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self.latencies.setdefault(name, []).append(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    # ---- 阶段耗时 ----
+
+    def phase_start(self, name):
+        with self._lock:
+            self._phase_starts.setdefault(name, time.perf_counter())
+
+    def phase_end(self, name):
+        with self._lock:
+            start = self._phase_starts.pop(name, None)
+            if start is not None:
+                self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def phase_progress(self, name, progress):
+        """配合 phase_callback 使用：第一次上报某阶段时开始计时，进度到 100 时结束。"""
+        self.phase_start(name)
+        if progress >= 100:
+            self.phase_end(name)
+
+    @contextmanager
+    def phase(self, name):
+        self.phase_start(name)
+        try:
+            yield
+        finally:
+            self.phase_end(name)
+
+    # ---- WebDriver 命令 ----
+
+    def instrument_driver(self, driver):
+        """
+        包装 driver.execute，统计每种 WebDriver 命令的次数和耗时。
+        WebElement 的操作也经由 driver.execute 发出，同样会被统计。
+        """
+        original_execute = driver.execute
+
+        def execute(driver_command, params=None):
+            start = time.perf_counter()
+            try:
+                return original_execute(driver_command, params)
+            finally:
+                self._record_command(driver_command, time.perf_counter() - start)
+
+        driver.execute = execute
+        return driver
+
+    def _record_command(self, command, seconds):
+        with self._lock:
+            entry = self.commands.setdefault(command, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    # ---- 下载 ----
+
+    def record_download(self, size, seconds):
+        """记录一张下载成功的图片（size 字节，耗时 seconds 秒）。"""
+        now = time.perf_counter()
+        with self._lock:
+            self.bytes_downloaded += size
+            self.images_downloaded += 1
+            self.latencies.setdefault('download', []).append(seconds)
+            if self._first_download is None:
+                self._first_download = now - seconds
+            self._last_download = now
+
+    def throughput(self):
+        """返回 (字节/秒, 张/秒)，以第一张开始下载到最后一张完成的时间计算。"""
+        with self._lock:
+            if self._first_download is None:
+                return 0.0, 0.0
+            window = max(self._last_download - self._first_download, 1e-6)
+            return self.bytes_downloaded / window, self.images_downloaded / window
+
+    # ---- 导出 ----
+
+    def snapshot(self):
+        """当前所有指标的字典（可直接 json.dump）。"""
+        bytes_per_second, images_per_second = self.throughput()
+        with self._lock:
+            latency = {}
+            for name, samples in self.latencies.items():
+                ordered = sorted(samples)
+                latency[name] = {
+                    'count': len(ordered),
+                    'mean': sum(ordered) / len(ordered) if ordered else 0.0,
+                    'max': ordered[-1] if ordered else 0.0,
+                }
+                for quantile in self.QUANTILES:
+                    latency[name][f'p{int(quantile * 100)}'] = percentile(ordered, quantile)
+            phases = dict(self.phases)
+            # 尚未结束的阶段按当前已用时间计
+            now = time.perf_counter()
+            for name, start in self._phase_starts.items():
+                phases[name] = phases.get(name, 0.0) + now - start
+            return {
+                'user_id': self.user_id,
+                'started_at': self.started_at,
+                'elapsed_seconds': self.elapsed(),
+                'phases': phases,
+                'counters': dict(self.counters),
+                'latency_seconds': latency,
+                'webdriver_commands': {command: {'count': count, 'seconds': seconds}
+                                       for command, (count, seconds) in self.commands.items()},
+                'webdriver_commands_total': sum(count for count, _ in self.commands.values()),
+                'downloads': {
+                    'images': self.images_downloaded,
+                    'bytes': self.bytes_downloaded,
+                    'images_per_second': images_per_second,
+                    'bytes_per_second': bytes_per_second,
+                },
+            }
+
+    def live_text(self):
+        """给 stats_callback 附加的简短实时指标。"""
+        bytes_per_second, images_per_second = self.throughput()
+        with self._lock:
+            command_total = sum(count for count, _ in self.commands.values())
+        parts = []
+        if images_per_second:
+            parts.append(f"{images_per_second:.1f} 张/秒, {bytes_per_second / 1024 / 1024:.2f} MB/秒")
+        if command_total:
+            parts.append(f"WebDriver 命令 {command_total} 次")
+        return ' | '.join(parts)
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """Prometheus 文本格式（node_exporter textfile collector 可直接读取）。"""
+        data = self.snapshot()
+        user_label = f'user="{_escape_label(self.user_id or "")}"'
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            full_name = f'{METRIC_PREFIX}_{name}'
+            lines.append(f'# HELP {full_name} {help_text}')
+            lines.append(f'# TYPE {full_name} {metric_type}')
+            for labels, value in samples:
+                label_text = ','.join([user_label] + [f'{key}="{_escape_label(val)}"' for key, val in labels])
+                lines.append(f'{full_name}{{{label_text}}} {value:g}')
+
+        metric('run_seconds', 'gauge', 'Wall time of the run.', [((), data['elapsed_seconds'])])
+        metric('phase_seconds', 'gauge', 'Wall time spent in each phase.',
+               [((('phase', name),), seconds) for name, seconds in data['phases'].items()])
+        metric('events_total', 'counter', 'Crawl and download event counters.',
+               [((('name', name),), value) for name, value in data['counters'].items()
+                if isinstance(value, (int, float))])
+        metric('webdriver_commands_total', 'counter', 'WebDriver commands sent, by command.',
+               [((('command', name),), entry['count']) for name, entry in data['webdriver_commands'].items()])
+        metric('webdriver_command_seconds_total', 'counter', 'Time spent in WebDriver commands, by command.',
+               [((('command', name),), entry['seconds']) for name, entry in data['webdriver_commands'].items()])
+        latency_samples = []
+        for name, summary in data['latency_seconds'].items():
+            for quantile in self.QUANTILES:
+                latency_samples.append(((('operation', name), ('quantile', quantile)),
+                                        summary[f'p{int(quantile * 100)}']))
+        metric('latency_seconds', 'gauge', 'Latency quantiles per operation.', latency_samples)
+        downloads = data['downloads']
+        metric('downloaded_images_total', 'counter', 'Images downloaded.', [((), downloads['images'])])
+        metric('downloaded_bytes_total', 'counter', 'Bytes downloaded.', [((), downloads['bytes'])])
+        metric('download_bytes_per_second', 'gauge', 'Download throughput.', [((), downloads['bytes_per_second'])])
+        metric('download_images_per_second', 'gauge', 'Images downloaded per second.',
+               [((), downloads['images_per_second'])])
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path):
+        _write_atomic(path, self.to_json())
+
+    def write_prometheus(self, path):
+        _write_atomic(path, self.to_prometheus())
+
+    def export(self, metrics_dir, name=None):
+        """
+        在 metrics_dir 下写出 <name>.json 和 <name>.prom（name 默认为用户 ID）。
+        返回：
+            tuple: (json 路径, prom 路径)
+        """
+        name = name or self.user_id or 'run'
+        json_path = os.path.join(metrics_dir, f'{name}.json')
+        prom_path = os.path.join(metrics_dir, f'{name}.prom')
+        self.write_json(json_path)
+        self.write_prometheus(prom_path)
+        return json_path, prom_path
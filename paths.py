@@ -0,0 +1,40 @@
+import json
+import os
+import sys
+
+CONFIG_NAME = 'config.json'
+
+
+def base_dir():
+    """
+    程序所在目录：打包的 EXE 为 EXE 所在目录，脚本运行时为本文件所在目录（与 selenium_a.get_driver_path 相同），
+    不随启动时的工作目录变化。
+    """
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def config_path():
+    """config.json 的路径。"""
+    return os.path.join(base_dir(), CONFIG_NAME)
+
+
+def data_dir():
+    """
+    【数据目录】
+    程序自己生成的数据（媒体索引、检查点、日志、浏览器驱动登记）都放在这个目录下，
+    默认与 config.json 相同，可在 config.json（或设置窗口）中用 data_dir 改到其他位置，相对路径相对于程序所在目录。
+    每次调用都重新读取配置，修改后下一次任务即生效，不必重启。
+    """
+    try:
+        with open(config_path(), 'r', encoding='utf-8') as f:
+            configured = json.load(f).get('data_dir') or ''
+    except (OSError, ValueError, AttributeError):
+        configured = ''
+    return os.path.join(base_dir(), configured)
+
+
+def data_path(path):
+    """相对路径解析到数据目录下，绝对路径原样返回。"""
+    return os.path.join(data_dir(), path)
@@ -0,0 +1,238 @@
+import importlib.util
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_WORKERS = 2  # 后处理进程数
+SIDECAR_NAME = 'metadata.jsonl'  # 放在下载目录下，每行一张图片的元数据
+DEFAULT_TASKS = ('meta', 'phash')
+TRANSCODE_FORMATS = ('webp', 'avif')
+NEAR_DUPLICATE_DISTANCE = 6  # 感知哈希的汉明距离不超过此值视为近似重复
+
+# 记入元数据的 EXIF 标签（推特通常会去掉 EXIF，保留下来的多为这几项）
+_EXIF_TAGS = {271: 'make', 272: 'model', 274: 'orientation', 305: 'software', 306: 'datetime'}
+
+
+def pillow_available():
+    return importlib.util.find_spec('PIL') is not None
+
+
+def _phash(image, hash_size=8, highfreq_factor=4):
+    """
+    感知哈希（pHash）：缩成 32×32 灰度图做二维 DCT，取左上角 8×8 低频系数与中位数比较，
+    得到 64 位哈希（16 位十六进制）。缩放、重新压缩后的同一张图片汉明距离很小。
+    """
+    from PIL import Image
+    resample = getattr(Image, 'Resampling', Image).LANCZOS
+    size = hash_size * highfreq_factor
+    pixels = list(image.convert('L').resize((size, size), resample).getdata())
+    rows = [pixels[i * size:(i + 1) * size] for i in range(size)]
+    cos = [[math.cos(math.pi * (2 * x + 1) * u / (2 * size)) for x in range(size)] for u in range(hash_size)]
+    # 只需要低频部分：先对每行做 DCT 取前 hash_size 个系数，再对列做
+    row_dct = [[sum(c * value for c, value in zip(cos[u], row)) for u in range(hash_size)] for row in rows]
+    coefficients = [sum(cos[v][y] * row_dct[y][u] for y in range(size))
+                    for v in range(hash_size) for u in range(hash_size)]
+    # 直流分量不参与中位数（它只反映整体亮度）
+    median = sorted(coefficients[1:])[(len(coefficients) - 1) // 2]
+    bits = 0
+    for value in coefficients:
+        bits = (bits << 1) | (value > median)
+    return f'{bits:0{hash_size * hash_size // 4}x}'
+
+
+def hamming(hash_a, hash_b):
+    """两个十六进制感知哈希的汉明距离。"""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
+
+
+def process_file(path, tasks=DEFAULT_TASKS, transcode=None, quality=80):
+    """
+    【单文件后处理】
+    在子进程中运行（必须是模块级函数才能被 ProcessPoolExecutor 序列化）。
+    Args:
+        path (str): 已下载的图片。
+        tasks (tuple): 'meta' —— 尺寸、格式、EXIF；'phash' —— 感知哈希。
+        transcode (str): 'webp' / 'avif'，另存一份转码文件到同目录的 <格式>/ 子文件夹（可选，原图保留）。
+            不与原图放在一起，下载时按文件名判断“已下载”不会误把转码文件当成原图。
+        quality (int): 转码质量。
+    返回：
+        dict: {'path', 'size', 'width', 'height', 'format', 'exif', 'phash', 'transcoded', 'error'}，
+              未执行的任务对应的值为 None。
+    """
+    record = {'path': path, 'size': os.path.getsize(path), 'width': None, 'height': None, 'format': None,
+              'exif': None, 'phash': None, 'transcoded': None, 'error': None}
+    try:
+        from PIL import Image
+        with Image.open(path) as image:
+            record['width'], record['height'] = image.size
+            record['format'] = image.format
+            if 'meta' in tasks:
+                exif = image.getexif()
+                record['exif'] = {name: str(exif[tag]) for tag, name in _EXIF_TAGS.items() if tag in exif} or None
+            if 'phash' in tasks:
+                record['phash'] = _phash(image)
+            if transcode and (image.format or '').lower() != transcode:
+                directory, name = os.path.split(path)
+                os.makedirs(os.path.join(directory, transcode), exist_ok=True)
+                target = os.path.join(directory, transcode, os.path.splitext(name)[0] + '.' + transcode)
+                # 先写临时文件再改名，避免留下半截的转码文件
+                image.save(target + '.part', format=transcode.upper(), quality=quality)
+                os.replace(target + '.part', target)
+                record['transcoded'] = target
+    except Exception as e:
+        # 不是图片（如视频）、文件损坏或 Pillow 不支持该格式
+        record['error'] = f'{type(e).__name__}: {e}'
+    return record
+
+
+def find_near_duplicates(records, max_distance=NEAR_DUPLICATE_DISTANCE):
+    """
+    在后处理记录中找感知哈希相近的图片对。
+    返回：
+        list: [(路径A, 路径B, 距离)]
+    """
+    hashed = [(record['path'], int(record['phash'], 16)) for record in records if record.get('phash')]
+    pairs = []
+    for i, (path_a, hash_a) in enumerate(hashed):
+        for path_b, hash_b in hashed[i + 1:]:
+            distance = bin(hash_a ^ hash_b).count('1')
+            if distance <= max_distance:
+                pairs.append((path_a, path_b, distance))
+    return pairs
+
+
+class PostProcessor:
+    """
+    【后处理模块】
+    下载完成的文件交给进程池计算尺寸/EXIF、感知哈希，可选转码为 WebP/AVIF，
+    结果逐行追加到下载目录下的 metadata.jsonl。
+    submit() 只是把任务交给进程池，下载线程不做任何 CPU 密集的工作；
+    在途任务达到 max_pending 时 submit() 才会阻塞（背压），避免下载远快于处理时无限堆积。
+
+    用法：
+        with PostProcessor(download_dir, transcode='webp') as post:
+            pipeline = DownloadPipeline(download_dir, postprocessor=post)
+            ...
+    """
+
+    def __init__(self, download_dir, workers=DEFAULT_WORKERS, tasks=DEFAULT_TASKS, transcode=None, quality=80,
+                 max_pending=None, sidecar_path=None, log_func=print):
+        """
+        Args:
+            download_dir (str): 下载目录，元数据文件默认放在这里。
+            workers (int): 进程数。
+            tasks (tuple): 'meta' 和 / 或 'phash'。
+            transcode (str): 'webp' / 'avif'，None 为不转码。
+            quality (int): 转码质量。
+            max_pending (int): 在途任务上限，默认为进程数的 4 倍。
+            sidecar_path (str): 元数据文件路径，默认 <download_dir>/metadata.jsonl。
+            log_func: 日志函数。
+        """
+        if transcode is not None and transcode not in TRANSCODE_FORMATS:
+            raise ValueError(f"不支持的转码格式: {transcode}")
+        self.download_dir = download_dir
+        self.workers = max(1, int(workers))
+        self.tasks = tuple(tasks)
+        self.transcode = transcode
+        self.quality = quality
+        self.sidecar_path = sidecar_path or os.path.join(download_dir, SIDECAR_NAME)
+        self.log_func = log_func
+        self.records = []
+        self.failed = 0
+        self.enabled = False
+        self._pending = threading.BoundedSemaphore(max_pending or self.workers * 4)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._sidecar = None
+
+    def start(self):
+        if not pillow_available():
+            self.log_func("⚠️ 未安装 Pillow，跳过下载后处理（pip install Pillow）。")
+            return self
+        os.makedirs(os.path.dirname(os.path.abspath(self.sidecar_path)), exist_ok=True)
+        self._sidecar = open(self.sidecar_path, 'a', encoding='utf-8')
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.enabled = True
+        return self
+
+    def submit(self, path, meta=None):
+        """
+        提交一个已下载的文件，meta（如推文 ID、媒体 ID）会一并写入元数据。
+        在途任务已满时阻塞到有任务完成。
+        """
+        if not self.enabled:
+            return
+        self._pending.acquire()
+        try:
+            future = self._executor.submit(process_file, path, self.tasks, self.transcode, self.quality)
+        except BaseException:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda done: self._finish(done, meta))
+
+    def _finish(self, future, meta):
+        # 在进程池的管理线程中调用
+        try:
+            record = future.result()
+        except Exception as e:
+            # 子进程崩溃等
+            record = {'error': f'{type(e).__name__}: {e}'}
+        finally:
+            self._pending.release()
+        record.update({key: value for key, value in (meta or {}).items()
+                       if key in ('user_id', 'tweet_id', 'media_id')})
+        record['processed_at'] = time.time()
+        with self._lock:
+            self.records.append(record)
+            if record.get('error'):
+                self.failed += 1
+            self._sidecar.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._sidecar.flush()
+
+    def close(self):
+        """
+        等待所有任务完成，关闭进程池和元数据文件，并报告近似重复的图片。
+        返回：
+            int: 处理完成的文件数
+        """
+        if not self.enabled:
+            return 0
+        self._executor.shutdown(wait=True)
+        self.enabled = False
+        self._sidecar.close()
+        processed = len(self.records)
+        duplicates = find_near_duplicates(self.records)
+        self.log_func(f"后处理完成：{processed} 个文件（失败 {self.failed}），元数据已写入 {self.sidecar_path}")
+        if duplicates:
+            self.log_func(f"   发现 {len(duplicates)} 对近似重复的图片：")
+            for path_a, path_b, distance in duplicates[:10]:
+                self.log_func(f"      {os.path.basename(path_a)} ≈ {os.path.basename(path_b)}（距离 {distance}）")
+        return processed
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def postprocessor_from_config(config, download_dir, log_func=print):
+    """
+    由 config.json 中的 postprocess 配置创建后处理器，例如
+    {"workers": 2, "tasks": ["meta", "phash"], "transcode": "webp", "quality": 80}。
+    配置为空时返回 None（不做后处理）。
+    """
+    if not config:
+        return None
+    return PostProcessor(
+        download_dir,
+        workers=config.get('workers', DEFAULT_WORKERS),
+        tasks=config.get('tasks', DEFAULT_TASKS),
+        transcode=config.get('transcode'),
+        quality=config.get('quality', 80),
+        log_func=log_func
+    )
@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+import cancellation
+
+THROTTLE_STATUSES = (429, 503)  # 服务器限流 / 过载，应降速而不是立即重试
+
+DEFAULT_COOLDOWN = 1.0  # 没有 Retry-After 时第一次限流的冷却秒数，连续限流时翻倍
+MAX_COOLDOWN = 60.0
+MIN_RATE = 0.5  # 令牌桶速率下限（请求/秒）
+MAX_RATE = 50.0  # 令牌桶速率上限：长时间没被限流时加性增长到这里为止，令牌桶仍然起作用
+
+
+def parse_retry_after(value, now=None):
+    """
+    解析 Retry-After 头：秒数或 HTTP 日期，返回需要等待的秒数；无法解析时返回 None。
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    now = now if now is not None else time.time()
+    return max(0.0, retry_at.timestamp() - now)
+
+
+class _HostState:
+    def __init__(self, limit):
+        self.limit = float(limit)  # AIMD 并发窗口
+        self.in_flight = 0
+        self.rate = None  # 令牌桶速率（请求/秒），第一次被限流前不限速
+        self.tokens = 1.0
+        self.refilled_at = time.monotonic()
+        self.cooldown_until = 0.0
+        self.consecutive_throttles = 0
+        self.completions = deque()  # 最近完成请求的时间，用于估算实际速率
+        self.throttled = 0
+        self.succeeded = 0
+
+
+class HostScheduler:
+    """
+    【自适应下载调度】
+    按主机（如 pbs.twimg.com）限制下载请求：
+    - 并发窗口 AIMD：每次成功加 1/窗口（约每轮加 1），被限流（429/503）时减半；
+    - 令牌桶：第一次被限流后启用，速率取当时实际速率的一半，之后随成功缓慢回升；
+    - Retry-After：被限流时该主机的所有请求都等到指定时间后再发，没有该头时按 1、2、4... 秒冷却。
+    下载线程数只是上限，实际同时在途的请求数由窗口决定，始终贴近服务器能承受的速率。
+
+    用法：
+        scheduler.acquire(host, cancel)  # cancel 可选，取消时抛出 cancellation.CancelledError
+        try:
+            ...  # 发请求
+        finally:
+            scheduler.release(host, 'ok' / 'throttled' / 'error', retry_after)
+    """
+
+    def __init__(self, max_concurrency=4, min_concurrency=1, window_seconds=10.0):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.min_concurrency = max(1, min(int(min_concurrency), self.max_concurrency))
+        self.window_seconds = window_seconds
+        self._hosts = {}
+        self._condition = threading.Condition()
+        self._watched = set()  # 已登记唤醒回调的取消令牌
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.max_concurrency)
+        return state
+
+    def _wake(self):
+        with self._condition:
+            self._condition.notify_all()
+
+    def acquire(self, host, cancel=None):
+        """
+        等待到该主机允许再发一个请求（冷却结束、窗口有空位、令牌足够）。
+        cancel（cancellation.CancelToken，可选）取消时立即唤醒等待并抛出 CancelledError，
+        不必等到冷却（最长 MAX_COOLDOWN 秒）结束。
+        """
+        if cancel is not None and cancel not in self._watched:
+            self._watched.add(cancel)
+            cancel.on_cancel(self._wake)
+        with self._condition:
+            state = self._state(host)
+            while True:
+                cancellation.check(cancel)
+                now = time.monotonic()
+                if state.rate is not None:
+                    state.tokens = min(max(1.0, state.rate), state.tokens + (now - state.refilled_at) * state.rate)
+                    state.refilled_at = now
+                if state.cooldown_until > now:
+                    wait = state.cooldown_until - now
+                elif state.in_flight >= int(state.limit):
+                    wait = None  # 等有请求结束
+                elif state.rate is not None and state.tokens < 1.0:
+                    wait = (1.0 - state.tokens) / state.rate
+                else:
+                    if state.rate is not None:
+                        state.tokens -= 1.0
+                    state.in_flight += 1
+                    return
+                self._condition.wait(wait)
+
+    def release(self, host, outcome='ok', retry_after=None):
+        """
+        请求结束后调用。
+        Args:
+            outcome (str): 'ok' 成功；'throttled' 被限流（429/503）；'error' 网络错误等（不调整速率）。
+            retry_after (float): 服务器要求等待的秒数（Retry-After），可选。
+        返回：
+            float: 被限流时该主机的冷却秒数，其他情况为 0
+        """
+        cooldown = 0.0
+        with self._condition:
+            state = self._state(host)
+            state.in_flight = max(0, state.in_flight - 1)
+            now = time.monotonic()
+            if outcome == 'ok':
+                state.succeeded += 1
+                state.consecutive_throttles = 0
+                state.limit = min(self.max_concurrency, state.limit + 1.0 / state.limit)
+                if state.rate is not None:
+                    state.rate = min(MAX_RATE, state.rate + 1.0 / state.rate)
+                state.completions.append(now)
+                while state.completions and now - state.completions[0] > self.window_seconds:
+                    state.completions.popleft()
+            elif outcome == 'throttled':
+                state.throttled += 1
+                state.consecutive_throttles += 1
+                state.limit = max(self.min_concurrency, state.limit / 2)
+                # 乘性减速：以最近实际达到的速率（或当前令牌桶速率，取小者）的一半为新速率
+                span = max(1.0, now - state.completions[0]) if state.completions else self.window_seconds
+                observed = len(state.completions) / span
+                current = observed if state.rate is None else min(state.rate, observed or state.rate)
+                state.rate = min(MAX_RATE, max(MIN_RATE, current / 2))
+                state.tokens = 0.0
+                state.refilled_at = now
+                if retry_after is not None:
+                    # 服务器给的 Retry-After 也不超过 MAX_COOLDOWN，异常的大值不会让下载停住几个小时
+                    cooldown = min(retry_after, MAX_COOLDOWN)
+                else:
+                    cooldown = min(MAX_COOLDOWN, DEFAULT_COOLDOWN * 2 ** (state.consecutive_throttles - 1))
+                state.cooldown_until = max(state.cooldown_until, now + cooldown)
+            self._condition.notify_all()
+        return cooldown
+
+    def snapshot(self):
+        """各主机当前的并发窗口、速率和计数，用于日志或指标。"""
+        with self._condition:
+            return {host: {'limit': state.limit, 'in_flight': state.in_flight, 'rate': state.rate,
+                           'throttled': state.throttled, 'succeeded': state.succeeded}
+                    for host, state in self._hosts.items()}
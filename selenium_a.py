@@ -1,12 +1,19 @@
+import base64
+import json
 import os
+import re
 import sys
 import time
+from urllib.parse import urlsplit
 from selenium import webdriver
 from selenium.common import TimeoutException, NoSuchElementException, StaleElementReferenceException
 from selenium.webdriver.edge.service import Service
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.wait import WebDriverWait
+from media_url import to_orig_url, parse_status_href, media_id_from_url
+import driver_registry
+from driver_registry import quit_driver
 
 PICTURE_CONTAINER_CLASS = 'css-175oi2r'
 
@@ -55,7 +62,28 @@ def get_driver_path(driver_filename='msedgedriver.exe'):
 
 
 # --- 动态路径构建逻辑结束 ---
-def visit_edge(download_dir, driver_path, headless = True):
+
+# 精简模式（lean）：滚动和提取只读取 img 的 src 属性，图片本身、视频、字体和统计请求都不需要加载。
+# 图片另外由 prefs 在渲染层禁用，这里的规则同时拦住预览图、视频分片、字体文件和埋点上报。
+LEAN_BLOCKED_URLS = [
+    '*pbs.twimg.com/media/*', '*pbs.twimg.com/*_video_thumb/*', '*pbs.twimg.com/profile_images/*',
+    '*pbs.twimg.com/profile_banners/*', '*pbs.twimg.com/card_img/*', '*video.twimg.com/*',
+    '*.woff*', '*.ttf*', '*.otf*',
+    '*google-analytics.com/*', '*googletagmanager.com/*', '*doubleclick.net/*', '*ads-twitter.com/*',
+    '*analytics.twitter.com/*', '*/1.1/jot/*',
+]
+# 主栏 600px 加折叠的导航栏；再窄 X 会切换为移动版布局（class 片段不同，father_class 会失效）。
+# 高度与常见的最大化窗口相当，每次滚动扫描的行数不变，move_step 的含义不受影响。
+LEAN_WINDOW_SIZE = (720, 1080)
+
+
+def _block_lean_urls(driver):
+    """对当前标签页启用精简模式的请求拦截（CDP 的拦截规则按标签页生效）。"""
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': LEAN_BLOCKED_URLS})
+
+
+def visit_edge(download_dir, driver_path, headless = True, capture_network=False, lean=False):
     """
     【原有索引方式说明】
     本函数仍然接受 driver_path 参数，保持向后兼容性。
@@ -72,6 +100,16 @@ def visit_edge(download_dir, driver_path, headless = True):
     - 将路径生成的责任与使用路径的责任分离
     - 保持函数的灵活性，可以接受任意路径
     - 兼容旧代码，无需修改所有调用处
+
+    capture_network=True 时开启性能日志并通过 CDP 启用 Network 域，
+    之后可用 NetworkCapture 读取页面自己发出的时间线接口响应。
+
+    lean=True 为精简模式：禁用图片、静音并禁止视频自动播放，用 CDP Network.setBlockedURLs
+    拦截图片、视频、字体和统计请求，窗口缩小为 LEAN_WINDOW_SIZE（visit_x 不再最大化）。
+    提取只依赖 src 属性，不受影响；长时间滚动时浏览器的流量、CPU 和内存占用都大幅下降。
+
+    启动后会登记驱动进程（driver_registry），用完请调用 quit_driver(driver) 关闭，
+    程序被强制结束时残留的进程可在下次启动时由 driver_registry.reap_stale() 清理。
     """
     if not os.path.exists(driver_path):
         raise FileNotFoundError(f"WebDriver文件未找到。请检查路径是否正确: {driver_path}")
@@ -98,17 +136,93 @@ def visit_edge(download_dir, driver_path, headless = True):
         'download.directory_upgrade': True,
         'safebrowsing.enabled': True
     }
+    if lean:
+        # 2 = 阻止；无头模式下 prefs 可能不生效，再用 blink-settings 关一次
+        prefs['profile.managed_default_content_settings.images'] = 2
+        edge_options.add_argument("--blink-settings=imagesEnabled=false")
+        edge_options.add_argument("--autoplay-policy=user-gesture-required")
+        edge_options.add_argument("--mute-audio")
+        edge_options.add_argument("--disable-background-networking")
+        edge_options.add_argument(f"--window-size={LEAN_WINDOW_SIZE[0]},{LEAN_WINDOW_SIZE[1]}")
     edge_options.add_experimental_option('prefs', prefs)
     # 禁用证书验证（用于解决 SSL 握手问题）
     edge_options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    if capture_network:
+        # 性能日志里包含 Network.* 事件，用于捕获时间线接口的响应
+        edge_options.set_capability('ms:loggingPrefs', {'performance': 'ALL'})
     edge_service = Service(executable_path=driver_path)
     driver = webdriver.Edge(service=edge_service, options=edge_options)
+    driver_registry.register(driver)
+    if capture_network:
+        driver.execute_cdp_cmd('Network.enable', {})
+    if lean:
+        _block_lean_urls(driver)
     return driver
 
 
-def visit_x(driver, cookies, url, user_id):
+class NetworkCapture:
+    """
+    【网络捕获模块】
+    从浏览器性能日志中找出页面自己请求的时间线接口（默认 URL 含 UserMedia），
+    再用 CDP Network.getResponseBody 取回响应 JSON，完全不接触 DOM。
+    需要 visit_edge(..., capture_network=True) 启动的 driver。
+
+    用法：
+        capture = NetworkCapture(driver)
+        for payload in capture.drain():
+            ...  # 交给 timeline.parse_timeline_media 解析
+    """
+
+    def __init__(self, driver, url_pattern='UserMedia'):
+        self.driver = driver
+        self.url_pattern = url_pattern
+        self._pending = {}  # requestId -> URL，已收到响应头但还没加载完的请求
+        self._finished = set()
+        self.responses_captured = 0
+
+    def drain(self):
+        """
+        读取自上次调用以来的性能日志，返回已加载完成的时间线响应（解析后的 JSON）列表。
+        还没加载完的请求留到下次调用。
+        """
+        for entry in self.driver.get_log('performance'):
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            method = message.get('method')
+            params = message.get('params', {})
+            if method == 'Network.responseReceived':
+                response_url = params.get('response', {}).get('url', '')
+                if self.url_pattern in response_url:
+                    self._pending[params['requestId']] = response_url
+            elif method == 'Network.loadingFinished':
+                self._finished.add(params.get('requestId'))
+
+        payloads = []
+        for request_id in [r for r in self._pending if r in self._finished]:
+            response_url = self._pending.pop(request_id)
+            self._finished.discard(request_id)
+            try:
+                body = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+                text = body['body']
+                if body.get('base64Encoded'):
+                    text = base64.b64decode(text).decode('utf-8')
+                payloads.append(json.loads(text))
+                self.responses_captured += 1
+            except Exception as e:
+                print(f"读取时间线响应失败 ({response_url}): {e}")
+        # 与时间线无关的请求不需要记住
+        self._finished.intersection_update(self._pending)
+        return payloads
+
+
+def visit_x(driver, cookies, url, user_id, maximize=True):
+    """注入 auth_token 并打开用户媒体页。精简模式的浏览器传 maximize=False，保持小窗口。"""
     try:
-        driver.get(url)
+        # 预先启动的浏览器已经打开过首页，不必再打开一次
+        if not driver.current_url.startswith(url):
+            driver.get(url)
         cookies_dict = {
             'name': 'auth_token',
             'value': cookies,
@@ -117,11 +231,16 @@ def visit_x(driver, cookies, url, user_id):
             'secure': True,
             'httpOnly': True
         }
+        if urlsplit(url).hostname not in ('x.com', 'www.x.com'):
+            # 本地回放服务器（bench.py）：Cookie 属于当前主机，且不要求 https
+            del cookies_dict['domain']
+            cookies_dict['secure'] = url.startswith('https')
         driver.add_cookie(cookies_dict)
         print("Cookie 注入成功，尝试以登录状态访问")
 
         driver.get(f'{url}{user_id}/media')
-        driver.maximize_window()
+        if maximize:
+            driver.maximize_window()
 
     except Exception as e:
         print(e)
@@ -140,6 +259,146 @@ def move(driver, scroll_distance, scroll_delay):
     time.sleep(scroll_delay)
 
 
+# 事件驱动滚动：向下滚动约一屏，然后在页面内等待
+#   1) MutationObserver 发现新的内容容器被挂到 DOM 上（且 100ms 内不再变化），或
+#   2) 网络空闲：没有进行中的 fetch / XHR，且 idle_ms 内没有请求开始或结束；
+#      滚动后还没有任何请求发起时至少等 quiet_ms，给无限滚动发起下一页请求留出时间，
+# 满足其一立即返回；max_wait 只是上限。
+# 进行中的请求靠包装 fetch 和 XMLHttpRequest 计数（Resource Timing 只在请求完成后才有条目，
+# 且缓冲区默认 250 条写满后不再增长，不能用来判断空闲）；图片等其他资源由 PerformanceObserver
+# 记为一次网络活动，并随即清空缓冲区。
+_SCROLL_SCRIPT = """
+const [ratio, maxWaitMs, idleMs, fragments, quietMs] = arguments;
+const done = arguments[arguments.length - 1];
+const selector = 'div' + fragments.map(f => '[class*="' + f + '"]').join('');
+const state = window.__ppapScroll || (window.__ppapScroll = {cells: 0, lastMutation: 0, observer: null, net: null});
+state.selector = selector;
+if (!state.observer) {
+    state.observer = new MutationObserver(mutations => {
+        for (const m of mutations) {
+            for (const node of m.addedNodes) {
+                if (node.nodeType === 1 && (node.matches(state.selector) || node.querySelector(state.selector))) {
+                    state.cells += 1;
+                    state.lastMutation = performance.now();
+                }
+            }
+        }
+    });
+    state.observer.observe(document.body, {childList: true, subtree: true});
+}
+if (!state.net) {
+    const net = state.net = {inflight: 0, started: 0, lastActivity: performance.now()};
+    const begin = () => { net.inflight += 1; net.started += 1; net.lastActivity = performance.now(); };
+    const end = () => { net.inflight = Math.max(0, net.inflight - 1); net.lastActivity = performance.now(); };
+    const originalFetch = window.fetch;
+    window.fetch = function (...args) {
+        begin();
+        try {
+            return originalFetch.apply(this, args).finally(end);
+        } catch (e) {
+            end();
+            throw e;
+        }
+    };
+    const originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function (...args) {
+        begin();
+        this.addEventListener('loadend', end, {once: true});
+        return originalSend.apply(this, args);
+    };
+    if (window.PerformanceObserver) {
+        new PerformanceObserver(list => {
+            if (list.getEntries().length) net.lastActivity = performance.now();
+            performance.clearResourceTimings();
+        }).observe({type: 'resource'});
+    }
+}
+const net = state.net;
+const cellsBefore = state.cells;
+const startedBefore = net.started;
+const startY = window.pageYOffset;
+const start = performance.now();
+window.scrollBy(0, Math.round(window.innerHeight * ratio));
+const timer = setInterval(() => {
+    const now = performance.now();
+    const quiet = net.inflight === 0 && now - net.lastActivity >= idleMs;
+    const minWait = net.started > startedBefore ? idleMs : Math.max(idleMs, quietMs);
+    let reason = null;
+    if (state.cells > cellsBefore && now - state.lastMutation >= 100) {
+        reason = 'mutation';
+    } else if (quiet && now - start >= minWait) {
+        reason = 'idle';
+    } else if (now - start >= maxWaitMs) {
+        reason = 'timeout';
+    }
+    if (reason) {
+        clearInterval(timer);
+        done({reason: reason, scrolled: window.pageYOffset - startY,
+              new_cells: state.cells - cellsBefore, elapsed: (now - start) / 1000});
+    }
+}, 50);
+"""
+
+
+def scroll_viewport(driver, father_class, max_wait=2, idle_ms=300, ratio=0.9, quiet_ms=1000):
+    """
+    【事件驱动滚动模块】
+    向下滚动约一屏（ratio × 视口高度，减少相邻两屏的重复扫描），
+    新的内容容器挂载或网络空闲时立即返回，max_wait 秒只是等待上限。
+    进行中的 fetch / XHR（如较慢的 UserMedia 翻页请求）结束前不算空闲；
+    滚动后没有发起任何请求时，至少等待 quiet_ms 毫秒才算空闲。
+
+    返回：
+        dict: {'reason': 'mutation' / 'idle' / 'timeout', 'scrolled': 实际滚动像素,
+               'new_cells': 新挂载的容器数, 'elapsed': 等待秒数}
+              scrolled 为 0 说明已经到底。
+    """
+    driver.set_script_timeout(max_wait + 5)
+    try:
+        result = driver.execute_async_script(_SCROLL_SCRIPT, ratio, int(max_wait * 1000), idle_ms,
+                                             list(father_class), quiet_ms)
+    except TimeoutException:
+        result = {'reason': 'timeout', 'scrolled': None, 'new_cells': 0, 'elapsed': max_wait}
+    print(f"   执行滚动: 向下滚动 {result['scrolled']} 像素，"
+          f"{result['elapsed']:.2f} 秒后返回（{result['reason']}，新容器 {result['new_cells']} 个）。")
+    return result
+
+
+def scroll_position(driver):
+    """当前的纵向滚动位置（像素），读取失败时返回 0。"""
+    try:
+        return int(driver.execute_script("return Math.round(window.pageYOffset || 0);") or 0)
+    except Exception:
+        return 0
+
+
+def restore_scroll(driver, target_y, max_wait=60, step_wait=0.5, stall_limit=6):
+    """
+    【恢复滚动位置模块】
+    从检查点继续时回到上次的滚动位置。虚拟列表只有滚到底部才会加载后面的内容，
+    因此反复跳到“当前页面底部与目标位置中较小的一个”，直到到达目标、
+    连续 stall_limit 次页面高度不再增长（已到底）或超过 max_wait 秒。
+    目标位置之前的内容上次已经处理过，中途不做提取。
+
+    返回：
+        int: 实际到达的位置（像素）
+    """
+    deadline = time.time() + max_wait
+    last_height, stalled = None, 0
+    while time.time() < deadline:
+        position, height = driver.execute_script(
+            "window.scrollTo(0, Math.min(arguments[0], document.documentElement.scrollHeight));"
+            "return [Math.round(window.pageYOffset), document.documentElement.scrollHeight];", target_y)
+        if position >= target_y - 10:
+            break
+        stalled = stalled + 1 if height == last_height else 0
+        if stalled >= stall_limit:
+            break
+        last_height = height
+        time.sleep(step_wait)
+    return scroll_position(driver)
+
+
 def get_new_content_containers(driver, father_class):
     """
     【寻找内容容器模块】
@@ -181,6 +440,112 @@ def get_visible_thumbnails(parent_element):
         return []
 
 
+# 一次注入脚本收集当前所有可见媒体格子的信息，代替逐个元素的 WebDriver 往返。
+# 每个容器/略缩图都会打上 data-ppap-cell / data-ppap-thumb 编号，
+# 编号跟随 DOM 节点：同一节点重复扫描编号不变，节点被重新渲染则得到新编号（与 WebElement id 语义一致），
+# 因此只用于找回元素；跨重新渲染的去重使用由推文 ID、媒体 ID 组成的 stable_key。
+_HARVEST_SCRIPT = """
+const fragments = arguments[0];
+const state = window.__ppapHarvest || (window.__ppapHarvest = {cell: 0, thumb: 0});
+const selector = 'div' + fragments.map(f => '[class*="' + f + '"]').join('');
+const thumbSelector = 'img[src*="media/"], img[src*="video_thumb"], video';
+const cells = [];
+for (const container of document.querySelectorAll(selector)) {
+    if (!container.dataset.ppapCell) {
+        container.dataset.ppapCell = String(++state.cell);
+    }
+    const media = [];
+    for (const el of container.querySelectorAll(thumbSelector)) {
+        if (!el.dataset.ppapThumb) {
+            el.dataset.ppapThumb = String(++state.thumb);
+        }
+        const src = el.tagName === 'VIDEO' ? (el.poster || '') : (el.getAttribute('src') || '');
+        const anchor = el.closest('a[href*="/status/"]');
+        let mediaType = 'photo';
+        if (el.tagName === 'VIDEO' || src.includes('video_thumb')) {
+            mediaType = src.includes('tweet_video_thumb') ? 'gif' : 'video';
+        }
+        media.push({
+            key: el.dataset.ppapThumb,
+            src: src,
+            href: anchor ? anchor.getAttribute('href') : null,
+            media_type: mediaType,
+            multi: mediaType === 'photo' && !!anchor && anchor.querySelector('svg') !== null
+        });
+    }
+    cells.push({cell_id: container.dataset.ppapCell, media: media});
+}
+return cells;
+"""
+
+
+def harvest_media_cells(driver, father_class, timeout=10):
+    """
+    【批量采集模块】
+    每次滚动只执行一次注入脚本，返回所有可见内容容器及其媒体的纯 JSON 记录，
+    代替 find_elements / element.id / get_attribute 的逐个往返。
+
+    返回：
+        list[dict]: 每个容器一条 {'cell_id', 'stable_key', 'media': [记录...]}，
+            stable_key 见 stable_cell_key()；记录包含：
+            key          —— 略缩图编号，可用 find_thumbnail() 找回对应元素（点击提取时使用）
+            src          —— 略缩图地址
+            tweet_id     —— 推文 ID（没有 /status/ 链接时为 None）
+            photo_index  —— 图片序号（从 1 开始，无法确定时为 None）
+            media_type   —— 'photo' / 'video' / 'gif'
+            multi        —— 格子上是否带有多图标记
+    """
+    deadline = time.time() + timeout
+    while True:
+        try:
+            cells = driver.execute_script(_HARVEST_SCRIPT, list(father_class)) or []
+        except Exception as e:
+            print(f"采集媒体格子失败: {e}")
+            cells = []
+        if cells or time.time() >= deadline:
+            break
+        time.sleep(0.5)
+
+    if not cells:
+        print("未找到新的内容容器。")
+    for cell in cells:
+        for record in cell['media']:
+            href = record.pop('href')
+            # /status/<id>/photo/<n>；视频格子的链接是 /status/<id>/video/<n>，只取推文 ID
+            parsed = parse_status_href(href)
+            if parsed:
+                record['tweet_id'], record['photo_index'] = parsed
+            else:
+                match = re.search(r'/status/(\d+)', href or '')
+                record['tweet_id'] = match.group(1) if match else None
+                record['photo_index'] = None
+        cell['stable_key'] = stable_cell_key(cell)
+    return cells
+
+
+def stable_cell_key(cell):
+    """
+    容器的稳定去重键：容器内每个略缩图的 "推文ID:媒体ID"（没有媒体 ID 时用略缩图地址），排序后连接。
+    X 的虚拟列表会重新渲染格子，同一条推文换了 DOM 节点（cell_id 改变）键仍然相同。
+    略缩图还没加载出地址的容器没有可用的 ID，退回 cell_id，等地址加载后会以新的键再处理一次。
+    """
+    parts = sorted(f"{record['tweet_id'] or ''}:{media_id_from_url(record['src']) or record['src']}"
+                   for record in cell['media'] if record['src'])
+    if not parts:
+        return 'cell:' + str(cell['cell_id'])
+    return '|'.join(parts)
+
+
+def find_thumbnail(driver, key):
+    """
+    根据 harvest_media_cells 记录中的 key 找回略缩图元素，元素已被移除时返回 None。
+    """
+    try:
+        return driver.find_element(By.CSS_SELECTOR, f'[data-ppap-thumb="{key}"]')
+    except NoSuchElementException:
+        return None
+
+
 def _get_next_button(driver):
     """
     尝试定位模态框中的"下一页"按钮。
@@ -288,16 +653,166 @@ def _wait_for_src_change(driver, old_url):
         return None
 
 
+DEFAULT_EXTRACT_TABS = 4  # 多标签页提取时同时打开的图片页数
+
+# 在推文图片页（/status/<id>/photo/1）中读取该推文全部图片的地址：
+# 背后的推文详情里每张图都是一个 /status/<id>/photo/<n> 链接，按 n 排序；
+# 没有渲染出推文时退而读取大图查看器（aria-modal）中的图片。页面还没加载到这条推文时返回 null。
+_TWEET_PHOTOS_SCRIPT = """
+const tweetId = arguments[0];
+if (!location.pathname.includes('/status/' + tweetId + '/')) return null;
+const found = {};
+for (const a of document.querySelectorAll('a[href*="/status/' + tweetId + '/photo/"]')) {
+    const match = a.getAttribute('href').match(/\\/photo\\/(\\d+)/);
+    const img = a.querySelector('img');
+    if (match && img && img.getAttribute('src')) found[match[1]] = img.getAttribute('src');
+}
+const indexes = Object.keys(found).map(Number).sort((a, b) => a - b);
+if (indexes.length) return indexes.map(i => found[i]);
+const modal = [...document.querySelectorAll('[aria-modal="true"] img[src*="/media/"]')]
+    .map(img => img.getAttribute('src'));
+return modal.length ? [...new Set(modal)] : null;
+"""
+
+
+class TabExtractionPool:
+    """
+    【多标签页提取模块】
+    需要点击模态框才能拿全图片的推文（多图、缺少快速路径信息），改为在多个标签页中同时打开
+    推文图片页 /status/<id>/photo/1，直接读出该推文全部图片的地址，不再逐张点击“下一张”。
+    同一个 driver 同一时刻只能操作一个标签页，但各标签页的页面加载（网络请求、渲染）是并行的：
+    导航用脚本发起、不等待加载完成，随后轮流切到各标签页检查是否已渲染出图片，
+    完成的标签页立即分配下一条推文。提取总耗时随标签页数近似线性下降。
+
+    用法：
+        pool = TabExtractionPool(driver, tabs=4, base_url=url, user_id=user_id).start()
+        for tweet_id, urls in zip(tweet_ids, pool.extract(tweet_ids)):
+            ...  # urls 按图片顺序排列的原图地址，失败时为空列表
+        pool.close()
+    """
+
+    def __init__(self, driver, tabs=DEFAULT_EXTRACT_TABS, base_url='https://x.com/', user_id='', lean=False,
+                 timeout=10, poll_interval=0.2, settle_polls=2):
+        """
+        Args:
+            driver: 已登录并打开用户媒体页的浏览器，提取结束后切回该页。
+            tabs (int): 同时打开的标签页数。
+            base_url (str) / user_id (str): 用于拼出推文图片页地址。
+            lean (bool): 浏览器为精简模式时，新标签页同样拦截图片、视频、字体和统计请求。
+            timeout (float): 单条推文的最长等待秒数，超时按已读到的结果处理。
+            poll_interval (float): 一轮检查完所有标签页后的等待秒数。
+            settle_polls (int): 读到的图片数连续这么多次不变才算渲染完成（多图推文的图片陆续挂载）。
+        """
+        self.driver = driver
+        self.tabs = max(1, int(tabs))
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.user_id = user_id
+        self.lean = lean
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.settle_polls = max(1, int(settle_polls))
+        self.main_handle = None
+        self.handles = []
+
+    def start(self):
+        self.main_handle = self.driver.current_window_handle
+        for _ in range(self.tabs):
+            self.driver.switch_to.new_window('tab')
+            if self.lean:
+                # CDP 的拦截规则只对当前标签页生效，新标签页要单独设置
+                _block_lean_urls(self.driver)
+            self.handles.append(self.driver.current_window_handle)
+        self.driver.switch_to.window(self.main_handle)
+        return self
+
+    def photo_url(self, tweet_id):
+        return f'{self.base_url}{self.user_id}/status/{tweet_id}/photo/1'
+
+    def _read(self, handle, tweet_id):
+        self.driver.switch_to.window(handle)
+        try:
+            return self.driver.execute_script(_TWEET_PHOTOS_SCRIPT, tweet_id)
+        except Exception:
+            # 页面正在跳转等
+            return None
+
+    def extract(self, tweet_ids, cancel=None):
+        """
+        提取一批推文的图片地址。
+        返回：
+            list: 与 tweet_ids 一一对应、顺序相同，每项为按图片顺序排列的原图地址列表（失败时为空列表）
+        """
+        results = [[] for _ in tweet_ids]
+        waiting = list(enumerate(tweet_ids))
+        waiting.reverse()
+        free = list(self.handles)
+        busy = {}  # 标签页 -> {'index', 'tweet_id', 'deadline', 'last', 'stable'}
+        try:
+            while waiting or busy:
+                if cancel is not None:
+                    cancel.check()
+                while waiting and free:
+                    index, tweet_id = waiting.pop()
+                    handle = free.pop()
+                    self.driver.switch_to.window(handle)
+                    # 用脚本跳转，不等待页面加载完成，其他标签页可以同时加载
+                    self.driver.execute_script("window.location.href = arguments[0];", self.photo_url(tweet_id))
+                    busy[handle] = {'index': index, 'tweet_id': tweet_id, 'deadline': time.time() + self.timeout,
+                                    'last': None, 'stable': 0}
+                for handle, job in list(busy.items()):
+                    found = self._read(handle, job['tweet_id'])
+                    if found and found == job['last']:
+                        job['stable'] += 1
+                    else:
+                        job['stable'] = 1 if found else 0
+                    job['last'] = found or job['last']
+                    if job['stable'] >= self.settle_polls or time.time() >= job['deadline']:
+                        urls = [to_orig_url(src) or src for src in job['last'] or []]
+                        results[job['index']] = list(dict.fromkeys(urls))
+                        if not urls:
+                            print(f"   推文 {job['tweet_id']} 的图片页加载超时。")
+                        del busy[handle]
+                        free.append(handle)
+                if busy and not (waiting and free):
+                    time.sleep(self.poll_interval)
+        finally:
+            self.driver.switch_to.window(self.main_handle)
+        return results
+
+    def close(self):
+        """关闭提取用的标签页（driver.quit() 也会关闭它们）。"""
+        for handle in self.handles:
+            try:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+            except Exception:
+                pass
+        self.handles = []
+        if self.main_handle is not None:
+            self.driver.switch_to.window(self.main_handle)
+
+
 def extract_large_url(driver, small_one):
     """
     【获取大图模块 - 用户的 get_pic 逻辑】
     点击略缩图，获取大图 URL，并关闭模态框。
     【主要修改】：新增循环逻辑，点击"下一页"获取推文中所有图片的 URL。
+    返回按图片序号排列、去重后的列表：模态框打开时地址栏是 /status/<id>/photo/<n>，
+    每张图按当时的 n 记录，多次运行得到的顺序和序号都相同（检查点和索引依赖这一点）。
+    失败时返回 ['VIDEO_OR_FAIL']。
     """
     wait = WebDriverWait(driver, 20)
 
-    # 用于存储所有图片 URL 的集合
-    image_urls = set()
+    # 图片序号 -> 大图 URL
+    image_urls = {}
+
+    def remember(url):
+        parsed = parse_status_href(urlsplit(driver.current_url).path)
+        index = parsed[1] if parsed else None
+        if index is None or image_urls.get(index, url) != url:
+            # 地址栏没有序号，或还没跟上切换：排在已有图片之后
+            index = max(image_urls, default=0) + 1
+        image_urls[index] = url
 
     try:
         # a. 点击略缩图，打开模态框
@@ -326,7 +841,7 @@ def extract_large_url(driver, small_one):
 
         # 记录当前 URL，用于后续判断是否已切换
         current_url = get_large_one.get_attribute("src")
-        image_urls.add(current_url)
+        remember(current_url)
         print(f"   已获取第一张图 URL: {current_url}")
 
         # 短暂等待，确保按钮已渲染（减少等待时间）
@@ -356,12 +871,12 @@ def extract_large_url(driver, small_one):
 
             if next_img_element:
                 new_url = next_img_element.get_attribute("src")
-                if new_url in image_urls:
+                if new_url in image_urls.values():
                     # 如果新 URL 已经在集合中（如回到第一张），则停止
                     print("   检测到 URL 重复，已完成遍历。")
                     break
 
-                image_urls.add(new_url)
+                remember(new_url)
                 current_url = new_url  # 更新当前 URL
                 print(f"   已获取下一张图 URL: {new_url}")
             else:
@@ -372,8 +887,8 @@ def extract_large_url(driver, small_one):
         # d. 关闭模态框
         close(driver)
         time.sleep(0.2)  # 减少等待时间
-        # e. 返回所有 URL 的集合
-        return image_urls
+        # e. 按序号返回所有 URL
+        return list(dict.fromkeys(url for _, url in sorted(image_urls.items())))
     except Exception as e:
         # 如果等待超时 (TimeoutException) 或其他失败
         print(f"提取大图 URL 过程失败: {e}")
@@ -383,8 +898,7 @@ def extract_large_url(driver, small_one):
         except:
             pass  # 可能是超时失败，模态框根本没开
         # 返回一个特殊的标识符，让调用方知道这是一个被忽略的项目
-        # 注意：现在返回的是一个包含错误标识符的集合
-        return {'VIDEO_OR_FAIL'}
+        return ['VIDEO_OR_FAIL']
 
 
 def close(driver):
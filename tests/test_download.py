@@ -0,0 +1,123 @@
+import json
+import os
+
+import pytest
+
+import download
+import rate_limit
+
+BODY = bytes(range(256)) * 40
+JPEG = {'Content-Type': 'image/jpeg', 'ETag': '"v1"'}
+
+
+@pytest.fixture
+def session():
+    session = download.create_session()
+    yield session
+    session.close()
+
+
+def fetch(session, url, directory, variant=None, scheduler=None):
+    return download._download_one(session, url, str(directory), 'MEDIA', 1, log_func=lambda message: None,
+                                  scheduler=scheduler, variant=variant)
+
+
+def write_part(directory, url, data, variant=None, etag='"v1"', total=len(BODY)):
+    part_path = download.part_path_for(str(directory), 'MEDIA', variant)
+    with open(part_path, 'wb') as f:
+        f.write(data)
+    with open(part_path + '.meta', 'w', encoding='utf-8') as f:
+        json.dump({'url': url, 'etag': etag, 'last_modified': None, 'total': total}, f)
+    return part_path
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_fresh_download_writes_file_and_removes_part(http_server, session, tmp_path):
+    http_server.routes['/a.jpg'] = [(200, JPEG, BODY)]
+    result = fetch(session, http_server.url('/a.jpg'), tmp_path, variant='orig')
+    assert result['path'] == str(tmp_path / 'MEDIA.jpg')
+    assert read(result['path']) == BODY
+    assert os.listdir(tmp_path) == ['MEDIA.jpg']
+
+
+def test_resume_sends_if_range_and_appends_matching_range(http_server, session, tmp_path):
+    url = http_server.url('/a.jpg')
+    write_part(tmp_path, url, BODY[:1000], variant='orig')
+    http_server.routes['/a.jpg'] = [(206, dict(JPEG, **{'Content-Range': f'bytes 1000-{len(BODY) - 1}/{len(BODY)}'}),
+                                     BODY[1000:])]
+    result = fetch(session, url, tmp_path, variant='orig')
+    assert result['resumed_from'] == 1000
+    assert read(result['path']) == BODY
+    headers = http_server.requests[-1][1]
+    assert headers['Range'] == 'bytes=1000-'
+    assert headers['If-Range'] == '"v1"'
+
+
+def test_content_range_mismatch_restarts_from_scratch(http_server, session, tmp_path):
+    url = http_server.url('/a.jpg')
+    write_part(tmp_path, url, b'x' * 1000, variant='orig')
+    http_server.routes['/a.jpg'] = [
+        (206, dict(JPEG, **{'Content-Range': f'bytes 0-{len(BODY) - 1}/{len(BODY)}'}), BODY),
+        (200, JPEG, BODY),
+    ]
+    result = fetch(session, url, tmp_path, variant='orig')
+    assert result['resumed_from'] == 0
+    assert read(result['path']) == BODY
+    assert 'Range' not in http_server.requests[-1][1]
+
+
+def test_changed_file_is_downloaded_again(http_server, session, tmp_path):
+    # If-Range 不匹配时服务器返回完整的 200，.part 中的旧字节不能留下
+    url = http_server.url('/a.jpg')
+    write_part(tmp_path, url, b'x' * 1000, variant='orig')
+    http_server.routes['/a.jpg'] = [(200, dict(JPEG, ETag='"v2"'), BODY)]
+    result = fetch(session, url, tmp_path, variant='orig')
+    assert read(result['path']) == BODY
+
+
+def test_part_without_validator_is_not_resumed(http_server, session, tmp_path):
+    url = http_server.url('/a.jpg')
+    with open(download.part_path_for(str(tmp_path), 'MEDIA', 'orig'), 'wb') as f:
+        f.write(b'x' * 1000)
+    http_server.routes['/a.jpg'] = [(200, JPEG, BODY)]
+    result = fetch(session, url, tmp_path, variant='orig')
+    assert read(result['path']) == BODY
+    assert 'Range' not in http_server.requests[-1][1]
+
+
+def test_other_variant_part_is_left_alone(http_server, session, tmp_path):
+    url = http_server.url('/a.jpg')
+    other = write_part(tmp_path, http_server.url('/small.jpg'), b'x' * 1000, variant='small')
+    http_server.routes['/a.jpg'] = [(200, JPEG, BODY)]
+    result = fetch(session, url, tmp_path, variant='orig')
+    assert read(result['path']) == BODY
+    assert read(other) == b'x' * 1000
+
+
+def test_416_discards_part_and_restarts(http_server, session, tmp_path):
+    url = http_server.url('/a.jpg')
+    part_path = write_part(tmp_path, url, b'x' * 1000, variant='orig')
+    http_server.routes['/a.jpg'] = [(416, {}, b''), (200, JPEG, BODY)]
+    result = fetch(session, url, tmp_path, variant='orig')
+    assert read(result['path']) == BODY
+    assert not os.path.exists(part_path + '.meta')
+
+
+def test_retry_after_throttles_host_then_succeeds(http_server, session, tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limit, 'MIN_RATE', 100.0)  # 限流后的令牌桶不必真的等 2 秒
+    http_server.routes['/a.jpg'] = [(429, {'Retry-After': '0'}, b''), (200, JPEG, BODY)]
+    scheduler = rate_limit.HostScheduler(max_concurrency=4)
+    result = fetch(session, http_server.url('/a.jpg'), tmp_path, scheduler=scheduler)
+    assert read(result['path']) == BODY
+    host = next(iter(scheduler.snapshot().values()))
+    assert host['throttled'] == 1 and host['succeeded'] == 1
+    assert host['limit'] < 4
+
+
+def test_not_found_is_not_retried(http_server, session, tmp_path):
+    assert fetch(session, http_server.url('/missing.jpg'), tmp_path) is None
+    assert len(http_server.requests) == 1
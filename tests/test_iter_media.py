@@ -0,0 +1,243 @@
+import copy
+import json
+import os
+
+import selenium_a
+import use
+
+PBS = 'https://pbs.twimg.com/media/'
+
+
+class FakeDriver:
+    """
+    只实现 iter_media 浏览器路径用到的 WebDriver 接口：
+    采集脚本返回预设的格子，滚动脚本立即返回“已到底”。
+    """
+
+    def __init__(self, cells):
+        self.cells = cells
+        self.current_url = 'https://x.com/'
+        self.quit_called = False
+
+    def execute_script(self, script, *args):
+        if script == selenium_a._HARVEST_SCRIPT:
+            return copy.deepcopy(self.cells)
+        return 0
+
+    def execute_async_script(self, script, *args):
+        return {'reason': 'idle', 'scrolled': 0, 'new_cells': 0, 'elapsed': 0.0}
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def execute(self, command, params=None):
+        return None
+
+    def find_element(self, by, value):
+        return object()
+
+    def get(self, url):
+        self.current_url = url
+
+    def add_cookie(self, cookie):
+        pass
+
+    def maximize_window(self):
+        pass
+
+    def quit(self):
+        self.quit_called = True
+
+
+def cell(cell_id, src, href, multi=False, key='1'):
+    return {'cell_id': cell_id,
+            'media': [{'key': key, 'src': src, 'href': href, 'media_type': 'photo', 'multi': multi}]}
+
+
+def crawl(driver, **options):
+    return list(use.iter_media('u', 'token', father_class=['a'], move_step=1, driver=driver,
+                               log_func=lambda message: None, **options))
+
+
+def test_fast_path_yields_resolved_thumbnail():
+    driver = FakeDriver([cell('1', PBS + 'ABC?format=jpg&name=small', '/u/status/10/photo/1')])
+    stats = {}
+    records = crawl(driver, stats=stats)
+    assert [r['url'] for r in records] == [PBS + 'ABC?format=jpg&name=orig']
+    assert records[0]['media_id'] == 'ABC' and records[0]['photo_index'] == 1
+    assert stats['found'] == 1 and stats['thumbnails_fast_resolved'] == 1
+    assert driver.quit_called
+
+
+def test_click_path_keeps_the_first_image(monkeypatch):
+    # 多图推文：略缩图就是第一张图，提取出的第一张与它媒体 ID 相同，不能被当成重复
+    monkeypatch.setattr(selenium_a, 'extract_large_url', lambda driver, element: [
+        PBS + 'ABC?format=jpg&name=large', PBS + 'DEF?format=jpg&name=large'])
+    driver = FakeDriver([cell('1', PBS + 'ABC?format=jpg&name=small', '/u/status/10/photo/1', multi=True)])
+    records = crawl(driver)
+    assert [r['media_id'] for r in records] == ['ABC', 'DEF']
+    assert [r['photo_index'] for r in records] == [1, 2]
+    assert {r['source'] for r in records} == {'click'}
+
+
+def test_rerendered_thumbnail_is_not_extracted_twice(monkeypatch):
+    calls = []
+    monkeypatch.setattr(selenium_a, 'extract_large_url',
+                        lambda driver, element: calls.append(element) or [PBS + 'ABC?format=jpg&name=large'])
+    # 同一张略缩图出现在两个容器里（虚拟列表重新渲染）
+    driver = FakeDriver([cell('1', PBS + 'ABC?format=jpg&name=small', '/u/status/10/photo/1', multi=True),
+                         cell('2', PBS + 'ABC?format=jpg&name=small', None, multi=True, key='2')])
+    records = crawl(driver, extract_mode='click')
+    assert [r['media_id'] for r in records] == ['ABC']
+    assert len(calls) == 1
+
+
+class FakeModal:
+    """大图模态框：地址栏随“下一张”切换为 /photo/<n>，最后一张没有下一张按钮。"""
+
+    def __init__(self, media_ids):
+        self.media_ids = media_ids
+        self.index = 0
+        self.closed = False
+        modal = self
+
+        class Element:
+            def __init__(self, action=None, src=None):
+                self.action = action
+                self.src = src
+
+            def get_attribute(self, name):
+                return {'alt': '图像', 'src': self.src}.get(name)
+
+            def click(self):
+                self.action()
+
+            def is_displayed(self):
+                return True
+
+            def is_enabled(self):
+                return True
+
+        self.Element = Element
+
+        def open_modal():
+            modal.index = 0
+
+        def next_slide():
+            modal.index += 1
+
+        def close_modal():
+            modal.closed = True
+
+        self.thumbnail = Element(open_modal)
+        self._next = Element(next_slide)
+        self._close = Element(close_modal)
+
+    @property
+    def current_url(self):
+        return f'https://x.com/u/status/10/photo/{self.index + 1}'
+
+    def find_elements(self, by, value):
+        return [self.Element(src=f'{PBS}{self.media_ids[self.index]}?format=jpg&name=large')]
+
+    def find_element(self, by, value):
+        if '下一张' in value:
+            if self.index + 1 >= len(self.media_ids):
+                raise selenium_a.NoSuchElementException()
+            return self._next
+        return self._close
+
+
+def test_extract_large_url_returns_images_in_photo_order():
+    modal = FakeModal(['ZZZ', 'AAA', 'MMM'])
+    urls = selenium_a.extract_large_url(modal, modal.thumbnail)
+    assert urls == [f'{PBS}{media_id}?format=jpg&name=large' for media_id in ('ZZZ', 'AAA', 'MMM')]
+    assert modal.closed
+
+
+class FakePool:
+    instances = []
+
+    def __init__(self, driver, tabs, base_url, user_id, lean=False):
+        self.tabs = tabs
+        self.results = FakePool.results
+        self.closed = False
+        FakePool.instances.append(self)
+
+    def start(self):
+        return self
+
+    def extract(self, tweet_ids, cancel=None):
+        return [list(self.results.get(tweet_id, [])) for tweet_id in tweet_ids]
+
+    def close(self):
+        self.closed = True
+
+
+def test_tab_path_keeps_the_first_image_and_closes_the_pool(monkeypatch):
+    FakePool.instances, FakePool.results = [], {'10': [PBS + 'ABC?format=jpg&name=orig', PBS + 'DEF?format=jpg&name=orig']}
+    monkeypatch.setattr(selenium_a, 'TabExtractionPool', FakePool)
+    driver = FakeDriver([cell('1', PBS + 'ABC?format=jpg&name=small', '/u/status/10/photo/1', multi=True)])
+    records = crawl(driver, extract_tabs=4)
+    assert [r['media_id'] for r in records] == ['ABC', 'DEF']
+    assert {r['source'] for r in records} == {'tab'}
+    assert FakePool.instances[0].closed
+
+
+def test_failed_tab_extraction_falls_back_to_click(monkeypatch):
+    FakePool.instances, FakePool.results = [], {}
+    monkeypatch.setattr(selenium_a, 'TabExtractionPool', FakePool)
+    monkeypatch.setattr(selenium_a, 'extract_large_url', lambda driver, element: [
+        PBS + 'ABC?format=jpg&name=large', PBS + 'DEF?format=jpg&name=large'])
+    driver = FakeDriver([cell('1', PBS + 'ABC?format=jpg&name=small', '/u/status/10/photo/1', multi=True)])
+    stats = {}
+    records = crawl(driver, extract_tabs=4, stats=stats)
+    assert [r['media_id'] for r in records] == ['ABC', 'DEF']
+    assert {r['source'] for r in records} == {'click'}
+    assert stats['thumbnails_failed_to_extract'] == 0
+
+
+class ListSink:
+    def __init__(self):
+        self.urls = []
+
+    def submit(self, url, meta=None):
+        self.urls.append(url)
+
+
+def test_external_pipeline_keeps_checkpoint_until_downloads_drain(tmp_path):
+    driver = FakeDriver([cell('1', PBS + 'ABC?format=jpg&name=small', '/u/status/10/photo/1')])
+    sink = ListSink()
+    result = use.main_use(download_dir=str(tmp_path), cookies='token', url='https://x.com/', user_id='u',
+                          father_class=['a'], move_step=1, driver_path=None, log_func=lambda message: None,
+                          pipeline=sink, driver=driver, checkpoint_dir=str(tmp_path / 'checkpoints'),
+                          index_path=str(tmp_path / 'media_index.db'))
+    assert sink.urls == [PBS + 'ABC?format=jpg&name=orig']
+    # 下载还在调用方的队列里：检查点和待下载列表都要留着
+    with open(result['checkpoint'], encoding='utf-8') as f:
+        assert list(json.load(f)['pending']) == ['ABC']
+    assert os.path.dirname(result['checkpoint']) == str(tmp_path / 'checkpoints')
+
+
+def run_own_pipeline(tmp_path, http_server, cancel=None):
+    driver = FakeDriver([cell('1', http_server.url('/media/ABC?format=jpg&name=small'), '/u/status/10/photo/1')])
+    return use.main_use(download_dir=str(tmp_path), cookies='token', url='https://x.com/', user_id='u',
+                        father_class=['a'], move_step=1, driver_path=None, log_func=lambda message: None,
+                        driver=driver, checkpoint_dir=str(tmp_path / 'checkpoints'),
+                        index_path=str(tmp_path / 'media_index.db'), cancel=cancel)
+
+
+def test_failed_download_keeps_checkpoint_for_resume(tmp_path, http_server):
+    # 路由表里没有这张图：服务器返回 404
+    result = run_own_pipeline(tmp_path, http_server)
+    assert result['downloaded'] == 0
+    with open(result['checkpoint'], encoding='utf-8') as f:
+        assert list(json.load(f)['pending']) == ['ABC']
+
+
+def test_completed_downloads_clear_checkpoint(tmp_path, http_server):
+    http_server.routes['/media/ABC?format=jpg&name=orig'] = [(200, {'Content-Type': 'image/jpeg'}, b'jpeg')]
+    result = run_own_pipeline(tmp_path, http_server)
+    assert result['downloaded'] == 1
+    assert result['checkpoint'] is None
+    assert not (tmp_path / 'checkpoints' / 'u.json').exists()
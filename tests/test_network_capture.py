@@ -0,0 +1,187 @@
+import base64
+import json
+
+import pytest
+
+import bench
+import selenium_a
+import timeline
+import use
+
+
+@pytest.fixture
+def server():
+    # 只用回放服务器生成时间线 JSON，不需要真的监听请求
+    server = bench.ReplayServer(tweets=25, multi_ratio=0.3, video_ratio=0.2, page_size=10)
+    yield server
+    server.stop()
+
+
+def log_entry(method, **params):
+    return {'message': json.dumps({'message': {'method': method, 'params': params}})}
+
+
+class StandInPage:
+    """
+    模拟用户媒体页的网络行为：打开页面时请求第一页 UserMedia，之后每次滚动请求下一页，
+    与真实页面一样夹杂着无关的图片请求。请求通过性能日志和 Network.getResponseBody 暴露，
+    与 visit_edge(capture_network=True) 启动的 Edge 相同。
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.log = []
+        self.bodies = {}
+        self.cursor = None
+        self.exhausted = False
+        self.requests = 0
+
+    def issue_timeline_request(self):
+        if self.exhausted:
+            return
+        payload = self.server.timeline_page(self.cursor)
+        self.cursor = timeline.find_bottom_cursor(payload)
+        self.exhausted = self.cursor is None
+        self.requests += 1
+        request_id = f'req{self.requests}'
+        url = f'{self.server.base_url}i/api/graphql/bench/UserMedia?variables=%7B%7D'
+        text = json.dumps(payload)
+        # 奇数次用 base64 返回，与 CDP 对压缩响应的处理相同
+        if self.requests % 2:
+            self.bodies[request_id] = {'body': base64.b64encode(text.encode()).decode(), 'base64Encoded': True}
+        else:
+            self.bodies[request_id] = {'body': text, 'base64Encoded': False}
+        self.log += [
+            log_entry('Network.responseReceived', requestId=request_id, response={'url': url}),
+            log_entry('Network.responseReceived', requestId=f'img{self.requests}',
+                      response={'url': f'{self.server.base_url}media/x.jpg'}),
+            log_entry('Network.loadingFinished', requestId=f'img{self.requests}'),
+            log_entry('Network.loadingFinished', requestId=request_id),
+        ]
+
+
+class CaptureDriver:
+    """只实现网络捕获模式用到的 WebDriver 接口，不提供任何 DOM。"""
+
+    def __init__(self, page):
+        self.page = page
+        self.current_url = 'about:blank'
+        self.harvest_calls = 0
+        self.body_requests = []
+
+    def get_log(self, log_type):
+        assert log_type == 'performance'
+        entries, self.page.log = self.page.log, []
+        return entries
+
+    def execute_cdp_cmd(self, command, params):
+        assert command == 'Network.getResponseBody'
+        self.body_requests.append(params['requestId'])
+        return self.page.bodies[params['requestId']]
+
+    def get(self, url):
+        self.current_url = url
+        if url.endswith('/media'):
+            self.page.issue_timeline_request()
+
+    def execute_script(self, script, *args):
+        if script == selenium_a._HARVEST_SCRIPT:
+            self.harvest_calls += 1
+            return []
+        return 0
+
+    def execute_async_script(self, script, *args):
+        self.page.issue_timeline_request()
+        return {'reason': 'mutation', 'scrolled': 900, 'new_cells': 10, 'elapsed': 0.0}
+
+    def execute(self, command, params=None):
+        return None
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def add_cookie(self, cookie):
+        pass
+
+    def maximize_window(self):
+        pass
+
+    def quit(self):
+        pass
+
+
+def expected_media(server):
+    return [media['media_id'] for tweet in server.timeline for media in tweet['media']]
+
+
+def test_parse_timeline_media_reads_every_page(server):
+    cursor, media_ids, pages = None, [], 0
+    while True:
+        payload = server.timeline_page(cursor)
+        records = timeline.parse_timeline_media(payload)
+        media_ids += [record['media_id'] for record in records]
+        pages += 1
+        cursor = timeline.find_bottom_cursor(payload)
+        if cursor is None:
+            break
+    assert pages == server.page_count == 3
+    assert media_ids == expected_media(server)
+
+
+def test_parse_timeline_media_builds_orig_urls_and_picks_mp4(server):
+    records = timeline.parse_timeline_media(server.timeline_page())
+    photo = next(r for r in records if r['media_type'] == 'photo')
+    assert photo['url'].endswith('name=orig')
+    videos = [r for r in records if r['media_type'] in ('video', 'gif')]
+    assert videos and all(r['url'].endswith('.mp4') for r in videos)
+    # 多图推文的序号从 1 开始连续编号
+    by_tweet = {}
+    for record in records:
+        by_tweet.setdefault(record['tweet_id'], []).append(record['photo_index'])
+    assert all(indexes == list(range(1, len(indexes) + 1)) for indexes in by_tweet.values())
+
+
+def test_parse_timeline_media_skips_quoted_tweets(server):
+    payload = server.timeline_page()
+    entries = payload['data']['user']['result']['timeline_v2']['timeline']['instructions'][0]['entries']
+    quoted = {'rest_id': '42', 'legacy': {'id_str': '42', 'extended_entities': {'media': [
+        {'type': 'photo', 'id_str': 'Quoted', 'media_url_https': 'https://pbs.twimg.com/media/Quoted.jpg'}]}}}
+    entries[0]['content']['itemContent']['tweet_results']['result']['quoted_status_result'] = {'result': quoted}
+    media_ids = [record['media_id'] for record in timeline.parse_timeline_media(payload)]
+    assert 'Quoted' not in media_ids
+    assert media_ids == [r['media_id'] for r in timeline.parse_timeline_media(server.timeline_page())]
+
+
+def test_find_bottom_cursor_on_last_page(server):
+    assert timeline.find_bottom_cursor(server.timeline_page()) == 'C1'
+    assert timeline.find_bottom_cursor(server.timeline_page('C2')) is None
+
+
+def test_network_capture_waits_for_loading_finished(server):
+    page = StandInPage(server)
+    driver = CaptureDriver(page)
+    capture = selenium_a.NetworkCapture(driver)
+    page.issue_timeline_request()
+    # 响应头已到、数据还没加载完：留到下一次
+    finished = page.log.pop()
+    assert capture.drain() == []
+    page.log.append(finished)
+    payloads = capture.drain()
+    assert [record['media_id'] for record in timeline.parse_timeline_media(payloads[0])] == \
+        [record['media_id'] for record in timeline.parse_timeline_media(server.timeline_page())]
+    # 无关的图片请求不会去取响应正文
+    assert driver.body_requests == ['req1']
+    assert capture.responses_captured == 1
+
+
+def test_iter_media_network_mode_reads_timeline_without_dom(server, monkeypatch):
+    page = StandInPage(server)
+    driver = CaptureDriver(page)
+    monkeypatch.setattr(selenium_a, 'visit_edge', lambda *args, **kwargs: driver)
+    records = list(use.iter_media('bench', 'token', url=server.base_url, father_class=['a'], move_step=6,
+                                  extract_mode='network', media_types=('photo', 'video', 'gif'),
+                                  log_func=lambda message: None))
+    assert [record['media_id'] for record in records] == expected_media(server)
+    assert {record['source'] for record in records} == {'network'}
+    assert driver.harvest_calls == 0
+    assert page.exhausted
@@ -0,0 +1,29 @@
+import json
+import os
+
+import checkpoint
+import media_index
+import paths
+
+
+def write_config(directory, **config):
+    with open(directory / 'config.json', 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+
+
+def test_data_dir_follows_config_without_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(paths, 'base_dir', lambda: str(tmp_path))
+    monkeypatch.chdir(os.path.dirname(os.path.abspath(__file__)))  # 与工作目录无关
+    assert paths.data_dir() == os.path.join(str(tmp_path), '')
+    write_config(tmp_path, data_dir='store')
+    assert checkpoint.checkpoint_path(checkpoint.DEFAULT_CHECKPOINT_DIR, 'u') == \
+        os.path.join(str(tmp_path), 'store', 'checkpoints', 'u.json')
+    index = media_index.MediaIndex()
+    index.close()
+    assert index.path == os.path.join(str(tmp_path), 'store', 'media_index.db')
+    assert os.path.exists(index.path)
+
+
+def test_absolute_paths_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(paths, 'base_dir', lambda: str(tmp_path / 'program'))
+    assert paths.data_path(str(tmp_path / 'elsewhere')) == str(tmp_path / 'elsewhere')
@@ -0,0 +1,36 @@
+import threading
+import time
+
+import pytest
+
+import cancellation
+import rate_limit
+
+
+def test_acquire_wakes_up_on_cancel_during_cooldown():
+    scheduler = rate_limit.HostScheduler(max_concurrency=1)
+    scheduler.acquire('h')
+    scheduler.release('h', 'throttled', retry_after=30)
+    cancel = cancellation.CancelToken()
+    threading.Timer(0.2, cancel.cancel).start()
+    started = time.monotonic()
+    with pytest.raises(cancellation.CancelledError):
+        scheduler.acquire('h', cancel)
+    assert time.monotonic() - started < 5
+
+
+def test_retry_after_is_clamped():
+    scheduler = rate_limit.HostScheduler()
+    scheduler.acquire('h')
+    assert scheduler.release('h', 'throttled', retry_after=3600) == rate_limit.MAX_COOLDOWN
+
+
+def test_rate_stops_growing_at_max_rate():
+    scheduler = rate_limit.HostScheduler()
+    scheduler.acquire('h')
+    scheduler.release('h', 'throttled', retry_after=0)
+    scheduler._state('h').rate = rate_limit.MAX_RATE - 0.001  # 省去上千次成功的等待
+    scheduler._state('h').tokens = 1.0
+    scheduler.acquire('h')
+    scheduler.release('h', 'ok')
+    assert scheduler.snapshot()['h']['rate'] == rate_limit.MAX_RATE
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+import video
+
+MASTER = """#EXTM3U
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aud",NAME="audio",URI="audio.m3u8"
+#EXT-X-STREAM-INF:BANDWIDTH=256000,RESOLUTION=320x180,AUDIO="aud"
+low.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=2176000,RESOLUTION=1280x720,AUDIO="aud"
+high.m3u8
+"""
+
+MEDIA = """#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-TARGETDURATION:3
+#EXTINF:3.0,
+seg0.ts
+#EXTINF:3.0,
+seg1.ts
+#EXTINF:1.5,
+seg2.ts
+#EXT-X-ENDLIST
+"""
+
+AUDIO = """#EXTM3U
+#EXT-X-MAP:URI="init.mp4"
+#EXTINF:3.0,
+a0.m4s
+#EXT-X-ENDLIST
+"""
+
+SEGMENTS = [bytes([i]) * (1000 + i) for i in range(3)]
+M3U8 = {'Content-Type': 'application/vnd.apple.mpegurl'}
+
+
+def test_parse_master_playlist_resolves_relative_urls():
+    playlist = video.parse_playlist(MASTER, 'https://video.twimg.com/ext_tw_video/1/pu/pl/master.m3u8')
+    assert playlist['type'] == 'master'
+    assert [s['bandwidth'] for s in playlist['streams']] == [256000, 2176000]
+    assert playlist['streams'][1]['url'] == 'https://video.twimg.com/ext_tw_video/1/pu/pl/high.m3u8'
+    assert playlist['audio'] == {'aud': 'https://video.twimg.com/ext_tw_video/1/pu/pl/audio.m3u8'}
+
+
+def test_parse_rejects_encrypted_playlist():
+    with pytest.raises(video.VideoError):
+        video.parse_playlist('#EXTM3U\n#EXT-X-KEY:METHOD=AES-128,URI="k"\nseg0.ts\n', 'https://h/')
+
+
+def test_download_hls_picks_best_stream_and_joins_segments(http_server, tmp_path):
+    http_server.routes.update({
+        '/v/master.m3u8': [(200, M3U8, MASTER.encode())],
+        '/v/high.m3u8': [(200, M3U8, MEDIA.encode())],
+        '/v/audio.m3u8': [(200, M3U8, AUDIO.encode())],
+        '/v/init.mp4': [(200, {'Content-Type': 'video/mp4'}, b'INIT')],
+        '/v/a0.m4s': [(200, {'Content-Type': 'video/mp4'}, b'AUDIO')],
+    })
+    for i, data in enumerate(SEGMENTS):
+        http_server.routes[f'/v/seg{i}.ts'] = [(200, {'Content-Type': 'video/mp2t'}, data)]
+    session = video.download.create_session()
+    try:
+        result = video.download_hls(session, http_server.url('/v/master.m3u8'), str(tmp_path), 'VID', 1,
+                                    log_func=lambda message: None)
+    finally:
+        session.close()
+
+    assert result['path'] == str(tmp_path / 'VID.ts')
+    with open(result['path'], 'rb') as f:
+        assert f.read() == b''.join(SEGMENTS)
+    with open(tmp_path / 'VID_audio.mp4', 'rb') as f:
+        assert f.read() == b'INITAUDIO'
+    # 只下载了码率最高的一路，分片目录在拼接后删除
+    assert not any(path == '/v/low.m3u8' for path, _ in http_server.requests)
+    assert sorted(os.listdir(tmp_path)) == ['VID.ts', 'VID_audio.mp4']
+
+
+def test_download_hls_fails_when_a_segment_is_missing(http_server, tmp_path):
+    http_server.routes['/v/high.m3u8'] = [(200, M3U8, MEDIA.encode())]
+    http_server.routes['/v/seg0.ts'] = [(200, {'Content-Type': 'video/mp2t'}, SEGMENTS[0])]
+    session = video.download.create_session()
+    try:
+        result = video.download_hls(session, http_server.url('/v/high.m3u8'), str(tmp_path), 'VID', 1,
+                                    log_func=lambda message: None)
+    finally:
+        session.close()
+    assert result is None
+    assert not os.path.exists(tmp_path / 'VID.ts')
@@ -0,0 +1,83 @@
+import media_url
+import video
+
+# 引用推文里的媒体属于别的用户，不收集
+_SKIPPED_KEYS = ('quoted_status_result', 'quoted_status')
+
+
+def _media_records(tweet_id, media_list):
+    records = []
+    for photo_index, media in enumerate(media_list, start=1):
+        media_type = media.get('type')
+        if media_type == 'photo':
+            source = media.get('media_url_https') or media.get('media_url')
+            records.append({
+                'tweet_id': tweet_id,
+                'media_id': media_url.media_id_from_url(source),
+                'url': media_url.to_orig_url(source),
+                'photo_index': photo_index,
+                'media_type': 'photo',
+                'variants': [],
+            })
+        elif media_type in ('video', 'animated_gif'):
+            variants = media.get('video_info', {}).get('variants', [])
+            best = video.best_variant(variants)
+            records.append({
+                'tweet_id': tweet_id,
+                'media_id': media.get('id_str'),
+                'url': best['url'] if best else None,
+                'photo_index': photo_index,
+                'media_type': 'gif' if media_type == 'animated_gif' else 'video',
+                'variants': variants,
+            })
+    return records
+
+
+def parse_timeline_media(payload):
+    """
+    【时间线解析模块】
+    从 UserMedia 等时间线接口返回的 JSON 中取出所有推文的媒体，
+    不依赖具体的嵌套结构：凡是带 extended_entities.media 的推文对象都会被收集。
+
+    返回：
+        list[dict]: 按出现顺序排列的媒体记录，每条包含
+            tweet_id, media_id, url（图片为 name=orig 原图；视频为最高码率 mp4，没有 mp4 时为 m3u8）,
+            photo_index（推文内序号，从 1 开始）, media_type（'photo' / 'video' / 'gif'）,
+            variants（视频的全部候选地址，图片为空列表）
+    """
+    records = []
+    seen = set()
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+            continue
+        if not isinstance(node, dict):
+            continue
+
+        entities = node.get('extended_entities')
+        tweet_id = node.get('id_str')
+        if isinstance(entities, dict) and tweet_id and tweet_id not in seen:
+            seen.add(tweet_id)
+            records.extend(_media_records(tweet_id, entities.get('media', [])))
+
+        stack.extend(reversed([value for key, value in node.items()
+                               if key not in _SKIPPED_KEYS and isinstance(value, (dict, list))]))
+    return records
+
+
+def find_bottom_cursor(payload):
+    """
+    找出时间线 JSON 中向下翻页用的游标（cursorType 为 Bottom 的条目），没有时返回 None。
+    """
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, dict):
+            if node.get('cursorType') == 'Bottom' and node.get('value'):
+                return node['value']
+            stack.extend(value for value in node.values() if isinstance(value, (dict, list)))
+    return None
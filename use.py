@@ -1,187 +1,756 @@
+import time
+from collections import OrderedDict
+import cancellation
+import checkpoint as crawl_checkpoint
+import log_channel
 import selenium_a
 import download
+import media_index
+import media_url
+import metrics as run_metrics
+import timeline
+import x_api
 
 def _default_log(message):
     """默认的日志函数：打印到控制台"""
     print(message)
 
 
-def main_use(download_dir, cookies, url, user_id, father_class, move_step, driver_path,
-             log_func=None, phase_callback=None, stats_callback=None, headless=True):
+def _new_stats():
+    """iter_media 使用的统计计数器"""
+    return {
+        'scrolls': 0,
+        'http_pages': 0,
+        'containers_scanned': 0,
+        'containers_skipped': 0,
+        'containers_rerendered': 0,
+        'thumbnails_scanned': 0,
+        'thumbnails_skipped_by_dedupe': 0,
+        'thumbnails_failed_to_extract': 0,
+        'thumbnails_fast_resolved': 0,
+        'thumbnails_click_fallback': 0,
+        'thumbnails_tab_extracted': 0,
+        'skipped_known': 0,
+        'timeline_responses': 0,
+        'timeline_media': 0,
+        'media_types_skipped': 0,
+        'found': 0,
+    }
+
+
+# 去重结构的容量：屏幕上同时只有几十个容器，早已滚出视口的键淘汰后也不会再出现
+CONTAINER_KEY_CAPACITY = 2048
+MEDIA_KEY_CAPACITY = 65536
+
 
+class _RecentKeys:
+    """
+    有容量上限的去重集合（LRU）：超过上限时淘汰最久没有再遇到的键，长时间滚动内存也不会一直增长。
+    键可以附带一个值（如容器最近一次的 cell_id）。
     """
-        运行图片爬取器的主逻辑。
 
-        Args:
-            download_dir (str): 图片下载路径。
-            cookies (str): 登录所需的 auth_token。
-            url (str): 基础网址。
-            user_id (str): 用户的 ID。
-            father_class: 图片最后所属父类，其Class值的提取
-            move_step: 最大滚动次数
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._keys = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def get(self, key, default=None):
+        return self._keys.get(key, default)
+
+    def keys(self):
+        """按加入（刷新）顺序返回全部键"""
+        return list(self._keys)
+
+    def add(self, key, value=True):
+        """加入或刷新一个键"""
+        self._keys[key] = value
+        self._keys.move_to_end(key)
+        if len(self._keys) > self.capacity:
+            self._keys.popitem(last=False)
+
+
+def iter_media(user_id, cookies, url='https://x.com/', father_class=None, move_step=40, driver_path=None,
+               download_dir='', log_func=None, phase_callback=None, stats_callback=None, headless=True,
+               extract_mode='fast', scroll_mode='event', scroll_delay=2, backend='browser',
+               api_query_ids=None, is_known=None, known_run_limit=20, media_types=('photo',), stats=None,
+               driver=None, metrics=None, checkpoint=None, cancel=None, lean=False, extract_tabs=1):
+    """
+    【流式 API】
+    边滚动（或翻页）边产出媒体记录，不在内存中累积 URL 列表；
+    调用方可以随时 break 或用 itertools.islice 提前结束，浏览器会在生成器关闭时自动退出。
+
+        for record in iter_media('someone', auth_token, father_class=[...], driver_path=path):
+            print(record['url'])
+
+    Args:
+        参数含义与 main_use 相同，另外：
+        is_known: 可选，media_id -> bool。返回 True 的媒体视为已下载，不产出也不提取；
+            连续 known_run_limit 个已知媒体后停止（增量模式）。
+        media_types (tuple): 需要产出的媒体类型（'photo' / 'video' / 'gif'），其余只计数。
+        stats (dict): 可选，传入后统计计数器会实时写入其中（见 _new_stats）。
+        driver: 可选，已经启动好的浏览器（如 GUI 预热的），生成器接管后同样会在结束时关闭它。
+        metrics: 可选的 metrics.RunMetrics，记录阶段耗时、提取/滚动/翻页延迟和 WebDriver 命令次数。
+        checkpoint: 可选的 checkpoint.CrawlCheckpoint。去重结构登记到其中并定期保存，
+            HTTP 后端记录翻页游标，浏览器记录滚动次数和滚动位置；已读取的检查点会从保存的位置继续。
+        cancel: 可选的 cancellation.CancelToken。每次翻页、滚动、处理容器和略缩图前检查，
+            取消后抛出 cancellation.CancelledError，浏览器照常在 finally 中关闭。
+        lean (bool): 以精简模式启动浏览器（见 selenium_a.visit_edge），不加载图片、视频、字体和统计请求。
+        extract_tabs (int): 大于 1 时，需要点击模态框的图片推文改由 selenium_a.TabExtractionPool
+            在这么多个标签页中并行打开图片页提取；每轮滚动的产出仍按页面上的顺序。
+
+    产出：
+        dict: {'user_id', 'tweet_id', 'media_id', 'url', 'media_type', 'photo_index',
+               'variants', 'source'}，source 为 'fast' / 'click' / 'tab' / 'network' / 'http'。
     """
     actual_log = log_func if log_func is not None else _default_log
+    debug_log = log_channel.debug_func(actual_log)  # 逐个容器 / 略缩图的明细
+    if stats is None:
+        stats = {}
+    stats.update(_new_stats())
 
     def update_phase(phase_name, progress):
+        if metrics is not None:
+            metrics.phase_progress(phase_name, progress)
         if phase_callback:
             phase_callback(phase_name, progress)
         actual_log(f"[{phase_name}] 进度: {progress}%")
 
     def update_stats(stats_text):
+        live_text = metrics.live_text() if metrics is not None else ''
+        if live_text:
+            stats_text = f"{stats_text} | {live_text}"
         if stats_callback:
             stats_callback(stats_text)
         actual_log(stats_text)
 
-    def download_progress(current_num, total_count):
-        # 计算百分比
-        progress = int((current_num / total_count) * 100) if total_count > 0 else 0
-        # 更新阶段进度
-        if phase_callback:
-            phase_callback("下载图片", progress)
-        # 更新统计信息
-        if stats_callback:
-            stats_callback(f"下载进度: {current_num}/{total_count}")
-
-    # 调用 selenium.py 中的函数来创建并返回 driver
-    driver = selenium_a.visit_edge(download_dir, driver_path, headless=headless)
-    update_phase("访问页面并登录", 0)
-    actual_log("Driver初始化成功。")
-
-    # 2. 访问并注入 Cookie (传递 driver)
-    actual_log("--- 登录和访问用户页 ---")
-    selenium_a.visit_x(driver, cookies, url, user_id)
-    update_phase("访问页面并登录", 100)
-    update_stats("已登录并访问用户媒体页")
-    actual_log("已访问用户媒体页。")
-
-    # --- 核心滚动和提取循环 ---
-    all_final_urls = []
-    seen_thumbnail_urls = set()  # 存储已处理的略缩图 URL，用于去重
-    seen_container_ids = set()
+    def observe(name, started):
+        if metrics is not None:
+            metrics.observe(name, time.perf_counter() - started)
+
     max_scrolls = move_step  # 最大滚动次数，防止无限循环
     consecutive_no_new_images_limit = 5  # 连续多少次未找到新图片则停止
     consecutive_no_new_images = 0
-    total_containers_scanned = 0
-    total_containers_skipped = 0
-    total_thumbnails_scanned = 0
-    total_thumbnails_skipped_by_dedupe = 0
-    total_thumbnails_failed_to_extract = 0
-    scroll_count = 0
-
-    actual_log("--- 启动模块化滚动和提取循环 ---")
-    update_phase("滚动查找图片", 0)
-    update_stats("开始查找图片...")
-
-    for scroll_count in range(max_scrolls):
-        update_stats(f"滚动进度: {scroll_count + 1}/{max_scrolls} | 已找到图片: {len(all_final_urls)}")
-        actual_log(f"\n--- 滚动循环 {scroll_count + 1} / {max_scrolls} ---")
-
-        # 1. 调用 【寻找图片模块】 获取所有可见的元素
-        all_container = selenium_a.get_new_content_containers(driver, father_class)
-        actual_log(f"当前可见 {len(all_container)} 个内容容器。")
-
-        new_images_found_in_scroll = 0
-        new_containers_processed = 0
-        total_containers_scanned += len(all_container)
-        # 2. 遍历并提取未处理的图片 URL
-        for container in all_container:
-            container_id = container.id
-
-            if container_id not in seen_container_ids:
-                seen_container_ids.add(container_id)
+    consecutive_known = 0  # 连续遇到的已知媒体数（增量模式）
+    # 去重结构只存短键（媒体 ID、推文 ID），不存完整 URL，且都有容量上限
+    seen_media_ids = _RecentKeys(MEDIA_KEY_CAPACITY)
+    seen_containers = _RecentKeys(CONTAINER_KEY_CAPACITY)  # 容器稳定键 -> 最近一次的 cell_id
+    seen_tweet_photos = _RecentKeys(MEDIA_KEY_CAPACITY)  # 快速路径已解析的 (推文ID, 图片序号)
+    clicked_tweet_ids = _RecentKeys(MEDIA_KEY_CAPACITY)  # 已通过点击模态框取完全部图片的推文
+    # 已提取过的略缩图。不能直接记进 seen_media_ids：略缩图与它提取出的大图是同一个媒体 ID，
+    # 先标记再 accept() 会把刚提取出的记录当成重复丢掉
+    handled_thumbs = _RecentKeys(MEDIA_KEY_CAPACITY)
+    if checkpoint is not None:
+        # 从检查点恢复时，已处理过的容器和媒体不会再次提取
+        checkpoint.track('media', seen_media_ids)
+        checkpoint.track('containers', seen_containers)
+        checkpoint.track('tweet_photos', seen_tweet_photos)
+        checkpoint.track('clicked_tweets', clicked_tweet_ids)
+        checkpoint.track('thumbs', handled_thumbs)
+        position = checkpoint.position
+    else:
+        position = {}
+
+    def save_checkpoint(**current):
+        if checkpoint is not None:
+            checkpoint.update(**current)
+            checkpoint.maybe_save()
+
+    def make_record(media_address, tweet_id, media_id, media_type='photo', photo_index=None,
+                    variants=None, source='fast'):
+        return {'user_id': user_id, 'tweet_id': tweet_id, 'media_id': media_id, 'url': media_address,
+                'media_type': media_type, 'photo_index': photo_index, 'variants': variants or [],
+                'source': source}
+
+    def check_known(media_id):
+        """增量模式：已知媒体计数并返回 True"""
+        nonlocal consecutive_known
+        if is_known is not None and media_id and is_known(media_id):
+            stats['skipped_known'] += 1
+            consecutive_known += 1
+            return True
+        return False
+
+    def accept(record):
+        """媒体级去重 + 类型过滤 + 增量跳过，返回是否应产出"""
+        nonlocal consecutive_known
+        media_id = record['media_id'] or record['url']
+        if media_id in seen_media_ids:
+            return False
+        seen_media_ids.add(media_id)
+        if record['media_type'] not in media_types:
+            stats['media_types_skipped'] += 1
+            return False
+        if check_known(record['media_id']):
+            return False
+        consecutive_known = 0
+        stats['found'] += 1
+        return True
+
+    def accept_timeline(records, source):
+        """时间线 JSON（网络捕获 / HTTP 后端）解析出的记录"""
+        accepted = []
+        for item in records:
+            stats['timeline_media'] += 1
+            record = make_record(item['url'], item['tweet_id'], item['media_id'], item['media_type'],
+                                 item['photo_index'], item['variants'], source)
+            if accept(record):
+                accepted.append(record)
+        return accepted
+
+    def known_run_reached():
+        return is_known is not None and consecutive_known >= known_run_limit
+
+    # 1. HTTP 后端：按游标翻页，失败时改用浏览器（已产出的媒体不会重复产出）
+    use_browser = True
+    if backend == 'http':
+        actual_log("--- 使用 HTTP 后端读取媒体时间线 ---")
+        update_phase("滚动查找图片", 0)
+        client = x_api.XApiClient(cookies, base_url=url, query_ids=api_query_ids)
+        pages_done = position.get('pages', 0) if position.get('cursor') else 0
+        if pages_done:
+            actual_log(f"从检查点恢复：已翻 {pages_done} 页，从保存的游标继续。")
+        try:
+            page_started = time.perf_counter()
+            for records, cursor in client.iter_media_pages(user_id, cursor=position.get('cursor'),
+                                                           max_pages=max(0, max_scrolls - pages_done)):
+                cancellation.check(cancel)
+                observe('http_page', page_started)
+                pages = pages_done + client.pages_fetched
+                stats['http_pages'] = pages
+                accepted = accept_timeline(records, 'http')
+                actual_log(f"第 {pages} 页：{len(records)} 个媒体，新增 {len(accepted)} 个。")
+                update_stats(f"翻页进度: {pages}/{max_scrolls} | 已找到图片: {stats['found']}")
+                yield from accepted
+                # 本页的媒体都已交给调用方，下次从下一页的游标继续
+                save_checkpoint(cursor=cursor, pages=pages)
+                if known_run_reached():
+                    actual_log(f"🛑 增量模式：连续 {consecutive_known} 个媒体已是旧媒体，停止翻页。")
+                    break
+                page_started = time.perf_counter()
+            use_browser = False
+        except x_api.XApiError as e:
+            actual_log(f"⚠️ HTTP 后端失败，改用浏览器: {e}")
+        except BaseException:
+            # 取消或调用方提前结束生成器：预先启动的浏览器不会再用到
+            if driver is not None:
+                selenium_a.quit_driver(driver, actual_log)
+            raise
+        finally:
+            client.close()
+
+    if not use_browser:
+        if driver is not None:
+            selenium_a.quit_driver(driver, actual_log)
+        actual_log(f"--- 翻页结束。总共找到 {stats['found']} 个媒体。---")
+        update_phase("滚动查找图片", 100)
+        return
+
+    # 2. 浏览器：调用 selenium.py 中的函数来创建并返回 driver
+    if driver is not None and extract_mode == 'network':
+        # 性能日志只能在启动时开启，预先启动的浏览器无法捕获网络
+        selenium_a.quit_driver(driver, actual_log)
+        driver = None
+    cancellation.check(cancel)
+    if driver is None:
+        driver = selenium_a.visit_edge(download_dir, driver_path, headless=headless,
+                                       capture_network=(extract_mode == 'network'), lean=lean)
+    if metrics is not None:
+        metrics.instrument_driver(driver)
+    tab_pool = None
+    try:
+        update_phase("访问页面并登录", 0)
+        actual_log("Driver初始化成功。")
+        # 网络捕获模式：在打开用户页之前开始记录，首屏的时间线请求也能拿到
+        capture = selenium_a.NetworkCapture(driver) if extract_mode == 'network' else None
+
+        # 访问并注入 Cookie (传递 driver)
+        actual_log("--- 登录和访问用户页 ---")
+        selenium_a.visit_x(driver, cookies, url, user_id, maximize=not lean)
+        update_phase("访问页面并登录", 100)
+        update_stats("已登录并访问用户媒体页")
+        actual_log("已访问用户媒体页。")
+
+        if extract_tabs > 1 and extract_mode != 'network':
+            tab_pool = selenium_a.TabExtractionPool(driver, tabs=extract_tabs, base_url=url, user_id=user_id,
+                                                    lean=lean).start()
+            actual_log(f"多标签页提取：{tab_pool.tabs} 个标签页。")
+
+        actual_log("--- 启动模块化滚动和提取循环 ---")
+        update_phase("滚动查找图片", 0)
+        update_stats("开始查找图片...")
+
+        start_scroll = min(position.get('scrolls', 0), max_scrolls)
+        if start_scroll:
+            actual_log(f"从检查点恢复：已滚动 {start_scroll} 次，回到上次的位置...")
+            reached = selenium_a.restore_scroll(driver, position.get('scroll_y', 0))
+            actual_log(f"已回到 {reached}px（上次为 {position.get('scroll_y', 0)}px）。")
+
+        for scroll_count in range(start_scroll, max_scrolls):
+            cancellation.check(cancel)
+            stats['scrolls'] = scroll_count + 1
+            update_stats(f"滚动进度: {scroll_count + 1}/{max_scrolls} | 已找到图片: {stats['found']}")
+            actual_log(f"\n--- 滚动循环 {scroll_count + 1} / {max_scrolls} ---")
+
+            new_images_found_in_scroll = 0
+            new_containers_processed = 0
+            # 多标签页提取时，本轮的产出先按页面顺序排好：('record', 记录) 或 ('tab', 待提取的推文)
+            slots = []
+            queued_tweets = set()  # 本轮已排进标签页提取的推文
+
+            if extract_mode == 'network':
+                # 网络捕获模式：解析页面已请求到的时间线 JSON，不查找任何元素
+                all_container = []
+                payloads = capture.drain()
+                stats['timeline_responses'] = capture.responses_captured
+                network_records = [r for payload in payloads for r in timeline.parse_timeline_media(payload)]
+                actual_log(f"捕获 {len(payloads)} 个时间线响应，包含 {len(network_records)} 个媒体。")
+                accepted = accept_timeline(network_records, 'network')
+                new_images_found_in_scroll += len(accepted)
+                yield from accepted
+            else:
+                # 调用 【批量采集模块】 一次往返获取所有可见容器及其媒体记录
+                all_container = selenium_a.harvest_media_cells(driver, father_class)
+                actual_log(f"当前可见 {len(all_container)} 个内容容器。")
+
+            stats['containers_scanned'] += len(all_container)
+            # 遍历并提取未处理的图片 URL
+            for container in all_container:
+                cancellation.check(cancel)
+                container_key = container['stable_key']
+
+                if container_key in seen_containers:
+                    # 【更新】容器因已处理而跳过（旧容器）；cell_id 变了说明是同一内容被重新渲染
+                    stats['containers_skipped'] += 1
+                    if seen_containers.get(container_key) != container['cell_id']:
+                        stats['containers_rerendered'] += 1
+                    seen_containers.add(container_key, container['cell_id'])
+                    continue
+                seen_containers.add(container_key, container['cell_id'])
                 new_containers_processed += 1
-                actual_log(f'发现并处理新容器 ID:{container_id}')
-
-                find_one = selenium_a.get_visible_thumbnails(container)
-                actual_log(f"      容器内找到 {len(find_one)} 个略缩图。")
-                total_thumbnails_scanned += len(find_one)
-
-                for element in find_one:
-                    try:
-                        final_url = element.get_attribute('src')
-                    except Exception as e:
-                        total_thumbnails_failed_to_extract += 1
-                        actual_log(f"      获取略缩图 URL 失败: {e}")
+                debug_log(f'发现并处理新容器 ID:{container["cell_id"]}')
+
+                find_one = container['media']
+                debug_log(f"      容器内找到 {len(find_one)} 个略缩图。")
+                stats['thumbnails_scanned'] += len(find_one)
+
+                for cell in find_one:
+                    cancellation.check(cancel)
+                    final_url = cell['src']
+                    if not final_url:
+                        stats['thumbnails_failed_to_extract'] += 1
+                        debug_log("      获取略缩图 URL 失败: src 为空")
+                        continue
+
+                    thumb_media_id = media_url.media_id_from_url(final_url)
+                    thumb_key = thumb_media_id or final_url
+                    tweet_id = cell['tweet_id']
+                    if thumb_key in seen_media_ids or thumb_key in handled_thumbs \
+                            or (tweet_id and (tweet_id in clicked_tweet_ids or tweet_id in queued_tweets)):
+                        #【更新】因去重而跳过（已处理过的旧图片，或整条推文已点击提取过）
+                        stats['thumbnails_skipped_by_dedupe'] += 1
                         continue
 
+                    if cell['media_type'] == 'photo' and check_known(thumb_media_id):
+                        # 增量模式：已下载过的媒体，不再提取
+                        seen_media_ids.add(thumb_key)
+                        continue
+
+                    extract_started = time.perf_counter()
+                    large_urls = None
+                    source = 'fast'
+                    if extract_mode == 'fast' and cell['media_type'] == 'photo' \
+                            and cell['photo_index'] and not cell['multi']:
+                        orig_url = media_url.to_orig_url(final_url)
+                        if orig_url:
+                            photo_key = (tweet_id, cell['photo_index'])
+                            if photo_key in seen_tweet_photos:
+                                # 同一推文的同一张图
+                                stats['thumbnails_skipped_by_dedupe'] += 1
+                                continue
+                            seen_tweet_photos.add(photo_key)
+                            large_urls = [orig_url]
+                            stats['thumbnails_fast_resolved'] += 1
+                            debug_log(f"      快速解析: 推文 {tweet_id} 第 {cell['photo_index']} 张")
 
-                    if final_url not in seen_thumbnail_urls:
+                    if large_urls is None and tab_pool is not None and cell['media_type'] == 'photo' and tweet_id:
+                        # 多标签页提取：本轮容器处理完后，与其他推文一起在标签页中并行打开图片页。
+                        # 提取成功后才记入 clicked_tweet_ids，失败的推文会退回点击模态框
+                        queued_tweets.add(tweet_id)
+                        stats['thumbnails_tab_extracted'] += 1
+                        slots.append(('tab', {'tweet_id': tweet_id, 'thumb_key': thumb_key, 'key': cell['key'],
+                                              'urls': None}))
+                        continue
 
+                    if large_urls is None:
+                        # 快速路径无法解析（多图、视频或缺少推文链接），退回点击模态框
+                        element = selenium_a.find_thumbnail(driver, cell['key'])
+                        if element is None:
+                            stats['thumbnails_failed_to_extract'] += 1
+                            debug_log("      略缩图元素已被移除，跳过。")
+                            continue
+                        stats['thumbnails_click_fallback'] += 1
+                        source = 'click'
                         large_urls = selenium_a.extract_large_url(driver, element)
+                        if tweet_id:
+                            clicked_tweet_ids.add(tweet_id)
+                    observe(f'extract_{source}', extract_started)
 
-                        seen_thumbnail_urls.add(final_url)
+                    if large_urls and 'VIDEO_OR_FAIL' not in large_urls:
+                        handled_thumbs.add(thumb_key)
+                        # extract_large_url 按 /photo/<n> 的序号返回推文中所有图片 URL
+                        for photo_index, large_url in enumerate(large_urls, start=1):
+                            record = make_record(large_url, tweet_id, media_url.media_id_from_url(large_url),
+                                                 photo_index=cell['photo_index'] if source == 'fast' else photo_index,
+                                                 source=source)
+                            if accept(record):
+                                new_images_found_in_scroll += 1
+                                if tab_pool is not None:
+                                    slots.append(('record', record))
+                                else:
+                                    yield record
+                    else:
+                        # 【更新】大图 URL 提取失败（在 extract_large_url 内发生的错误）
+                        stats['thumbnails_failed_to_extract'] += 1
 
-                        if large_urls and 'VIDEO_OR_FAIL' not in large_urls:
-                            # 【修改】extract_large_url 现在返回一个集合，包含所有图片URL
-                            # 将集合中的所有URL添加到列表中
-                            for url in large_urls:
-                                all_final_urls.append(url)
-                            new_images_found_in_scroll += len(large_urls)
-                        else:
-                            # 【更新】大图 URL 提取失败（在 extract_large_url 内发生的错误）
-                            total_thumbnails_failed_to_extract += 1
+            jobs = [slot for kind, slot in slots if kind == 'tab']
+            if jobs:
+                extract_started = time.perf_counter()
+                debug_log(f"      在 {tab_pool.tabs} 个标签页中并行提取 {len(jobs)} 条推文...")
+                for job, urls in zip(jobs, tab_pool.extract([job['tweet_id'] for job in jobs], cancel=cancel)):
+                    job['urls'] = urls
+                # 记录每条推文的平均耗时，可与 extract_click 直接比较
+                if metrics is not None:
+                    metrics.observe('extract_tab', (time.perf_counter() - extract_started) / len(jobs))
+            for kind, slot in slots:
+                if kind == 'record':
+                    yield slot
+                    continue
+                source = 'tab'
+                if not slot['urls']:
+                    # 图片页没有加载出来：在主标签页中点击略缩图再试一次
+                    element = selenium_a.find_thumbnail(driver, slot['key'])
+                    if element is not None:
+                        stats['thumbnails_click_fallback'] += 1
+                        source = 'click'
+                        slot['urls'] = [u for u in selenium_a.extract_large_url(driver, element)
+                                        if u != 'VIDEO_OR_FAIL']
+                if not slot['urls']:
+                    stats['thumbnails_failed_to_extract'] += 1
+                    continue
+                handled_thumbs.add(slot['thumb_key'])
+                clicked_tweet_ids.add(slot['tweet_id'])
+                for photo_index, large_url in enumerate(slot['urls'], start=1):
+                    record = make_record(large_url, slot['tweet_id'], media_url.media_id_from_url(large_url),
+                                         photo_index=photo_index, source=source)
+                    if accept(record):
+                        new_images_found_in_scroll += 1
+                        yield record
 
-                    else:
-                        #【更新】因去重而跳过（已处理过的旧图片）
-                        total_thumbnails_skipped_by_dedupe += 1
+            # 检查停止条件
+            if new_images_found_in_scroll == 0:
+                consecutive_no_new_images += 1
+                actual_log(f"   本次循环未找到新的 URL。连续 {consecutive_no_new_images} 次。")
+                if consecutive_no_new_images >= consecutive_no_new_images_limit:
+                    actual_log("🛑 连续多次未找到新内容，停止滚动。")
+                    break
             else:
-                # 【更新】容器因已处理而跳过（旧容器）
-                total_containers_skipped += 1
-        # 5. 检查停止条件
-        if new_images_found_in_scroll == 0:
-            consecutive_no_new_images += 1
-            actual_log(f"   本次循环未找到新的 URL。连续 {consecutive_no_new_images} 次。")
-            if consecutive_no_new_images >= consecutive_no_new_images_limit:
-                actual_log("🛑 连续多次未找到新内容，停止滚动。")
+                consecutive_no_new_images = 0
+
+            if known_run_reached():
+                actual_log(f"🛑 增量模式：连续 {consecutive_known} 个媒体已是旧媒体，停止滚动。")
                 break
-        else:
-            consecutive_no_new_images = 0
-
-        actual_log(f"   新处理容器数量: {new_containers_processed}")
-        actual_log(f"   本次循环新增 URL 数量: {new_images_found_in_scroll}")
-        actual_log(f"   当前已提取总 URL 数量: {len(all_final_urls)}")
-
-        # 6. 调用 【滚动模块】
-        selenium_a.move(driver, scroll_distance=500, scroll_delay=2)
-
-    actual_log(f"--- 循环结束。总共找到 {len(all_final_urls)} 个图片 URL。---")
-    update_phase("滚动查找图片", 100)
-    update_stats(f"查找完成！共找到 {len(all_final_urls)} 张图片")
-
-    actual_log("\n=======================================================")
-    actual_log("                  抓取统计总结                    ")
-    actual_log("=======================================================")
-    actual_log(f"总滚动次数: {scroll_count + 1} / {max_scrolls}")
-    actual_log("--- 容器统计 ---")
-    actual_log(f"总共扫描到的容器元素数量: {total_containers_scanned}")
-    actual_log(f"因已处理（旧内容）而跳过的容器数量: {total_containers_skipped}")
-    actual_log("--- 略缩图统计 ---")
-    actual_log(f"总共扫描到的略缩图元素数量: {total_thumbnails_scanned}")
-    actual_log(f"因去重而跳过的略缩图数量 (旧图片): {total_thumbnails_skipped_by_dedupe}")
-    actual_log(f"因提取大图 URL 失败而跳过的图片数量: {total_thumbnails_failed_to_extract}")
-    actual_log("--- 结果统计 ---")
-    actual_log(f"✅ 成功提取的图片 URL 总数: {len(all_final_urls)}")
-    actual_log("=======================================================")
-
-    # 3. 爬取图片 (传递 driver)
-    actual_log("--- 抓取图片大图 URL ---")
-    if phase_callback:
-        phase_callback("下载图片", 0)
+
+            actual_log(f"   新处理容器数量: {new_containers_processed}")
+            actual_log(f"   本次循环新增 URL 数量: {new_images_found_in_scroll}")
+            actual_log(f"   当前已提取总 URL 数量: {stats['found']}")
+
+            # 调用 【滚动模块】
+            scroll_started = time.perf_counter()
+            if scroll_mode == 'event':
+                scroll_result = selenium_a.scroll_viewport(driver, father_class, max_wait=scroll_delay)
+                actual_log(f"   滚动完成（{scroll_result['reason']}），等待 {scroll_result['elapsed']:.2f} 秒。")
+            else:
+                selenium_a.move(driver, scroll_distance=500, scroll_delay=scroll_delay)
+            observe('scroll', scroll_started)
+            save_checkpoint(scrolls=scroll_count + 1, scroll_y=selenium_a.scroll_position(driver))
+
+        actual_log(f"--- 循环结束。总共找到 {stats['found']} 个图片 URL。---")
+        update_phase("滚动查找图片", 100)
+    finally:
+        # 正常结束、调用方 break、取消或出错时都会关闭浏览器
+        if tab_pool is not None:
+            try:
+                tab_pool.close()
+            except Exception:
+                pass  # 浏览器已无响应时直接交给 quit_driver
+        selenium_a.quit_driver(driver, actual_log)
+        actual_log("浏览器已关闭。")
+
+
+def _log_summary(stats, max_scrolls, backend, extract_mode, log):
+    log("\n=======================================================")
+    log("                  抓取统计总结                    ")
+    log("=======================================================")
+    if stats['scrolls']:
+        log(f"总滚动次数: {stats['scrolls']} / {max_scrolls}")
+    if backend == 'http':
+        log(f"HTTP 后端翻页数: {stats['http_pages']} / {max_scrolls}")
+    log("--- 容器统计 ---")
+    log(f"总共扫描到的容器元素数量: {stats['containers_scanned']}")
+    log(f"因已处理（旧内容）而跳过的容器数量: {stats['containers_skipped']}"
+        f"（其中被重新渲染的 {stats['containers_rerendered']} 个）")
+    log("--- 略缩图统计 ---")
+    log(f"总共扫描到的略缩图元素数量: {stats['thumbnails_scanned']}")
+    log(f"因去重而跳过的略缩图数量 (旧图片): {stats['thumbnails_skipped_by_dedupe']}")
+    log(f"因提取大图 URL 失败而跳过的图片数量: {stats['thumbnails_failed_to_extract']}")
+    log(f"快速路径直接解析的略缩图数量: {stats['thumbnails_fast_resolved']}")
+    log(f"退回点击模态框提取的略缩图数量: {stats['thumbnails_click_fallback']}")
+    if stats['thumbnails_tab_extracted']:
+        log(f"在标签页中并行提取的推文数量: {stats['thumbnails_tab_extracted']}")
+    log(f"因已在本地索引中而跳过的媒体数量: {stats['skipped_known']}")
+    if extract_mode == 'network' or backend == 'http':
+        log("--- 时间线 JSON 统计 ---")
+        if extract_mode == 'network':
+            log(f"捕获的时间线响应数量: {stats['timeline_responses']}")
+        log(f"时间线中的媒体数量: {stats['timeline_media']}（其中视频/GIF {stats['media_types_skipped']} 个未下载）")
+    log("--- 结果统计 ---")
+    log(f"✅ 成功提取的图片 URL 总数: {stats['found']}")
+    log("=======================================================")
+
+
+def main_use(download_dir, cookies, url, user_id, father_class, move_step, driver_path,
+             log_func=None, phase_callback=None, stats_callback=None, headless=True,
+             download_workers=download.DEFAULT_WORKERS, extract_mode='fast',
+             incremental=False, index_path=media_index.DEFAULT_INDEX_PATH, dedupe=False,
+             scroll_mode='event', scroll_delay=2, backend='browser', api_query_ids=None,
+             pipeline=None, driver=None, metrics_dir=None, variant_policy=None, postprocessor=None,
+             media_types=('photo',), resume=False, checkpoint_dir=crawl_checkpoint.DEFAULT_CHECKPOINT_DIR,
+             cancel=None, lean=False, extract_tabs=1):
+
+    """
+        运行图片爬取器的主逻辑：iter_media 产出媒体记录，下载流水线边产出边下载。
+
+        Args:
+            download_dir (str): 图片下载路径。
+            cookies (str): 登录所需的 auth_token。
+            url (str): 基础网址。
+            user_id (str): 用户的 ID。
+            father_class: 图片最后所属父类，其Class值的提取
+            move_step: 最大滚动次数
+            download_workers (int): 并发下载数
+            extract_mode (str): 大图提取方式。
+                'fast'  —— 由略缩图 src 直接改写出原图地址，仅在无法解析时退回点击模态框；
+                'click' —— 逐个点击略缩图打开模态框提取（旧方式）；
+                'network' —— 捕获页面自己请求的 UserMedia 时间线 JSON 并直接解析，不接触 DOM。
+            incremental (bool): 增量模式。跳过本地索引中已有的媒体，
+                连续遇到一段已索引的媒体后停止滚动。
+            index_path (str): 本地 SQLite 媒体索引路径，下载成功的媒体总会记入索引。
+            dedupe (bool): 内容去重，字节完全相同的图片（含以往运行下载的）只保存一份并硬链接。
+            scroll_mode (str): 滚动方式。
+                'event' —— 每次滚动约一屏，新容器挂载或网络空闲即返回，scroll_delay 只是上限；
+                'fixed' —— 每次滚动 500 像素并固定等待 scroll_delay 秒（旧方式）。
+            scroll_delay (float): 每次滚动后的等待秒数（event 模式下为最长等待）。
+            backend (str): 'browser' —— 启动 Edge 滚动页面（默认）；
+                'http' —— 不启动浏览器，直接用 auth_token 按游标翻页读取媒体时间线，
+                          move_step 为最大翻页数，失败时自动改用浏览器。
+            api_query_ids (dict): HTTP 后端使用的 GraphQL queryId 覆盖（可选）。
+            pipeline: 外部提供的下载端（任何带 submit(url, meta) 的对象，如批量任务的共享下载队列）。
+                提供时本函数只负责提交，不启动也不等待下载，索引记录由提供方负责。
+            driver: 已经启动好的浏览器（可选，如 GUI 预热的），使用后由本函数关闭。
+            metrics_dir (str): 运行结束后在此目录写出 <user_id>.json 和 <user_id>.prom 运行指标（可选）。
+            variant_policy: 可选的 variants.VariantPolicy，决定下载的图片尺寸/格式和流量预算（默认原图）。
+            postprocessor: 可选的 postprocess.PostProcessor（未启动），随下载流水线启动，
+                在进程池中计算尺寸/EXIF/感知哈希、可选转码，结果写入下载目录的 metadata.jsonl。
+                使用外部 pipeline 时忽略。
+            media_types (tuple): 需要下载的媒体类型，'video' / 'gif' 需要时间线 JSON（extract_mode='network'
+                或 backend='http'）提供视频地址；m3u8 视频由 video.download_hls 下载。
+            resume (bool): 从 checkpoint_dir 中该用户的检查点继续：恢复去重键、翻页游标或滚动位置，
+                重新提交上次未下载完成的媒体。没有检查点时从头开始。
+            checkpoint_dir (str): 检查点目录，爬取过程中定期写入 <user_id>.json，正常结束后删除；None 为不写检查点。
+            cancel: 可选的 cancellation.CancelToken。取消后滚动/翻页在下一个检查点停止，
+                正在下载的文件保留 .part，其余下载跳过，保存检查点后抛出 cancellation.CancelledError。
+            lean (bool): 精简模式：浏览器不加载图片、视频、字体和统计请求，窗口缩小，
+                长时间滚动时流量、CPU 和内存占用大幅下降。HTTP 后端不启动浏览器，不受影响。
+            extract_tabs (int): 大于 1 时，需要点击模态框的图片推文（多图等）在这么多个标签页中
+                并行打开图片页 /status/<id>/photo/1 提取，不再逐个点击、逐张翻页；1 为原来的点击方式。
+
+        返回：
+            dict: {'user_id', 'found': 提取到的媒体数, 'submitted': 提交下载数,
+                   'downloaded': 下载成功数（使用外部 pipeline 时为 None）,
+                   'checkpoint': 保留的检查点路径（使用外部 pipeline 时由调用方在下载全部完成后删除；
+                       自己下载时有未完成的下载才保留），否则为 None,
+                   'metrics': 运行指标（RunMetrics.snapshot()）}
+    """
+    actual_log = log_func if log_func is not None else _default_log
+    metrics = run_metrics.RunMetrics(user_id)
+
+    def download_progress(current_num, total_count):
+        # 下载与滚动同时进行，total_count 为当前已提交的数量
+        progress = int((current_num / total_count) * 100) if total_count > 0 else 0
+        # 更新阶段进度
+        if phase_callback:
+            phase_callback("下载图片", progress)
+        # 更新统计信息
+        if stats_callback:
+            live_text = metrics.live_text()
+            stats_callback(f"下载进度: {current_num}/{total_count}" + (f" | {live_text}" if live_text else ""))
+
+    def finish_metrics():
+        metrics.update_counters(stats)
+        metrics.update_counters({'submitted': submitted})
+        result['metrics'] = metrics.snapshot()
+        if metrics_dir:
+            try:
+                json_path, prom_path = metrics.export(metrics_dir)
+                actual_log(f"运行指标已写入: {json_path}, {prom_path}")
+            except OSError as e:
+                actual_log(f"!! 写入运行指标失败: {e}")
+
+    # 本地媒体索引：记录下载成功的媒体，增量模式下用于跳过旧媒体
+    index = media_index.MediaIndex(index_path)
+    if incremental:
+        actual_log(f"增量模式：索引中已有该用户 {index.count(user_id)} 个媒体。")
+
+    # 爬取检查点：定期保存进度，进程被结束后可以 resume=True 继续
+    checkpoint = None
+    if checkpoint_dir:
+        checkpoint = crawl_checkpoint.CrawlCheckpoint(crawl_checkpoint.checkpoint_path(checkpoint_dir, user_id), user_id)
+        if resume and not checkpoint.load():
+            actual_log("没有可用的检查点，从头开始。")
+
+    def media_key(media_address, meta):
+        return meta.get('media_id') or media_address
+
+    def record_download(media_address, result, meta):
+        if checkpoint is not None:
+            checkpoint.remove_pending(media_key(media_address, meta))
+        index.add(meta['media_id'] or media_address, user_id, meta['tweet_id'], media_address,
+                  result['path'], result['size'], result['sha256'], result.get('variant'),
+                  result.get('expected_size'))
+
+    # 下载线程与滚动循环同时运行：提取到的 URL 立即入队，边滚动边下载
+    own_pipeline = pipeline is None
+    if own_pipeline:
+        pipeline = download.DownloadPipeline(
+            download_dir,
+            workers=download_workers,
+            log_func=actual_log,
+            progress_callback=download_progress,
+            on_complete=record_download,
+            dedupe=dedupe,
+            hash_lookup=index.path_for_hash,
+            metrics=metrics,
+            variant_policy=variant_policy,
+            postprocessor=postprocessor,
+            cancel=cancel
+        )
+        if variant_policy is not None:
+            actual_log(f"图片尺寸: {variant_policy.describe()}")
+        if postprocessor is not None:
+            postprocessor.start()
+        pipeline.start()
+        metrics.phase_start("下载图片")
+        if phase_callback:
+            phase_callback("下载图片", 0)
+
+    stats = {}
+    submitted = 0
+    if checkpoint is not None and checkpoint.restored:
+        # 上次已提交但没下载完成的媒体先重新提交；外部下载端已下载的可以从索引中排除
+        resubmitted = 0
+        for key, (media_address, meta) in list(checkpoint.pending.items()):
+            if index.contains(meta.get('media_id')):
+                checkpoint.remove_pending(key)
+                continue
+            pipeline.submit(media_address, meta)
+            resubmitted += 1
+        submitted += resubmitted
+        actual_log(f"从检查点恢复：重新提交 {resubmitted} 个未完成的下载。")
+
+    def submit(record):
+        meta = {'user_id': user_id, 'tweet_id': record['tweet_id'], 'media_id': record['media_id']}
+        if checkpoint is not None:
+            checkpoint.add_pending(media_key(record['url'], meta), record['url'], meta)
+        pipeline.submit(record['url'], meta)
+
+    try:
+        for record in iter_media(
+                user_id, cookies, url=url, father_class=father_class, move_step=move_step,
+                driver_path=driver_path, download_dir=download_dir, log_func=actual_log,
+                phase_callback=phase_callback, stats_callback=stats_callback, headless=headless,
+                extract_mode=extract_mode, scroll_mode=scroll_mode, scroll_delay=scroll_delay,
+                backend=backend, api_query_ids=api_query_ids,
+                is_known=index.contains if incremental else None, stats=stats, driver=driver,
+                metrics=metrics, media_types=media_types, checkpoint=checkpoint, cancel=cancel, lean=lean,
+                extract_tabs=extract_tabs):
+            submit(record)
+            submitted += 1
+    except BaseException as e:
+        if isinstance(e, cancellation.CancelledError):
+            actual_log("⏹ 任务已取消，正在停止下载...")
+        # 爬取出错或被取消：先保存检查点（下载完成后再保存一次，待下载列表更准确），
+        # 已提交的下载仍然完成，再把异常抛给调用方
+        if checkpoint is not None:
+            checkpoint.save()
+        if own_pipeline:
+            pipeline.close()
+            if postprocessor is not None:
+                postprocessor.close()
+        if checkpoint is not None:
+            checkpoint.save()
+            actual_log(f"已保存检查点，可用“断点续爬”继续: {checkpoint.path}")
+        index.close()
+        raise
+
+    if stats_callback:
+        stats_callback(f"查找完成！共找到 {stats['found']} 张图片")
+    _log_summary(stats, move_step, backend, extract_mode, actual_log)
+
+    result = {'user_id': user_id, 'found': stats['found'], 'submitted': submitted, 'downloaded': None,
+              'checkpoint': None}
+    if not own_pipeline:
+        # 外部下载端由调用方负责等待和统计。此时提交的媒体可能还在对方的队列里没下载，
+        # 检查点（含待下载列表）保留，由调用方在下载结束后删除（见 batch.run_batch）；
+        # 续爬时待下载列表中已记入索引的媒体会被排除
+        if checkpoint is not None:
+            checkpoint.save()
+            result['checkpoint'] = checkpoint.path
+        index.close()
+        finish_metrics()
+        actual_log(f"已提交 {result['submitted']} 个媒体到共享下载队列。程序结束。")
+        return result
+
+    # 滚动已结束（浏览器已在 iter_media 中关闭），等待剩余下载
+    remaining = pipeline.submitted - pipeline.finished
+    actual_log(f"--- 等待剩余 {remaining} 张图片下载完成 ---")
     if stats_callback:
-        stats_callback(f"开始下载 {len(all_final_urls)} 张图片...")
-
-        # 调用下载函数，传递进度回调
-    download.download_main(
-        fin_pic=all_final_urls,
-        download_dir=download_dir,
-        log_func=actual_log,
-        progress_callback=download_progress
-    )
+        stats_callback(f"下载进度: {pipeline.finished}/{pipeline.submitted}")
+    succeeded = pipeline.close()
+    metrics.phase_end("下载图片")
+    if checkpoint is not None:
+        # 与批量任务相同：全部下载成功才删除检查点，有失败或取消后跳过的下载时保留，续爬时重新提交
+        if succeeded >= pipeline.submitted and not (cancel is not None and cancel.cancelled):
+            checkpoint.clear()
+        else:
+            checkpoint.save()
+            result['checkpoint'] = checkpoint.path
+            actual_log(f"有 {pipeline.submitted - succeeded} 个下载未完成，已保留检查点，"
+                       f"可用“断点续爬”继续: {checkpoint.path}")
+    index.close()
+    if postprocessor is not None:
+        postprocessor.close()
+
     # 下载完成
     if phase_callback:
         phase_callback("下载图片", 100)
     if stats_callback:
-        stats_callback("下载完成！")
-    # 4. 关闭浏览器
-    driver.quit()
-    actual_log("浏览器已关闭。程序结束。")
\ No newline at end of file
+        stats_callback(f"下载完成！成功 {succeeded}/{pipeline.submitted} 张")
+    result['downloaded'] = succeeded
+    finish_metrics()
+    actual_log("程序结束。")
+    return result
@@ -0,0 +1,138 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import media_url
+
+# pbs.twimg.com 提供的尺寸，从大到小
+VARIANT_NAMES = ('orig', '4096x4096', 'large', 'medium', 'small')
+VARIANT_MODES = ('orig', 'largest', 'cap', 'budget')
+
+
+class VariantPolicy:
+    """
+    【尺寸变体策略】
+    决定每张图片下载哪个尺寸/格式：
+    - 'orig'    —— 原图（name=orig，保留原格式），不发额外请求，与以前的行为相同；
+    - 'largest' —— 并行 HEAD 探测 orig / 4096x4096 / large，取 Content-Length 最大且可用的一个；
+    - 'cap'     —— 固定尺寸 name（如 'large'），可指定 image_format（如 'webp'）；
+    - 'budget'  —— 在 name 及更大的尺寸中、原格式和 webp 之间探测，取体积最小的可接受变体，
+                  累计字节数达到 budget_bytes 后不再下载（按流量计费的网络批量归档用）。
+
+    probe 由调用方提供（DownloadPipeline 用同一个 session 和限流调度器发 HEAD），
+    签名为 probe(url) -> Content-Length（不可用时返回 None）。
+    """
+
+    def __init__(self, mode='orig', name='large', image_format=None, budget_bytes=None, probe_workers=4):
+        """
+        Args:
+            mode (str): 'orig' / 'largest' / 'cap' / 'budget'。
+            name (str): cap 模式的固定尺寸；budget 模式可接受的最小尺寸。
+            image_format (str): cap 模式的格式（None 为保留原格式）。
+            budget_bytes (int): budget 模式的总字节预算（None 为不限）。
+            probe_workers (int): 并行 HEAD 探测的线程数。
+        """
+        if mode not in VARIANT_MODES:
+            raise ValueError(f"未知的变体策略: {mode}")
+        if name not in VARIANT_NAMES:
+            raise ValueError(f"未知的尺寸: {name}")
+        self.mode = mode
+        self.name = name
+        self.image_format = image_format
+        self.budget_bytes = budget_bytes
+        self.probe_workers = max(1, int(probe_workers))
+        self.used_bytes = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    @property
+    def needs_probe(self):
+        return self.mode in ('largest', 'budget')
+
+    def _candidates(self, url):
+        original_format = media_url.image_format_of(url)
+        if self.mode == 'largest':
+            return [(name, original_format) for name in ('orig', '4096x4096', 'large')]
+        # budget：可接受的最小尺寸起，向上找，格式在原格式和 webp 之间比较
+        smallest = VARIANT_NAMES.index(self.name)
+        formats = [original_format] + (['webp'] if original_format != 'webp' else [])
+        return [(name, image_format) for name in reversed(VARIANT_NAMES[:smallest + 1])
+                for image_format in formats]
+
+    def choose(self, url, probe=None):
+        """
+        为一张图片选择变体。
+        返回：
+            dict: {'url', 'name', 'format', 'expected_size'}（expected_size 未探测时为 None）；
+                  预算已用完时返回 None，调用方应跳过这张图片。
+            不是 pbs 图片地址（如视频）时原样返回 url。
+        """
+        if media_url.with_variant(url, 'orig') is None:
+            return {'url': url, 'name': None, 'format': None, 'expected_size': None}
+
+        if self.mode == 'orig':
+            return self._choice(url, 'orig', None, None)
+        if self.mode == 'cap' or probe is None:
+            name = self.name if self.mode == 'cap' else 'orig'
+            return self._choice(url, name, self.image_format if self.mode == 'cap' else None, None)
+
+        candidates = self._candidates(url)
+        urls = [media_url.with_variant(url, name, image_format) for name, image_format in candidates]
+        with ThreadPoolExecutor(max_workers=min(self.probe_workers, len(urls))) as executor:
+            sizes = list(executor.map(probe, urls))
+        probed = [(size, name, image_format) for size, (name, image_format) in zip(sizes, candidates) if size]
+        if not probed:
+            # 探测都失败（如服务器不支持 HEAD），退回原图
+            return self._choice(url, 'orig', None, None)
+
+        if self.mode == 'largest':
+            size, name, image_format = max(probed, key=lambda item: item[0])
+            return self._choice(url, name, image_format, size)
+
+        size, name, image_format = min(probed, key=lambda item: item[0])
+        with self._lock:
+            if self.budget_bytes is not None and self.used_bytes + size > self.budget_bytes:
+                self.skipped += 1
+                return None
+            # 先按预计大小占用预算，下载完成后用实际大小修正
+            self.used_bytes += size
+        return self._choice(url, name, image_format, size)
+
+    def _choice(self, url, name, image_format, expected_size):
+        chosen = media_url.with_variant(url, name, image_format)
+        return {'url': chosen, 'name': name, 'format': image_format or media_url.image_format_of(chosen),
+                'expected_size': expected_size}
+
+    def record(self, choice, received_bytes):
+        """
+        下载结束后调用（失败时 received_bytes 为 0），用实际字节数修正预算占用。
+        """
+        if choice is None or self.mode != 'budget':
+            return
+        with self._lock:
+            self.used_bytes += received_bytes - (choice['expected_size'] or 0)
+
+    def describe(self):
+        if self.mode == 'cap':
+            return f"固定尺寸 {self.name}" + (f"，格式 {self.image_format}" if self.image_format else "")
+        if self.mode == 'budget':
+            budget = f"{self.budget_bytes / 1024 / 1024:.0f} MB" if self.budget_bytes else "不限"
+            return f"预算模式（最小尺寸 {self.name}，预算 {budget}）"
+        if self.mode == 'largest':
+            return "探测最大尺寸"
+        return "原图"
+
+
+def policy_from_config(config):
+    """
+    由 config.json 中的 variant 配置创建策略，例如
+    {"mode": "budget", "name": "large", "budget_mb": 500} 或 {"mode": "cap", "name": "large", "format": "webp"}。
+    配置为空时返回 None（即原图）。
+    """
+    if not config:
+        return None
+    budget_mb = config.get('budget_mb')
+    return VariantPolicy(
+        mode=config.get('mode', 'orig'),
+        name=config.get('name', 'large'),
+        image_format=config.get('format'),
+        budget_bytes=int(budget_mb * 1024 * 1024) if budget_mb else None
+    )
@@ -0,0 +1,187 @@
+import hashlib
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+import requests
+import download
+
+DEFAULT_SEGMENT_WORKERS = 4  # 同一个视频同时下载的分片数
+
+_ATTRIBUTE_PATTERN = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+class VideoError(Exception):
+    """播放列表无法处理（加密、字节范围分片等）或分片下载失败。"""
+
+
+def is_hls_url(url):
+    """是否为 HLS 播放列表地址（.m3u8）。"""
+    return bool(url) and urlsplit(url).path.endswith('.m3u8')
+
+
+def best_variant(variants, prefer_hls=False):
+    """
+    从 video_info.variants 中选出要下载的地址：码率最高的 mp4（自带音轨，下载后直接可播放）；
+    没有 mp4 或 prefer_hls 时选 m3u8 播放列表（其中的最高码率在解析播放列表时再选）。
+    返回：
+        dict: 选中的 variant，没有可用地址时返回 None
+    """
+    mp4_variants = [v for v in variants if v.get('content_type') == 'video/mp4' and v.get('url')]
+    hls_variants = [v for v in variants if is_hls_url(v.get('url'))]
+    if hls_variants and (prefer_hls or not mp4_variants):
+        return hls_variants[0]
+    if mp4_variants:
+        return max(mp4_variants, key=lambda v: v.get('bitrate', 0))
+    return None
+
+
+def _attributes(line):
+    """解析 #EXT-X-...:KEY=VALUE,KEY="VALUE" 形式的属性列表。"""
+    return {key: value.strip('"') for key, value in _ATTRIBUTE_PATTERN.findall(line.split(':', 1)[1])}
+
+
+def parse_playlist(text, base_url):
+    """
+    【播放列表解析】
+    解析 m3u8 文本，分片和子播放列表的相对地址按 base_url 补全。
+    返回：
+        dict: 主播放列表 {'type': 'master', 'streams': [{'url', 'bandwidth', 'resolution', 'audio'}],
+                                        'audio': {组ID: 音轨播放列表地址}}；
+              媒体播放列表 {'type': 'media', 'init': 初始化分片地址或 None, 'segments': [地址...]}
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines or lines[0] != '#EXTM3U':
+        raise VideoError("不是有效的 m3u8 播放列表")
+
+    if any(line.startswith('#EXT-X-STREAM-INF') for line in lines):
+        streams, audio = [], {}
+        for i, line in enumerate(lines):
+            if line.startswith('#EXT-X-STREAM-INF') and i + 1 < len(lines):
+                attributes = _attributes(line)
+                streams.append({'url': urljoin(base_url, lines[i + 1]),
+                                'bandwidth': int(attributes.get('BANDWIDTH', 0) or 0),
+                                'resolution': attributes.get('RESOLUTION'),
+                                'audio': attributes.get('AUDIO')})
+            elif line.startswith('#EXT-X-MEDIA'):
+                attributes = _attributes(line)
+                if attributes.get('TYPE') == 'AUDIO' and attributes.get('URI'):
+                    audio.setdefault(attributes.get('GROUP-ID'), urljoin(base_url, attributes['URI']))
+        return {'type': 'master', 'streams': streams, 'audio': audio}
+
+    init, segments = None, []
+    for line in lines:
+        if line.startswith('#EXT-X-KEY') and _attributes(line).get('METHOD', 'NONE') != 'NONE':
+            raise VideoError("加密的播放列表不支持")
+        if line.startswith('#EXT-X-BYTERANGE'):
+            raise VideoError("字节范围分片不支持")
+        if line.startswith('#EXT-X-MAP'):
+            init = urljoin(base_url, _attributes(line)['URI'])
+        elif not line.startswith('#'):
+            segments.append(urljoin(base_url, line))
+    return {'type': 'media', 'init': init, 'segments': segments}
+
+
+def _get_playlist(session, url):
+    response = session.get(url, headers=download.HEADERS, timeout=30)
+    response.raise_for_status()
+    return parse_playlist(response.text, response.url or url)
+
+
+def _fetch_rendition(session, playlist, download_dir, stem, number, log_func, metrics, scheduler, workers,
+                     cancel=None):
+    """
+    并行下载一个媒体播放列表的全部分片，再按顺序拼接成 <stem>.<ts/mp4>。
+    分片保存在 <stem>.segments/ 中，每个分片都由 download._download_one 下载（.part 续传、限流、重试），
+    中断（或取消）后再次下载时已完成的分片直接复用。
+    返回：
+        dict: {'path', 'size', 'sha256', 'content_type', 'resumed_from'}
+    """
+    parts = ([playlist['init']] if playlist['init'] else []) + playlist['segments']
+    if not playlist['segments']:
+        raise VideoError("播放列表中没有分片")
+    segment_dir = os.path.join(download_dir, f'{stem}.segments')
+    os.makedirs(segment_dir, exist_ok=True)
+
+    def quiet_log(message):
+        # 每个分片的成功日志太多，只保留错误
+        if message.startswith('!!'):
+            log_func(f"   视频 {stem} 的分片{message[2:]}")
+
+    def fetch(item):
+        index, url = item
+        segment_stem = f'{index:05d}'
+        existing = _find_segment(segment_dir, segment_stem)
+        if existing:
+            return existing, os.path.getsize(existing)
+        result = download._download_one(session, url, segment_dir, segment_stem, number, quiet_log, metrics, scheduler,
+                                        cancel)
+        if result is None:
+            raise VideoError(f"分片 {index} 下载失败")
+        return result['path'], 0
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        fetched = list(executor.map(fetch, enumerate(parts)))
+
+    # 按播放列表顺序拼接：TS 分片直接相连即为完整的 TS；fMP4 为初始化分片 + 各分片
+    extension = 'mp4' if playlist['init'] or fetched[0][0].endswith(('.mp4', '.m4s')) else 'ts'
+    full_path = os.path.join(download_dir, f'{stem}.{extension}')
+    part_path = os.path.join(download_dir, f'{stem}.part')
+    digest, size = hashlib.sha256(), 0
+    with open(part_path, 'wb') as output:
+        for segment_path, _ in fetched:
+            with open(segment_path, 'rb') as segment:
+                for chunk in iter(lambda: segment.read(1024 * 1024), b''):
+                    output.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+    os.replace(part_path, full_path)
+    shutil.rmtree(segment_dir, ignore_errors=True)
+    return {'path': full_path, 'size': size, 'sha256': digest.hexdigest(),
+            'content_type': 'video/mp4' if extension == 'mp4' else 'video/mp2t',
+            'resumed_from': sum(resumed for _, resumed in fetched)}
+
+
+def _find_segment(segment_dir, segment_stem):
+    """已下载完成的分片（download.find_completed 只认识常见扩展名，分片还可能是 .m4s 等）"""
+    for name in os.listdir(segment_dir):
+        if name.startswith(segment_stem + '.') and not name.endswith(('.part', '.part.meta')):
+            return os.path.join(segment_dir, name)
+    return None
+
+
+def download_hls(session, url, download_dir, stem, number, log_func=print, metrics=None, scheduler=None,
+                 workers=DEFAULT_SEGMENT_WORKERS, cancel=None):
+    """
+    【HLS 视频下载模块】
+    下载 m3u8 视频：主播放列表中选码率（BANDWIDTH）最高的一路，并行下载分片后用纯 Python 拼接，
+    不依赖 ffmpeg。该路视频带有单独的音轨播放列表时，音轨另存为 <stem>_audio.<扩展名>
+    （不使用 ffmpeg 无法合并音视频轨道）。
+    接口与 download._download_one 相同，可由 DownloadPipeline 直接调用；取消时抛出 cancellation.CancelledError。
+    返回：
+        dict: 成功时返回 {'path', 'size', 'sha256', 'content_type', 'resumed_from'}；失败返回 None
+    """
+    try:
+        playlist = _get_playlist(session, url)
+        audio_url = None
+        if playlist['type'] == 'master':
+            if not playlist['streams']:
+                raise VideoError("主播放列表中没有视频流")
+            stream = max(playlist['streams'], key=lambda s: s['bandwidth'])
+            audio_url = playlist['audio'].get(stream['audio'])
+            log_func(f"   第 {number} 个视频选择 {stream['resolution'] or '未知分辨率'}"
+                     f"（{stream['bandwidth'] // 1000} kbps）")
+            playlist = _get_playlist(session, stream['url'])
+        log_func(f"   第 {number} 个视频共 {len(playlist['segments'])} 个分片，并行下载中...")
+        result = _fetch_rendition(session, playlist, download_dir, stem, number, log_func, metrics, scheduler,
+                                  workers, cancel)
+        if audio_url:
+            audio = _fetch_rendition(session, _get_playlist(session, audio_url), download_dir, f'{stem}_audio',
+                                     number, log_func, metrics, scheduler, workers, cancel)
+            log_func(f"   音轨已单独保存: {audio['path']}")
+    except (VideoError, requests.exceptions.RequestException, OSError) as e:
+        log_func(f"!! 下载第 {number} 个视频失败: {e}")
+        return None
+    log_func(f"✅ 视频下载成功: {result['path']}")
+    return result
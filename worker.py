@@ -1,7 +1,64 @@
-import time
+import threading
 from PyQt6.QtCore import QThread, pyqtSignal
-import use
-import selenium_a
+import cancellation
+
+# use / selenium_a / download / batch 会连带导入 Selenium 和 requests，
+# 全部推迟到线程真正运行时再导入，主窗口可以先显示出来
+
+
+class BrowserPrewarmThread(QThread):
+    """
+    【浏览器预热线程】
+    窗口打开后就在后台启动 Edge 并打开首页（DNS、TLS 握手和页面脚本缓存都提前完成），
+    点击开始后 CrawlerThread 直接接管这个浏览器去登录，不再等待启动。
+    """
+    ready_signal = pyqtSignal()
+    failed_signal = pyqtSignal(str)
+
+    def __init__(self, download_dir, headless=True, url='https://x.com/', lean=False):
+        super().__init__()
+        self.download_dir = download_dir
+        self.headless = headless
+        self.lean = lean
+        self.url = url
+        self.driver = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._discarded = False
+
+    def run(self):
+        try:
+            import selenium_a
+            driver = selenium_a.visit_edge(self.download_dir, selenium_a.get_driver_path('msedgedriver.exe'),
+                                           headless=self.headless, lean=self.lean)
+            driver.get(self.url)
+        except Exception as e:
+            self.error = str(e)
+            self.failed_signal.emit(self.error)
+            return
+        with self._lock:
+            if self._discarded:
+                # 启动期间已被放弃（例如窗口已关闭）
+                selenium_a.quit_driver(driver)
+                return
+            self.driver = driver
+        self.ready_signal.emit()
+
+    def take_driver(self):
+        """等待预热完成并取走浏览器（只能取一次），失败时返回 None。"""
+        self.wait()
+        with self._lock:
+            driver, self.driver = self.driver, None
+        return driver
+
+    def discard(self):
+        """不再使用预热的浏览器：关闭已启动的，正在启动的在启动完成后关闭。"""
+        with self._lock:
+            self._discarded = True
+            driver, self.driver = self.driver, None
+        if driver is not None:
+            import selenium_a
+            selenium_a.quit_driver(driver)
 
 
 class CrawlerThread(QThread):
@@ -9,7 +66,11 @@ class CrawlerThread(QThread):
     phase_signal = pyqtSignal(str, int)  # (阶段名, 进度)
     stats_signal = pyqtSignal(str)  # 统计信息
 
-    def __init__(self, path, user, move_step, auth_token, father_class, headless = True):
+    def __init__(self, path, user, move_step, auth_token, father_class, headless = True,
+                 download_workers=None, incremental=False, backend='browser', resume=False,
+                 api_query_ids=None, crawl_workers=None, prewarm=None, metrics_dir=None,
+                 log_level='INFO', log_path=None, variant=None, postprocess=None, media_types=None, lean=False,
+                 extract_tabs=1):
         super().__init__()
         self.download_dir = path
         self.user_id = user
@@ -17,29 +78,130 @@ class CrawlerThread(QThread):
         self.auth_token = auth_token
         self.father_class = father_class
         self.headless = headless
+        self.download_workers = download_workers
+        self.incremental = incremental
+        self.resume = resume  # 从上次中断处的检查点继续
+        self.backend = backend
+        self.api_query_ids = api_query_ids
+        self.crawl_workers = crawl_workers
+        self.prewarm = prewarm  # BrowserPrewarmThread，可选
+        self.metrics_dir = metrics_dir  # 运行指标输出目录，可选
+        self.log_level = log_level  # 显示到界面的最低日志级别
+        self.log_path = log_path  # 轮转日志文件路径，None 为默认位置
+        self.variant = variant  # config.json 中的图片尺寸/流量预算配置，None 为原图
+        self.postprocess = postprocess  # config.json 中的下载后处理配置，None 为不处理
+        self.media_types = tuple(media_types or ('photo',))  # 需要下载的媒体类型
+        self.lean = lean  # 精简模式浏览器：不加载图片、视频、字体
+        self.extract_tabs = extract_tabs  # 多图推文并行提取的标签页数，1 为逐个点击
+        # 停止按钮和关闭窗口通过它通知线程在下一个检查点退出，而不是 terminate()
+        self.cancel_token = cancellation.CancelToken()
+
+    def cancel(self):
+        """请求停止：滚动/翻页在下一个检查点结束，浏览器照常关闭，检查点照常保存。可从 GUI 线程调用。"""
+        self.cancel_token.cancel()
 
     def run(self):
+        import log_channel
+        # 日志先进缓冲区，每 100ms 合并成一次 log_signal，界面不会被逐行刷新卡住
+        log = log_channel.LogChannel(self.log_signal.emit, level=self.log_level,
+                                     log_path=self.log_path or log_channel.DEFAULT_LOG_PATH)
+        driver = None
         try:
-            self.phase_signal.emit("初始化浏览器", 50)
-            time.sleep(0.5)
+            self.phase_signal.emit("初始化浏览器", 0)
+            import batch
+            import download
+            import selenium_a
+            import use
+            import variants
+            import postprocess
+
+            variant_policy = variants.policy_from_config(self.variant)
+            postprocessor = postprocess.postprocessor_from_config(self.postprocess, self.download_dir, log)
+            download_workers = self.download_workers or download.DEFAULT_WORKERS
+            user_ids = batch.parse_user_ids(self.user_id)
+
+            if self.prewarm is not None:
+                if len(user_ids) > 1:
+                    # 批量任务每个进程自己启动浏览器，预热的用不上
+                    self.prewarm.discard()
+                else:
+                    driver = self.prewarm.take_driver()
+                    if driver is not None:
+                        log("使用后台预先启动的浏览器。")
+                    elif self.prewarm.error:
+                        log(f"⚠️ 浏览器预热失败，重新启动: {self.prewarm.error}")
             self.phase_signal.emit("初始化浏览器", 100)
 
+            # 输入了多个用户时走批量任务：多个浏览器进程并行爬取，共享下载池
+            if len(user_ids) > 1:
+                batch.run_batch(
+                    user_ids,
+                    download_dir=self.download_dir,
+                    cookies=self.auth_token,
+                    url='https://x.com/',
+                    father_class=self.father_class,
+                    move_step=self.move_step,
+                    driver_path=selenium_a.get_driver_path('msedgedriver.exe'),
+                    crawl_workers=self.crawl_workers or batch.DEFAULT_CRAWL_WORKERS,
+                    download_workers=download_workers,
+                    log_func=log,
+                    phase_callback=self.phase_signal.emit,
+                    stats_callback=self.stats_signal.emit,
+                    headless=self.headless,
+                    incremental=self.incremental,
+                    resume=self.resume,
+                    backend=self.backend,
+                    api_query_ids=self.api_query_ids,
+                    metrics_dir=self.metrics_dir,
+                    variant_policy=variant_policy,
+                    postprocessor=postprocessor,
+                    media_types=self.media_types,
+                    lean=self.lean,
+                    extract_tabs=self.extract_tabs,
+                    cancel=self.cancel_token
+                )
+                self.cancel_token.check()
+                self.phase_signal.emit("任务完成", 100)
+                return
+
             # 使用传入的参数而不是从文件读取
+            # driver 交给 main_use 后由它负责关闭
+            driver, prepared_driver = None, driver
             use.main_use(
                 download_dir=self.download_dir,
                 cookies=self.auth_token,
                 url='https://x.com/',
-                user_id=self.user_id,
+                user_id=user_ids[0] if user_ids else self.user_id,
                 father_class=self.father_class,
                 move_step=self.move_step,
                 driver_path=selenium_a.get_driver_path('msedgedriver.exe'),
-                log_func=self.log_signal.emit,
+                log_func=log,
                 phase_callback=self.phase_signal.emit,  # 新增
                 stats_callback=self.stats_signal.emit,  # 新增
-                headless=self.headless
+                headless=self.headless,
+                download_workers=download_workers,
+                incremental=self.incremental,
+                resume=self.resume,
+                backend=self.backend,
+                api_query_ids=self.api_query_ids,
+                driver=prepared_driver,
+                metrics_dir=self.metrics_dir,
+                variant_policy=variant_policy,
+                postprocessor=postprocessor,
+                media_types=self.media_types,
+                lean=self.lean,
+                extract_tabs=self.extract_tabs,
+                cancel=self.cancel_token
             )
             self.phase_signal.emit("任务完成", 100)
 
+        except cancellation.CancelledError:
+            log("⏹ 任务已取消。")
+            self.phase_signal.emit("已取消", 0)
         except Exception as e:
-            self.log_signal.emit(f"❌ 爬虫出错：{e}")
-            self.phase_signal.emit("出错", 0)
\ No newline at end of file
+            log(f"❌ 爬虫出错：{e}")
+            self.phase_signal.emit("出错", 0)
+        finally:
+            if driver is not None:
+                selenium_a.quit_driver(driver, log)
+            log.close()
@@ -0,0 +1,166 @@
+import json
+import secrets
+from urllib.parse import urlsplit
+import requests
+import timeline
+
+# X 网页端内置的公共 Bearer Token（写在网页 JS 里，所有用户相同，不是个人凭据）
+WEB_BEARER_TOKEN = ('AAAAAAAAAAAAAAAAAAAAANRILgAAAAAAnNwIzUejRCOuH5E6I8xnZz4puTs%3D'
+                    '1Zv7ttfk8LF81IUq16cHjhLTvJu4FA33AGWWjCpTnA')
+
+# GraphQL 接口的 queryId 会随网页版本变化，失效时可以通过 query_ids 参数
+# 或 config.json 中的 graphql_query_ids 覆盖（在浏览器开发者工具里找 UserMedia 请求即可看到）
+DEFAULT_QUERY_IDS = {
+    'UserByScreenName': 'xmU6X_CKVnQ5lSrCbAmJsg',
+    'UserMedia': 'MOLbHrtk8Ovu7DUNOLcXiA',
+}
+
+# 网页端请求时附带的功能开关，缺少时接口会返回 400
+DEFAULT_FEATURES = {
+    'rweb_tipjar_consumption_enabled': True,
+    'responsive_web_graphql_exclude_directive_enabled': True,
+    'verified_phone_label_enabled': False,
+    'creator_subscriptions_tweet_preview_api_enabled': True,
+    'responsive_web_graphql_timeline_navigation_enabled': True,
+    'responsive_web_graphql_skip_user_profile_image_extensions_enabled': False,
+    'communities_web_enable_tweet_community_results_fetch': True,
+    'c9s_tweet_anatomy_moderator_badge_enabled': True,
+    'articles_preview_enabled': True,
+    'tweetypie_unmention_optimization_enabled': True,
+    'responsive_web_edit_tweet_api_enabled': True,
+    'graphql_is_translatable_rweb_tweet_is_translatable_enabled': True,
+    'view_counts_everywhere_api_enabled': True,
+    'longform_notetweets_consumption_enabled': True,
+    'responsive_web_twitter_article_tweet_consumption_enabled': True,
+    'tweet_awards_web_tipping_enabled': False,
+    'creator_subscriptions_quote_tweet_preview_enabled': False,
+    'freedom_of_speech_not_reach_fetch_enabled': True,
+    'standardized_nudges_misinfo': True,
+    'tweet_with_visibility_results_prefer_gql_limited_actions_policy_enabled': True,
+    'rweb_video_timestamps_enabled': True,
+    'longform_notetweets_rich_text_read_enabled': True,
+    'longform_notetweets_inline_media_enabled': True,
+    'responsive_web_enhance_cards_enabled': False,
+    'hidden_profile_likes_enabled': True,
+    'hidden_profile_subscriptions_enabled': True,
+    'subscriptions_verification_info_is_identity_verified_enabled': True,
+    'subscriptions_verification_info_verified_since_enabled': True,
+    'highlights_tweets_tab_ui_enabled': True,
+    'responsive_web_twitter_article_notes_tab_enabled': True,
+    'subscriptions_feature_can_gift_premium': True,
+}
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+              'Chrome/142.0.0.0 Safari/537.36 Edg/142.0.0.0')
+
+
+class XApiError(Exception):
+    """HTTP 后端请求失败（登录失效、被限流、queryId 过期等），调用方应退回浏览器方式。"""
+
+
+class XApiClient:
+    """
+    【无浏览器后端】
+    直接用 auth_token 通过 requests 请求网页端使用的 GraphQL 接口，
+    按游标翻页读取用户的媒体时间线，不需要启动 Edge。
+
+    base_url 默认 https://x.com，也可以指向回放录制页面的本地模拟服务器。
+    """
+
+    def __init__(self, auth_token, base_url='https://x.com', query_ids=None, session=None, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.auth_token = auth_token
+        self.query_ids = dict(DEFAULT_QUERY_IDS, **(query_ids or {}))
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.pages_fetched = 0
+        self._csrf_token = None
+
+    def _ensure_csrf(self):
+        """
+        登录态请求需要 ct0 Cookie 与 x-csrf-token 头一致。
+        先用 auth_token 访问首页让服务器下发 ct0，拿不到时自己生成一个。
+        """
+        if self._csrf_token:
+            return self._csrf_token
+        domain = urlsplit(self.base_url).hostname
+        self.session.cookies.set('auth_token', self.auth_token, domain=domain)
+        try:
+            self.session.get(self.base_url + '/', headers={'User-Agent': USER_AGENT}, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise XApiError(f"访问首页失败: {e}") from e
+        self._csrf_token = self.session.cookies.get('ct0') or secrets.token_hex(16)
+        self.session.cookies.set('ct0', self._csrf_token, domain=domain)
+        return self._csrf_token
+
+    def _graphql(self, operation, variables):
+        csrf_token = self._ensure_csrf()
+        headers = {
+            'User-Agent': USER_AGENT,
+            'Authorization': f'Bearer {WEB_BEARER_TOKEN}',
+            'x-csrf-token': csrf_token,
+            'x-twitter-auth-type': 'OAuth2Session',
+            'x-twitter-active-user': 'yes',
+            'Content-Type': 'application/json',
+        }
+        params = {
+            'variables': json.dumps(variables, separators=(',', ':')),
+            'features': json.dumps(DEFAULT_FEATURES, separators=(',', ':')),
+        }
+        api_url = f"{self.base_url}/i/api/graphql/{self.query_ids[operation]}/{operation}"
+        try:
+            response = self.session.get(api_url, headers=headers, params=params, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise XApiError(f"{operation} 请求失败: {e}") from e
+        if response.status_code != 200:
+            raise XApiError(f"{operation} 返回 HTTP {response.status_code}: {response.text[:200]}")
+        try:
+            return response.json()
+        except ValueError as e:
+            raise XApiError(f"{operation} 返回的不是 JSON") from e
+
+    def get_user_id(self, screen_name):
+        """由 @用户名 查询数字用户 ID（rest_id）。"""
+        payload = self._graphql('UserByScreenName', {
+            'screen_name': screen_name,
+            'withSafetyModeUserFields': True,
+        })
+        try:
+            return payload['data']['user']['result']['rest_id']
+        except (KeyError, TypeError) as e:
+            raise XApiError(f"找不到用户 {screen_name}") from e
+
+    def iter_media_pages(self, screen_name, cursor=None, max_pages=None, page_size=100):
+        """
+        按游标翻页读取媒体时间线。
+
+        每页产出 (媒体记录列表, 下一页游标)，记录格式与 timeline.parse_timeline_media 相同。
+        某一页没有新媒体、没有下一页游标或达到 max_pages 时结束。
+        """
+        user_id = self.get_user_id(screen_name)
+        page = 0
+        while max_pages is None or page < max_pages:
+            variables = {
+                'userId': user_id,
+                'count': page_size,
+                'includePromotedContent': False,
+                'withClientEventToken': False,
+                'withBirdwatchNotes': False,
+                'withVoice': True,
+                'withV2Timeline': True,
+            }
+            if cursor:
+                variables['cursor'] = cursor
+            payload = self._graphql('UserMedia', variables)
+            self.pages_fetched += 1
+            page += 1
+
+            records = timeline.parse_timeline_media(payload)
+            next_cursor = timeline.find_bottom_cursor(payload)
+            yield records, next_cursor
+            if not records or not next_cursor or next_cursor == cursor:
+                break
+            cursor = next_cursor
+
+    def close(self):
+        self.session.close()